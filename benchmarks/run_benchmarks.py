@@ -0,0 +1,330 @@
+'''
+各工具的基准测试: 计时、峰值内存(RSS)、吞吐量(输入行/秒)
+1. 每个测试在单独的子进程里运行, 峰值 RSS 只包含这一个工具
+2. 输入用 synth.py 生成的合成数据, 没有时自动生成
+3. --json 保存结果, --baseline 和以前保存的结果比较, 吞吐量下降超过 --max-slowdown 倍时返回 1
+用法: python benchmarks/run_benchmarks.py --phases 1000000 --json bench_1m.json
+      python benchmarks/run_benchmarks.py --phases 1000000 --baseline bench_1m.json --only extract_events,split_phases
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from synth import FILES, generate
+
+
+def _tool(directory):
+    """脚本目录加到 sys.path, 以便 import 脚本里的函数"""
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+# 每个测试: setup(data, work) 做导入和准备, 返回计时的函数; data 为 {类型: 路径}
+
+def bench_iter_events(data, work):
+    from phasetool.pha_reader import iter_events
+
+    def run():
+        for _ in iter_events(data['pal']):
+            pass
+    return run
+
+
+def bench_catalog_from_pha(data, work):
+    from phasetool.catalog import PhaseCatalog
+    return lambda: PhaseCatalog.from_pha(data['pal'])
+
+
+def bench_time_index(data, work):
+    from phasetool.time_index import build_index
+    return lambda: build_index(data['pal'])
+
+
+def bench_extract_events(data, work):
+    _tool('extract_pha_by_lat_lon')
+    from extract_pha_by_lat_lon import read_good_records, extract_events
+
+    def run():
+        records = read_good_records(data['pal_good'])
+        extract_events(data['pal'], os.path.join(work, 'good.pha'), records)
+    return run
+
+
+def bench_filter_by_coordinates(data, work):
+    _tool('extract_pha_by_lat_lon')
+    from select_pha_by_lonlat import filter_by_coordinates
+    return lambda: filter_by_coordinates(data['pal'], os.path.join(work, 'box.pha'), 98.0, 99.0, 24.0, 25.0)
+
+
+def bench_select_events_mmap(data, work):
+    from phasetool.selection import Region, select_events_mmap
+    regions = [Region(box=(98.0, 99.0, 24.0, 25.0))]
+    return lambda: select_events_mmap(data['pal'], os.path.join(work, 'box.pha'), regions)
+
+
+def _split(key, thresholds):
+    def setup(data, work):
+        _tool('extract_pha_by_lat_lon')
+        from split_phases import split_file, output_path
+        base = os.path.join(work, 'split')
+        return lambda: split_file(data['pal'], thresholds, key, lambda name: output_path(base, name))
+    return setup
+
+
+def bench_number_events(data, work):
+    from phasetool.numbering import number_events
+    return lambda: number_events(data['mess'], os.path.join(work, 'new.pha'), r'^[0-9]+_[0-9]+')
+
+
+def bench_mess2tomodd(data, work):
+    _tool('convertMESSdetect2tomoDD')
+    from convertMESSdetect2tomoDD import convert
+    return lambda: convert(data['mess_reloc'], data['mess'], os.path.join(work, 'phase_out.dat'))
+
+
+def bench_ph2dt(data, work):
+    _tool('convertMESSdetect2tomoDD')
+    from convertMESSdetect2tomoDD import convert
+    from phasetool.ph2dt import DEFAULTS, read_phase, build_pairs, write_dt
+    # 输入 phase.dat 在计时之前生成
+    phase = os.path.join(work, 'phase.dat')
+    convert(data['mess_reloc'], data['mess'], phase)
+    options = dict(DEFAULTS, max_candidates=100)
+
+    def run():
+        events = read_phase(phase, options['minwght'])
+        write_dt(events, build_pairs(events, options), os.path.join(work, 'dt.ct'), options)
+    return run
+
+
+def bench_sort_phase(data, work):
+    from phasetool.phase_sort import iter_blocks, sort_phase
+    # 事件顺序反转的输入在计时之前生成, 内存限制较小时分多段归并
+    reversed_pal = os.path.join(work, 'reversed.pha')
+    with open(data['pal'], 'rb') as f:
+        blocks = [block for header, block in iter_blocks(f, 'pal') if header is not None]
+    with open(reversed_pal, 'wb') as out:
+        out.writelines(reversed(blocks))
+    del blocks
+    return lambda: sort_phase(reversed_pal, os.path.join(work, 'sorted.pha'), 'pal', memory_mb=8)
+
+
+def bench_yn2hypodd(data, work):
+    _tool('convertYNcatalog2hypoDD')
+    from convertYNcatalog2hypoDD import convert
+    return lambda: convert(data['yn'], os.path.join(work, '2.pha'), os.path.join(work, '3.ctlg'))
+
+
+def bench_select_yn(data, work):
+    _tool('selectYNnetEVT2cutMESS')
+    from selectYNnetEVT2cutMESS import check_arg, get_data
+    # 前 20 个台站
+    keys = ','.join('MS.A{:03d}'.format(k) for k in range(20))
+    return lambda: get_data(check_arg(['select', keys]), data['pal'], os.path.join(work, 'select.pha'))
+
+
+def bench_mess2cutpha(data, work):
+    _tool('convertMESS2cutpha')
+    from convertMESS2cutpha import convert
+    return lambda: convert(data['mess'], os.path.join(work, 'cut.pha'), 0.5, 1.0)
+
+
+def bench_pipeline_yn(data, work):
+    from phasetool.pipeline import run_pipeline
+    keys = ','.join('YN.A{:03d}'.format(k) for k in range(20))
+    spec = [{'stage': 'read_yn', 'path': data['yn']},
+            {'stage': 'select_yn', 'keys': keys},
+            {'stage': 'number', 'start': 0},
+            {'stage': 'select', 'box': [98.0, 101.0, 22.0, 27.0]},
+            {'stage': 'split', 'thresholds': [4, 8], 'base': os.path.join(work, 'pipe')}]
+    return lambda: run_pipeline(spec)
+
+
+def bench_hypodd2zmap(data, work):
+    from phasetool.table_convert import FORMATS, convert_table
+    return lambda: convert_table(data['reloc'], os.path.join(work, 'zmap.dat'), FORMATS['hypodd-zmap'])
+
+
+def bench_pose2gmt(data, work):
+    _tool('convert_POSE2GMT')
+    from convert_POSE2gmt import convert_fms_format
+    return lambda: convert_fms_format(data['fms'], os.path.join(work, 'fms.txt'), 5.0, 45.0)
+
+
+def bench_cut_picks(data, work):
+    _tool('cut_pick2reallink')
+    from cut_pick2reallink import cut_picks
+    return lambda: cut_picks(data['picks'], by='day', outdir=work)
+
+
+# 名称: (吞吐量按哪个输入文件的行数计算, setup)
+BENCHMARKS = {
+    'iter_events': ('pal', bench_iter_events),
+    'catalog_from_pha': ('pal', bench_catalog_from_pha),
+    'time_index': ('pal', bench_time_index),
+    'extract_events': ('pal', bench_extract_events),
+    'filter_by_coordinates': ('pal', bench_filter_by_coordinates),
+    'select_events_mmap': ('pal', bench_select_events_mmap),
+    'sort_phase': ('pal', bench_sort_phase),
+    'split_phases': ('pal', _split('phases', [4, 8, 12, 16])),
+    'split_stations': ('pal', _split('stations', [4, 8, 12, 16])),
+    'number_events': ('mess', bench_number_events),
+    'mess2tomodd': ('mess', bench_mess2tomodd),
+    'mess2cutpha': ('mess', bench_mess2cutpha),
+    'ph2dt': ('mess', bench_ph2dt),
+    'yn2hypodd': ('yn', bench_yn2hypodd),
+    'select_yn': ('pal', bench_select_yn),
+    'pipeline_yn': ('yn', bench_pipeline_yn),
+    'hypodd2zmap': ('reloc', bench_hypodd2zmap),
+    'pose2gmt': ('fms', bench_pose2gmt),
+    'cut_picks': ('picks', bench_cut_picks),
+}
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB, macOS 为字节
+    return rss / (1 << 20) if platform.system() == 'Darwin' else rss / 1024
+
+
+def run_child(name, data_dir, work):
+    """子进程: 运行一个测试, 最后一行输出 JSON 结果"""
+    data = {kind: os.path.join(data_dir, f) for kind, f in FILES.items()}
+    run = BENCHMARKS[name][1](data, work)
+    before = _max_rss_mb()
+    with open(os.devnull, 'w') as null, redirect_stdout(null):
+        t0 = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - t0
+    peak = _max_rss_mb()
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak, 'rss_growth_mb': peak - before}))
+
+
+def count_lines(path):
+    n = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            n += block.count(b'\n')
+    return n
+
+
+def ensure_data(data_dir, phases, seed):
+    """数据目录不完整时重新生成"""
+    if not all(os.path.exists(os.path.join(data_dir, f)) for f in FILES.values()):
+        print('生成合成数据: {} 个震相 -> {}'.format(phases, data_dir))
+        generate(data_dir, phases, seed=seed)
+
+
+def run_one(name, data_dir, repeat, keep_work=None):
+    """在子进程里运行 repeat 次, 取最短时间和最大峰值内存"""
+    best = None
+    for _ in range(repeat):
+        work = tempfile.mkdtemp(prefix='bench_' + name + '_', dir=keep_work)
+        try:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name,
+                                   '--data', data_dir, '--work', work],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        finally:
+            if keep_work is None:
+                shutil.rmtree(work, ignore_errors=True)
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'exit {}'.format(proc.returncode)}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None:
+            best = result
+        else:
+            best['seconds'] = min(best['seconds'], result['seconds'])
+            best['peak_rss_mb'] = max(best['peak_rss_mb'], result['peak_rss_mb'])
+            best['rss_growth_mb'] = max(best['rss_growth_mb'], result['rss_growth_mb'])
+    return best
+
+
+def compare(results, baseline, max_slowdown):
+    """返回吞吐量下降超过 max_slowdown 倍的测试 [(名称, 倍数)]"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or 'lines_per_sec' not in old or 'lines_per_sec' not in result:
+            continue
+        ratio = old['lines_per_sec'] / max(result['lines_per_sec'], 1e-9)
+        result['slowdown'] = ratio
+        if ratio > max_slowdown:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='各工具的基准测试(时间、峰值 RSS、行/秒)')
+    parser.add_argument('--phases', type=int, default=100000, help='合成数据的震相数')
+    parser.add_argument('--data', help='数据目录, 默认 benchmarks/data/<震相数>')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='只运行这些测试, 逗号分隔: ' + ','.join(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=1, help='每个测试运行次数, 取最短时间')
+    parser.add_argument('--json', help='结果保存到 JSON 文件')
+    parser.add_argument('--baseline', help='和以前保存的 JSON 结果比较')
+    parser.add_argument('--max-slowdown', type=float, default=1.3, help='吞吐量下降超过这个倍数算退化')
+    parser.add_argument('--keep-work', help='输出保存在这个目录下(默认运行后删除)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--work', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data or os.path.join(BENCH_DIR, 'data', str(args.phases)))
+    if args.child:
+        run_child(args.child, data_dir, args.work)
+        return
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error('未知的测试: {}'.format(','.join(unknown)))
+    ensure_data(data_dir, args.phases, args.seed)
+    if args.keep_work:
+        os.makedirs(args.keep_work, exist_ok=True)
+
+    lines = {}
+    results = {}
+    print('{:24s} {:>10s} {:>14s} {:>10s} {:>10s}'.format('benchmark', 'seconds', 'lines/sec', 'peak MB', 'growth MB'))
+    for name in names:
+        kind = BENCHMARKS[name][0]
+        path = os.path.join(data_dir, FILES[kind])
+        if kind not in lines:
+            lines[kind] = count_lines(path)
+        result = run_one(name, data_dir, args.repeat, args.keep_work)
+        result['input'] = FILES[kind]
+        result['lines'] = lines[kind]
+        results[name] = result
+        if 'error' in result:
+            print('{:24s} 失败: {}'.format(name, result['error']))
+            continue
+        result['lines_per_sec'] = lines[kind] / max(result['seconds'], 1e-9)
+        print('{:24s} {:10.3f} {:14,.0f} {:10.1f} {:10.1f}'.format(
+            name, result['seconds'], result['lines_per_sec'], result['peak_rss_mb'], result['rss_growth_mb']))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.max_slowdown)
+        for name, ratio in regressions:
+            print('退化: {} 慢了 {:.2f} 倍'.format(name, ratio))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'phases': args.phases, 'data': data_dir, 'python': platform.python_version(),
+                       'results': results}, f, indent=2)
+    failed = any('error' in r for r in results.values())
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
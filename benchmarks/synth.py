@@ -0,0 +1,298 @@
+'''
+生成基准测试用的合成数据, 格式与各脚本的示例文件相同
+1. pal.pha / pal_good.txt: PAL 震相文件和 extract_pha_by_lat_lon 用的"好"事件列表
+2. mess.pha / mess_reloc.csv: MESS 检测结果和 convertMESSdetect2tomoDD 用的 reloc 目录
+3. yn.dat: 云南台网观测报告(1.dat 格式, utf8 中文地名, CRLF 换行)
+4. hypoDD.reloc: 24 列的 hypoDD 定位结果
+5. fms.csv: 震源机制 csv(example_fms.csv 的列)
+6. picks.csv: cut_pick2reallink 用的拾取结果
+震相数由 --phases 指定(1万 到 1000万), 同一个 --seed 生成的数据相同
+用法: python benchmarks/synth.py --phases 100000 --outdir benchmarks/data/100000
+'''
+import os
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.geodesy import distance_km
+from phasetool.timeparse import NS_PER_SEC
+
+# 台站和事件所在的范围: 经度 97.5-99.5, 纬度 23.5-25.5
+REGION = (97.5, 99.5, 23.5, 25.5)
+START_TIME = np.datetime64('2024-01-01T00:00:00', 'ns')
+VP, VS = 6.0, 3.46
+MEAN_PHASES = 12
+BATCH_EVENTS = 20000
+REGION_NAMES = ['龙陵', '腾冲', '盈江', '瑞丽', '保山', '施甸']
+
+FILES = {
+    'pal': 'pal.pha',
+    'pal_good': 'pal_good.txt',
+    'mess': 'mess.pha',
+    'mess_reloc': 'mess_reloc.csv',
+    'yn': 'yn.dat',
+    'reloc': 'hypoDD.reloc',
+    'fms': 'fms.csv',
+    'picks': 'picks.csv',
+}
+
+
+class Stations:
+    """台站表: 名称、经纬度"""
+
+    def __init__(self, n, rng, net):
+        lon0, lon1, lat0, lat1 = REGION
+        self.codes = ['{}{:03d}'.format(chr(ord('A') + k // 1000 % 26), k % 1000) for k in range(n)]
+        self.names = ['{}.{}'.format(net, code) for code in self.codes]
+        self.lon = rng.uniform(lon0, lon1, n)
+        self.lat = rng.uniform(lat0, lat1, n)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class Events:
+    """
+    一批事件和它们的震相, 全部是数组
+    每个事件用连续的若干个台站(从随机台站开始, 台站不重复)
+    """
+
+    def __init__(self, rng, stations, n, t0_ns):
+        lon0, lon1, lat0, lat1 = REGION
+        gaps = rng.exponential(600.0, n) * NS_PER_SEC
+        self.origin = t0_ns + (np.cumsum(gaps) // 10_000_000 * 10_000_000).astype(np.int64)
+        self.lat = np.round(rng.uniform(lat0, lat1, n), 4)
+        self.lon = np.round(rng.uniform(lon0, lon1, n), 4)
+        self.depth = np.round(rng.uniform(0.0, 25.0, n), 1)
+        self.mag = np.round(rng.gamma(2.0, 0.5, n), 1)
+        self.n_phases = np.clip(rng.poisson(MEAN_PHASES - 3, n) + 3, 3, len(stations))
+        self.offsets = np.concatenate(([0], np.cumsum(self.n_phases)))
+        owner = np.repeat(np.arange(n), self.n_phases)
+        rank = np.arange(self.offsets[-1]) - self.offsets[owner]
+        first = rng.integers(0, len(stations), n)
+        self.station = (first[owner] + rank) % len(stations)
+        dist = distance_km(self.lon[owner], self.lat[owner], stations.lon[self.station], stations.lat[self.station])
+        hypo = np.hypot(dist, self.depth[owner])
+        noise = rng.normal(0.0, 0.05, (2, len(owner)))
+        # 到时取到 10 毫秒
+        self.tp = self.origin[owner] + (np.round((hypo / VP + noise[0]) * 100) * 10_000_000).astype(np.int64)
+        self.ts = self.origin[owner] + (np.round((hypo / VS + noise[1]) * 100) * 10_000_000).astype(np.int64)
+        self.ts = np.maximum(self.ts, self.tp + 10_000_000)
+        self.dist = dist
+        self.amp = rng.lognormal(-15.5, 1.0, len(owner))
+        self.owner = owner
+
+    def __len__(self):
+        return len(self.lat)
+
+
+def iso_times(ns):
+    """整数纳秒 -> 2024-11-14T22:30:10.600000Z"""
+    return np.char.add(np.datetime_as_string(ns.astype('datetime64[ns]').astype('datetime64[us]'), unit='us'), 'Z')
+
+
+def pal_times(ns, decimals=2):
+    """整数纳秒 -> 20241114223008.27"""
+    text = np.datetime_as_string(ns.astype('datetime64[ns]').astype('datetime64[ms]'), unit='ms')
+    digits = np.char.replace(np.char.replace(np.char.replace(text, '-', ''), 'T', ''), ':', '')
+    # YYYYMMDDhhmmss.fff -> 保留 decimals 位小数(截断)
+    return np.array([s[:15 + decimals] for s in digits.tolist()])
+
+
+def clock_times(ns, decimals=2):
+    """整数纳秒 -> hh:mm:ss.ss"""
+    text = np.datetime_as_string(ns.astype('datetime64[ns]').astype('datetime64[ms]'), unit='ms')
+    return [s[11:20 + decimals] for s in text.tolist()]
+
+
+def _blocks(events, headers, phase_lines):
+    """按事件把标题行和震相行拼成文本"""
+    out = []
+    offsets = events.offsets.tolist()
+    for i, header in enumerate(headers):
+        out.append(header)
+        out.extend(phase_lines[offsets[i]:offsets[i + 1]])
+    return '\n'.join(out) + '\n'
+
+
+def write_pal(f, events, stations, first_id):
+    times = pal_times(events.origin).tolist()
+    headers = ['{},{:.4f},{:.4f},{:.1f},{:.1f},{}'.format(t, la, lo, d, m, first_id + i)
+               for i, (t, la, lo, d, m) in enumerate(zip(times, events.lat.tolist(), events.lon.tolist(),
+                                                          events.depth.tolist(), events.mag.tolist()))]
+    names = [stations.names[k] for k in events.station.tolist()]
+    phases = ['{},{},{},{!r},{:.1f}'.format(n, tp, ts, a, d)
+              for n, tp, ts, a, d in zip(names, iso_times(events.tp).tolist(), iso_times(events.ts).tolist(),
+                                         events.amp.tolist(), events.dist.tolist())]
+    f.write(_blocks(events, headers, phases))
+
+
+def write_good(f, events, rng):
+    """大约一半的事件, 发震时刻保留 1 位小数"""
+    keep = rng.random(len(events)) < 0.5
+    times = pal_times(events.origin, 1)[keep].tolist()
+    f.write(''.join('{} {:.4f} {:.4f} {:.1f} {:.1f}\n'.format(t, la, lo, d, m)
+                    for t, la, lo, d, m in zip(times, events.lat[keep].tolist(), events.lon[keep].tolist(),
+                                               events.depth[keep].tolist(), events.mag[keep].tolist())))
+
+
+def write_mess(f, events, stations, first_id, rng):
+    detect = pal_times(events.origin + rng.integers(1, 30, len(events)) * 86400 * NS_PER_SEC).tolist()
+    origins = iso_times(events.origin).tolist()
+    headers = ['{}_{},{},{:.4f},{:.3f},{:.1f},{:.3f}'.format(first_id + i, d, o, la, lo, dep, cc)
+               for i, (d, o, la, lo, dep, cc) in enumerate(zip(detect, origins, events.lat.tolist(), events.lon.tolist(),
+                                                               events.depth.tolist(), rng.uniform(0.2, 0.9, len(events)).tolist()))]
+    cc = np.round(rng.uniform(0.3, 1.0, (2, len(events.station))), 3)
+    names = [stations.names[k] for k in events.station.tolist()]
+    phases = ['{},{},{},{!r},{:.3f},{:.3f}'.format(n, tp, ts, a, p, s)
+              for n, tp, ts, a, p, s in zip(names, iso_times(events.tp).tolist(), iso_times(events.ts).tolist(),
+                                            events.amp.tolist(), cc[0].tolist(), cc[1].tolist())]
+    f.write(_blocks(events, headers, phases))
+
+
+def write_mess_reloc(f, events, rng):
+    """约 70% 的 MESS 事件能在 reloc 目录里找到"""
+    keep = rng.random(len(events)) < 0.7
+    times = pal_times(events.origin, 3)[keep].tolist()
+    f.write(''.join('{},{:.6f},{:.6f},{:.2f},{:.1f}\n'.format(t, la, lo, d, m)
+                    for t, la, lo, d, m in zip(times, events.lat[keep].tolist(), events.lon[keep].tolist(),
+                                               events.depth[keep].tolist(), events.mag[keep].tolist())))
+
+
+def write_yn(f, events, stations, rng):
+    """
+    云南台网观测报告, 北京时间
+    每个台站 4 行: Pg, Sg, SME, SMN, 第一行以台网名开头, 其余行缩进
+    """
+    local = events.origin + 8 * 3600 * NS_PER_SEC
+    text = np.datetime_as_string(local.astype('datetime64[ns]').astype('datetime64[ms]'), unit='ms').tolist()
+    tp = clock_times(events.tp + 8 * 3600 * NS_PER_SEC)
+    ts = clock_times(events.ts + 8 * 3600 * NS_PER_SEC)
+    res = np.round(rng.normal(0.0, 0.1, (2, len(tp))), 2).tolist()
+    lines = []
+    offsets = events.offsets.tolist()
+    for i, t in enumerate(text):
+        lines.append('YN {} {}  {:.3f}  {:.3f}  {:2d}  {:.1f}     3   5 eq 53 {}'.format(
+            t[0:10].replace('-', '/'), t[11:21], events.lat[i], events.lon[i], int(events.depth[i]),
+            events.mag[i], REGION_NAMES[i % len(REGION_NAMES)]))
+        for k in range(offsets[i], offsets[i + 1]):
+            code = stations.codes[events.station[k]]
+            lines.append('YN {:5s} SHZ     Pg      1.0 V  {}  {:5.2f}  {:5.1f} {:5.1f}'.format(
+                code, tp[k], res[0][k], events.dist[k], 215.2))
+            lines.append('         SHN     Sg      1.0 V  {}  {:5.2f}'.format(ts[k], res[1][k]))
+            lines.append('         SHE     SME     1.0 D  {}   0.06                   41.3   0.14'.format(ts[k]))
+            lines.append('         SHN     SMN     1.0 D  {}   0.06                   35.2   0.12 ML   0.4'.format(ts[k]))
+    f.write('\r\n'.join(lines) + '\r\n')
+
+
+def write_reloc(f, events, first_id, rng):
+    n = len(events)
+    text = np.datetime_as_string(events.origin.astype('datetime64[ns]').astype('datetime64[ms]'), unit='ms').tolist()
+    err = np.round(rng.uniform(10, 500, (6, n)), 1).tolist()
+    counts = rng.integers(0, 200, (4, n)).tolist()
+    rows = []
+    for i, t in enumerate(text):
+        rows.append('{:9d} {:10.6f} {:11.6f} {:9.3f} {:10.1f} {:10.1f} {:10.1f} {:8.1f} {:8.1f} {:8.1f} '
+                    '{} {} {} {} {} {:6.3f} {:4.1f} {:5d} {:5d} {:5d} {:5d} {:6.3f} {:6.3f} {:3d}'.format(
+                        first_id + i, events.lat[i], events.lon[i], events.depth[i],
+                        err[0][i], err[1][i], err[2][i], err[3][i], err[4][i], err[5][i],
+                        t[0:4], int(t[5:7]), int(t[8:10]), int(t[11:13]), int(t[14:16]), float(t[17:23]),
+                        events.mag[i], counts[0][i], counts[1][i], counts[2][i], counts[3][i], 0.1, 0.2, 1))
+    f.write('\n'.join(rows) + '\n')
+
+
+def write_fms(f, events, first_id, rng):
+    n = len(events)
+    quality = np.array(list('ABCD'))[rng.integers(0, 4, n)].tolist()
+    angles = np.round(np.column_stack([rng.uniform(0, 360, n), rng.uniform(0, 90, n), rng.uniform(-180, 180, n)]), 0).tolist()
+    unc = np.round(rng.uniform(5, 60, (3, n)), 0).tolist()
+    rows = ['{},{},{:.5f},{:.5f},{:.1f},{:.1f},{:.1f},{:.1f},{:.1f},{},{:.1f},{:.1f},{:.1f},{},{:.1f},{},{}'.format(
+        first_id + i, t, lo, la, d, m, a[0], a[1], a[2], q, unc[0][i], unc[1][i], unc[2][i] + 40, p, 18.0, 4, 300)
+        for i, (t, lo, la, d, m, a, q, p) in enumerate(zip(
+            iso_times(events.origin).tolist(), events.lon.tolist(), events.lat.tolist(), events.depth.tolist(),
+            events.mag.tolist(), angles, quality, events.n_phases.tolist()))]
+    f.write('\n'.join(rows) + '\n')
+
+
+def write_picks(f, events, stations, rng):
+    """每个震相两行拾取(P 和 S)"""
+    names = [stations.names[k] for k in events.station.tolist()]
+    begin = iso_times(events.origin[events.owner] // (86400 * NS_PER_SEC) * (86400 * NS_PER_SEC)).tolist()
+    tp = iso_times(events.tp).tolist()
+    ts = iso_times(events.ts).tolist()
+    score = np.round(rng.uniform(0.3, 1.0, (2, len(names))), 3).tolist()
+    rows = []
+    for k, name in enumerate(names):
+        rows.append('{},{},{},{},{},P'.format(name, begin[k], k, tp[k], score[0][k]))
+        rows.append('{},{},{},{},{},S'.format(name, begin[k], k, ts[k], score[1][k]))
+    f.write('\n'.join(rows) + '\n')
+
+
+def generate(outdir, phases, seed=0, n_stations=200, kinds=None):
+    """
+    生成全部(或 kinds 指定的)数据文件
+    :return: {类型: 路径}
+    """
+    kinds = list(FILES) if kinds is None else kinds
+    os.makedirs(outdir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    stations = Stations(n_stations, rng, 'MS')
+    paths = {k: os.path.join(outdir, FILES[k]) for k in kinds}
+    files = {k: open(p, 'w', encoding='utf8', newline='') for k, p in paths.items()}
+    if 'fms' in files:
+        files['fms'].write('event_id,time,longitude,latitude,depth,magnitude,strike,dip,rake,quality_rank,'
+                           'a_plane_uncertainty,b_plane_uncertainty,probability,p_phase_num,p_misfit,'
+                           's_phase_num,s_misfit\n')
+    if 'picks' in files:
+        files['picks'].write('station_id,begin_time,phase_index,phase_time,phase_score,phase_type\n')
+    try:
+        t0 = int(START_TIME.astype(np.int64))
+        done = 0
+        first_id = 1
+        while done < phases:
+            n = max(1, min(BATCH_EVENTS, (phases - done) // MEAN_PHASES + 1))
+            events = Events(rng, stations, n, t0)
+            t0 = int(events.origin[-1])
+            if 'pal' in files:
+                write_pal(files['pal'], events, stations, first_id)
+            if 'pal_good' in files:
+                write_good(files['pal_good'], events, rng)
+            if 'mess' in files:
+                write_mess(files['mess'], events, stations, first_id, rng)
+            if 'mess_reloc' in files:
+                write_mess_reloc(files['mess_reloc'], events, rng)
+            if 'yn' in files:
+                write_yn(files['yn'], events, stations, rng)
+            if 'reloc' in files:
+                write_reloc(files['reloc'], events, first_id, rng)
+            if 'fms' in files:
+                write_fms(files['fms'], events, first_id, rng)
+            if 'picks' in files:
+                write_picks(files['picks'], events, stations, rng)
+            done += int(events.offsets[-1])
+            first_id += n
+    finally:
+        for f in files.values():
+            f.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成基准测试用的合成 PAL/MESS/YN/hypoDD/震源机制数据')
+    parser.add_argument('--phases', type=int, default=100000, help='大约的震相数(1万 到 1000万)')
+    parser.add_argument('--outdir', help='输出目录, 默认 benchmarks/data/<震相数>')
+    parser.add_argument('--stations', type=int, default=200, help='台站数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='只生成这些类型, 逗号分隔: ' + ','.join(FILES))
+    args = parser.parse_args()
+    outdir = args.outdir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', str(args.phases))
+    kinds = args.only.split(',') if args.only else None
+    paths = generate(outdir, args.phases, seed=args.seed, n_stations=args.stations, kinds=kinds)
+    for kind, path in paths.items():
+        print('{:12s} {:>12,d} bytes  {}'.format(kind, os.path.getsize(path), path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,28 @@
 file_path = 'XC_2019-2021_MESSdetect.pha' #要修改的文件路径,做MESS的结果
 import os
-from sys import argv
-import re
-def main(file_path):
-    num = 1
-    r = re.compile(r'^[0-9]+_[0-9]+')
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.numbering import number_events
+def main(file_path, jobs = 1, incremental = False, out_path = None, final = False):
     file_path = os.path.abspath(file_path)
-    out_path = os.path.join(os.path.dirname(file_path), "new_" + os.path.basename(file_path)) #修改后的文件路径
-    out_file = open(out_path, "w") #写文件
-    in_file = open(file_path, "r") #读文件
-    for line in in_file:
-        #后面添加数字
-        if r.match(line):
-            out_file.write(line.strip() + "," + str(num) + "\n")
-            num += 1 #数字递增
-        else:
-            out_file.write(line)
-    in_file.close()
-    out_file.close()
+    if out_path is None:
+        out_path = os.path.join(os.path.dirname(file_path), "new_" + os.path.basename(file_path)) #修改后的文件路径
+    #增量模式只处理上次运行之后追加的事件, 追加到输出文件, 编号接着上次(检查点保存在 <输出文件>.ckpt)
+    #标题行后面添加数字, 数字从1开始递增; jobs > 1 时分块并行, 最后统一修正序号
+    number_events(file_path, out_path, r'^[0-9]+_[0-9]+', start = 1, jobs = jobs, incremental = incremental, final = final)
     print("saved to:", out_path)
 
 #从命令行参数读入文件路径
-if len(argv) > 1:
-    file_path = argv[1]
-main(file_path = file_path)
-
+def cli():
+    parser = argparse.ArgumentParser(description = "add event id to MESS/PAL catalog lines")
+    parser.add_argument("file_path", nargs = "?", default = file_path)
+    parser.add_argument("-o", "--output", help = "输出文件, 默认为输入文件旁边的 new_<文件名>")
+    parser.add_argument("--jobs", type = int, default = 1, help = "并行进程数")
+    parser.add_argument("--incremental", action = "store_true", help = "只处理上次运行之后追加的事件")
+    parser.add_argument("--final", action = "store_true", help = "增量模式下输入已经写完, 最后一个事件也处理(否则留到下次)")
+    args = parser.parse_args()
+    main(file_path = args.file_path, jobs = args.jobs, incremental = args.incremental, out_path = args.output, final = args.final)
 
+if __name__ == "__main__":
+    cli()
@@ -1,26 +1,29 @@
 '''
 Written by YaoYuan.
 The functions:
-select CCvalue to cutpha 
+select CCvalue to cutpha
+Usage: python convertMESS2cutpha.py [airgun53265.pha] [airgun53265v2.pha] [--min 0.8] [--max 1.0]
 '''
 import os
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events
 MIN_VALUE = 0.8 #选出0.29到0.3范围的行
 MAX_VALUE = 1.0
 fpha_in = '/home/yaoyuan/Desktop/myprogram/convertMESS2cutpha/airgun53265.pha'
 fpha_out = '/home/yaoyuan/Desktop/myprogram/convertMESS2cutpha/airgun53265v2.pha'
 # i/o paths
-f=open(fpha_in); lines =f.readlines(); f.close()
-fout = open(fpha_out,'w')
-i = 0
-while i < len(lines):
-    line = lines[i]
-    codes = line.split(',')
-    #print(codes)
-    #print(codes[0])
-    a = len(codes[0])
-    #print(a)
-    if a > 8:
-        #print(codes)
+#MESS标题行第一列(序号_时间)长度大于8, 震相行第一列是台站名
+def is_header(line):
+    return len(line.split(',', 1)[0]) > 8
+
+#返回写出的事件数
+def convert(fpha_in, fpha_out, min_value = MIN_VALUE, max_value = MAX_VALUE):
+    count = 0
+    fout = open(fpha_out,'w')
+    for header, phases in iter_events(fpha_in, is_header=is_header):
+        codes = header.split(',')
         ot = codes[1]
         print(ot)
         otyear = ot[0:4]
@@ -32,16 +35,31 @@ while i < len(lines):
         otminsec = ot[20:22]
         print(otyear,otmon)
         lat, lon, mag, cc = codes[2:6]
-        #不满足条件时跳过两行继续读
-        if not (eval(cc) >= MIN_VALUE and eval(cc) <= MAX_VALUE):
-            i += 2
+        #不满足条件时跳过整个事件
+        if not (float(cc) >= min_value and float(cc) <= max_value):
             continue
-        fout.write('{}{}{}{}{}{}.{},{},{},{},{}'\
+        fout.write('{}{}{}{}{}{}.{},{},{},{},{}\n'\
                 .format(otyear, otmon, otday, othur, otmin, otsec ,otminsec, lat, lon, mag, cc,))
-    else:
-        net_sta, tp, ts, amp = codes[0:4]
-        net, sta = net_sta.split('.')
-        fout.write('{},{},{},{},{},{}\n'\
-                .format(net, sta ,tp, ts, amp, amp))
-    i += 1
-fout.close()
+        for line in phases:
+            codes = line.split(',')
+            net_sta, tp, ts, amp = codes[0:4]
+            net, sta = net_sta.split('.')
+            fout.write('{},{},{},{},{},{}\n'\
+                    .format(net, sta ,tp, ts, amp, amp))
+        count += 1
+    fout.close()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description = 'select CCvalue to cutpha')
+    parser.add_argument('fpha_in', nargs = '?', default = fpha_in)
+    parser.add_argument('fpha_out', nargs = '?', default = fpha_out)
+    parser.add_argument('--min', type = float, default = MIN_VALUE, help = 'cc 下限')
+    parser.add_argument('--max', type = float, default = MAX_VALUE, help = 'cc 上限')
+    args = parser.parse_args()
+    count = convert(args.fpha_in, args.fpha_out, args.min, args.max)
+    print('events:', count)
+    print('saved to:', os.path.abspath(args.fpha_out))
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,143 @@
 """ Written by Yuan Yao 
     with python
+Usage: python combine_phase.py phase_out1.dat phase_out2.dat ... [-o phase_all.dat] [--time-tol 1.0] [--dist-tol 5.0]
+按发震时刻多路归并多个 tomoDD phase.dat(每个文件已按时间排序), 每个输入只在内存里保留一个事件
+不同文件里发震时刻和位置都在容差内的事件合并为一个: 有几个候选时并入最接近的事件(时间差/时间容差 + 距离/距离容差最小),
+保留先出现的事件(时间相同时为排在前面的文件)的标题行, 另一个事件里没有的台站震相换算到保留事件的发震时刻后加入;
+每个其它文件最多并入一个事件,
+同一文件里的事件不合并(密集震群里相距很近的事件是不同的事件); 输出按时间排序, 序号从 0 重新编
 """
 import os
+import sys
+import math
+import heapq
+import argparse
+from collections import deque
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events, is_tomo_header
+from phasetool.timeparse import tomo_header_ns, NS_PER_SEC
+from phasetool.geodesy import KM_PER_DEG
+from phasetool.parallel import temp_path, publish
 in_names = [r'phase_out1.dat', r'phase_out2.dat']
 out_name = 'phase_all.dat'
-out_file = open(out_name, 'w')
-seq_no = 0
-pcnt = 0
-scnt = 0
-#合并每个文件
-for name in in_names:
-    f = open(name, 'r')
-    for line in f:
-        if ' P' in line:
-            pcnt += 1
-            out_file.write(line)
-        elif ' S' in line:
-            scnt += 1
-            out_file.write(line)
-        elif line.startswith('#'):
-            #修改序号
-            line = line.strip()
-            i = len(line) - 1
-            while i >= 0 and line[i].isdigit():
-                i -= 1
-            line = line[0:i].strip() + '{:>11d}'.format(seq_no)
-            seq_no += 1
-            out_file.write(line + "\n")
-            print(line.strip())
-    f.close()
-out_file.close()
-print('saved to:', os.path.abspath(out_name))
-print('P', pcnt)
-print('S', scnt)
+formatter = '{} {:>13.3f} {:>7.3f} {:>3}'
 
+#标题行 # yyyy mm dd hh mi ss.ss lat lon dep ... 的发震时刻(纳秒)和位置
+def parse_title(title):
+    fields = title[1:].split()
+    return tomo_header_ns(title), float(fields[6]), float(fields[7]), float(fields[8])
+
+#逐个返回一个文件的事件 [发震时刻, 纬度, 经度, 深度, 标题行, [震相行], {(台站, 震相)}, {来自的文件序号}]
+#发震时刻比前一个事件早时抛出 ValueError
+def iter_phase_events(path, source = 0):
+    last = None
+    for k, (title, lines) in enumerate(iter_events(path, is_header = is_tomo_header)):
+        try:
+            ns, lat, lon, dep = parse_title(title)
+        except (ValueError, IndexError):
+            raise ValueError('{}: 第 {} 个事件的标题行格式错误: {}'.format(path, k + 1, title))
+        if last is not None and ns < last:
+            raise ValueError('{}: 第 {} 个事件的发震时刻早于前一个事件, 输入需要先按时间排序(python -m phasetool sort-phase)'.format(path, k + 1))
+        last = ns
+        keys = set()
+        for line in lines:
+            values = line.split()
+            if len(values) >= 4:
+                keys.add((values[0], values[3]))
+        yield [ns, lat, lon, dep, title, lines, keys, {source}]
+
+#两个事件的震源距离(km), 震中距按局部平面近似
+def hypo_distance(a, b):
+    dy = (a[1] - b[1]) * KM_PER_DEG
+    dx = (a[2] - b[2]) * KM_PER_DEG * math.cos(math.radians((a[1] + b[1]) / 2))
+    return math.sqrt(dx * dx + dy * dy + (a[3] - b[3]) ** 2)
+
+#把 other 里 event 没有的台站震相加入 event, 走时换算到 event 的发震时刻, 返回加入的震相数
+def merge_picks(event, other):
+    shift = (other[0] - event[0]) / NS_PER_SEC
+    event[7] |= other[7]
+    added = 0
+    for line in other[5]:
+        values = line.split()
+        if len(values) < 4 or (values[0], values[3]) in event[6]:
+            continue
+        event[6].add((values[0], values[3]))
+        event[5].append(formatter.format(values[0], float(values[1]) + shift, float(values[2]), values[3]))
+        added += 1
+    return added
+
+#标题行最后的序号换成 seq_no
+def renumber(title, seq_no):
+    i = len(title) - 1
+    while i >= 0 and title[i].isdigit():
+        i -= 1
+    return title[0:i].strip() + '{:>11d}'.format(seq_no)
+
+#归并, 先写到临时文件, 成功后才替换 out_name; 返回 (写出的事件数, 合并掉的重复事件数, 加入的震相数, P 数, S 数)
+def combine(in_names, out_name, time_tol = 1.0, dist_tol = 5.0):
+    tol_ns = int(round(time_tol * NS_PER_SEC))
+    counts = {'events': 0, 'duplicates': 0, 'added': 0, 'P': 0, 'S': 0}
+    #还可能和后面的事件合并的事件, 按时间排序
+    pending = deque()
+
+    def flush(out_file, before = None):
+        while pending and (before is None or pending[0][0] < before):
+            event = pending.popleft()
+            out_file.write(renumber(event[4], counts['events']) + '\n')
+            for line in event[5]:
+                out_file.write(line + '\n')
+                pha = line.rsplit(None, 1)[-1]
+                if pha.startswith('P'):
+                    counts['P'] += 1
+                elif pha.startswith('S'):
+                    counts['S'] += 1
+            counts['events'] += 1
+
+    part = temp_path(out_name)
+    try:
+        with open(part, 'w') as out_file:
+            inputs = [iter_phase_events(name, k) for k, name in enumerate(in_names)]
+            for event in heapq.merge(*inputs, key = lambda e: e[0]):
+                flush(out_file, event[0] - tol_ns)
+                #pending 里的事件都在时间容差内, 并入得分最小的; 只并入其它文件的事件, 每个文件最多一个
+                best, best_score = None, None
+                for kept in pending:
+                    if kept[7] & event[7]:
+                        continue
+                    dist = hypo_distance(kept, event)
+                    if dist > dist_tol:
+                        continue
+                    score = ((event[0] - kept[0]) / tol_ns if tol_ns else 0) + (dist / dist_tol if dist_tol else 0)
+                    if best is None or score < best_score:
+                        best, best_score = kept, score
+                if best is None:
+                    pending.append(event)
+                else:
+                    counts['added'] += merge_picks(best, event)
+                    counts['duplicates'] += 1
+            flush(out_file)
+        publish(part, out_name)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    return counts['events'], counts['duplicates'], counts['added'], counts['P'], counts['S']
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = '按发震时刻归并多个 tomoDD phase.dat, 合并重复事件')
+    parser.add_argument('inputs', nargs = '*', default = in_names, help = '按时间排序的 phase.dat, 默认 %(default)s')
+    parser.add_argument('-o', '--out', default = out_name, help = '输出文件(默认 %(default)s)')
+    parser.add_argument('--time-tol', type = float, default = 1.0, help = '重复事件的发震时刻容差(秒, 默认 %(default)s)')
+    parser.add_argument('--dist-tol', type = float, default = 5.0, help = '重复事件的震源距离容差(km, 默认 %(default)s), 0 只合并同一位置')
+    args = parser.parse_args(argv)
+    try:
+        events, duplicates, added, pcnt, scnt = combine(args.inputs, args.out, args.time_tol, args.dist_tol)
+    except ValueError as e:
+        sys.exit(str(e))
+    print('events:', events)
+    print('duplicates:', duplicates, 'picks added:', added)
+    print('saved to:', os.path.abspath(args.out))
+    print('P', pcnt)
+    print('S', scnt)
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,104 @@
 """ Written by Yuan Yao 
     with python
+Usage: python convertMESSdetect2tomoDD.py [msms_reloc_main.csv] [ZSYMESSdetect_2016-2017.pha] [phase_out.dat] [--tolerance 0.01]
+reloc 目录和 MESS 事件都转为整数纳秒时间, 每个 MESS 事件在排好序的 reloc 时间里二分查找最近的一个,
+差值不超过容差就输出, 边读 MESS 边写 tomoDD phase.dat; 不是一对一, 几个 MESS 事件可能对应同一个 reloc 事件
 """
 import os
-from obspy import UTCDateTime
+import sys
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.timeparse import parse_times_ns, ns_to_fields, NAT
+from phasetool.selection import iter_batches
+from phasetool.join import nearest_within
+from phasetool.parallel import run_chunks, iter_range_lines, temp_path, concat_outputs, renumber_fixup
 reloc_path = r'msms_reloc_main.csv'
 mess_path = r'ZSYMESSdetect_2016-2017.pha'
 out_path = r'phase_out.dat'
-reloc_file = open(reloc_path, 'r')
-mess_file = open(mess_path, 'r')
-out_file = open(out_path, 'w')
-time_dict = {}
-#判断是不是数据行
-def is_header(line):
-    return line[0].isdigit()
+formater = '# {:4d} {:2d} {:2d} {:2d} {:2d} {:>5.2f} {:>8.4f} {:>9.4f} {:>7.2f} {:>5.2f}  0.00  0.00  0.00 {:>10d}'
+formatter = '{} {:>13.3f} {:>7.3f} {:>3}'
 
-#得到所有要提取的日期
-for reloc in reloc_file:
-    key = reloc.split(',')[0]
-    key = str(UTCDateTime(key))
-    time_dict[key] = reloc
-#从MESS提取数据
-lines = mess_file.readlines()
-i = 0
-seqno = 0
-while i < len(lines):
-    if is_header(lines[i]):
-        values = lines[i].split(',')
-        timeO = values[1] #第二列日期
-        #提取数据
-        if timeO not in time_dict:
-            i += 1
-        else:
-            #得到标题
-            utime = UTCDateTime(lines[i].split(',')[1])
-            formater = '# {:4d} {:2d} {:2d} {:2d} {:2d} {:>5.2f} {:>8.4f} {:>9.4f} {:>7.2f} {:>5.2f}  0.00  0.00  0.00 {:>10d}'
-            values = time_dict[timeO].split(',')
-            v1 = eval(values[1]) 
-            v2 = eval(values[2])
-            v3 = eval(values[3])
-            v4 = eval(values[4])
-            year = utime.year
-            month = utime.month
-            day = utime.day
-            hour = utime.hour
-            minute = utime.minute
-            second = utime.second + utime.microsecond/10**6
-            title = formater.format(year, month, day, hour, minute, second, v1, v2, v3, v4, seqno)
-            print(title)
-            out_file.write(title + "\n")
-            seqno += 1
-            i += 1
-            #得到数据
-            formatter = '{} {:>13.3f} {:>7.3f} {:>3}'
-            while i < len(lines) and not is_header(lines[i]):
-                values = lines[i].split(',')
-                b = values[0].split('.')[1]
-                timeO = UTCDateTime(timeO)
-                timeP = UTCDateTime(values[1])
-                timeS = UTCDateTime(values[2])
-                out_file.write(formatter.format(b, timeP-timeO, 1, 'P') + "\n")
-                out_file.write(formatter.format(b, timeS-timeO, 1, 'S') + "\n")
-                i += 1
+#读取 reloc 目录: 时间,纬度,经度,深度,震级 按时间排序
+def read_reloc(path):
+    times = []
+    values = []
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) < 5:
+                continue
+            times.append(fields[0])
+            values.append([float(v) for v in fields[1:5]])
+    times = parse_times_ns(times)
+    values = np.array(values, dtype=np.float64).reshape(len(times), 4)
+    ok = times != NAT
+    times, values = times[ok], values[ok]
+    order = np.argsort(times, kind='stable')
+    return times[order], values[order]
+
+#连接并写出, 返回写出的事件数
+def convert(reloc_path, mess_path, out_path, tolerance = 0.01):
+    reloc_times, reloc_values = read_reloc(reloc_path)
+    tolerance_ns = int(round(tolerance * 1e9))
+    seqno = 0
+    with open(out_path, 'w') as out_file:
+        for headers, blocks in iter_batches(mess_path):
+            #第二列是发震时刻
+            origins = parse_times_ns([h.split(',')[1] if h.count(',') >= 1 else '' for h in headers])
+            matched = nearest_within(reloc_times, origins, tolerance_ns)
+            matched[origins == NAT] = -1
+            for i in np.flatnonzero(matched >= 0).tolist():
+                timeO = int(origins[i])
+                v1, v2, v3, v4 = reloc_values[matched[i]].tolist()
+                year, month, day, hour, minute, second = ns_to_fields(timeO)
+                title = formater.format(year, month, day, hour, minute, second, v1, v2, v3, v4, seqno)
+                print(title)
+                out_file.write(title + "\n")
+                seqno += 1
+                #得到数据, 一个事件的P/S到时一次批量解析
+                rows = [line.split(',') for line in blocks[i]]
+                times = parse_times_ns([v[1] for v in rows] + [v[2] for v in rows])
+                for k, values in enumerate(rows):
+                    b = values[0].split('.')[1]
+                    timeP = int(times[k])
+                    timeS = int(times[len(rows) + k])
+                    out_file.write(formatter.format(b, (timeP-timeO)/1e9, 1, 'P') + "\n")
+                    out_file.write(formatter.format(b, (timeS-timeO)/1e9, 1, 'S') + "\n")
+    return seqno
+
+#并行处理的一块, 序号从0开始, 返回 (临时文件, 事件数)
+def convert_chunk(mess_path, start, end, reloc_path, out_path, tolerance):
+    part = temp_path(out_path)
+    return part, convert(reloc_path, iter_range_lines(mess_path, start, end), part, tolerance = tolerance)
+
+#标题行最后10列是序号
+def add_seqno(line, base):
+    if not line.startswith('#'):
+        return line
+    line = line.rstrip('\n')
+    return line[:-10] + '{:>10d}'.format(int(line[-10:]) + base) + '\n'
+
+def convert_parallel(reloc_path, mess_path, out_path, tolerance = 0.01, jobs = 1):
+    results = run_chunks(mess_path, convert_chunk, args = (reloc_path, out_path, tolerance), jobs = jobs)
+    counts = [count for part, count in results]
+    concat_outputs([part for part, count in results], out_path, fixup = renumber_fixup(counts, add_seqno))
+    return sum(counts)
+
+def main():
+    parser = argparse.ArgumentParser(description='MESS detect + reloc catalog -> tomoDD phase.dat')
+    parser.add_argument('reloc', nargs='?', default=reloc_path, help='reloc 目录 csv')
+    parser.add_argument('mess', nargs='?', default=mess_path, help='MESS 检测结果 .pha')
+    parser.add_argument('out', nargs='?', default=out_path, help='输出 phase.dat')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='发震时刻匹配容差(秒)')
+    parser.add_argument('--jobs', type=int, default=1, help='并行进程数')
+    args = parser.parse_args()
+    if args.jobs > 1:
+        count = convert_parallel(args.reloc, args.mess, args.out, tolerance = args.tolerance, jobs = args.jobs)
     else:
-        i += 1
-out_file.close()
-mess_file.close()
-reloc_file.close()
-print('saved to:', os.path.abspath(out_path))
+        count = convert(args.reloc, args.mess, args.out, tolerance = args.tolerance)
+    print('events:', count)
+    print('saved to:', os.path.abspath(args.out))
 
+if __name__ == '__main__':
+    main()
@@ -1,76 +1,197 @@
-from obspy import UTCDateTime
-import os, datetime
+import os, sys
+import glob
+import heapq
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events
+from phasetool.parallel import temp_path
+from phasetool.timeparse import format_iso, format_pal
+from phasetool.yn_bulletin import iter_bulletin, pick_pair, max_amplitude, UTC_SHIFT_HOURS
 input_filename = r'1.dat'
 output_pha_filename = r'2.pha'
 output_ctlg_filename = r'3.ctlg'
+#默认的震相选择: 第一行数据有Pg或者Pn，往下必须有Sg，才提取
+P_PHASES = 'Pg,Pn'
+S_PHASES = 'Sg'
+#震相表的列
+PHASE_TABLE_COLUMNS = ['event', 'station', 'channel', 'onset', 'polarity', 'phase', 'weight', 'flag', 'time',
+                       'residual', 'distance', 'azimuth', 'amplitude', 'period', 'mag_type', 'mag']
 
-#从一行里读时间字符串返回，例如00:47:19.75
-def get_time(line_str):
-    for v in line_str.split():
-        if v.count(':') == 2:
-            return v
+#一个事件的全部震相写成 CSV 行, 一行一个震相
+def write_phase_rows(f, k, event):
+    def text(value):
+        return '' if value is None else str(value)
+    for p in event.phases:
+        f.write(','.join([str(k), p.station, p.channel, p.onset, p.polarity, p.phase, text(p.weight), p.flag,
+                          '' if p.time is None else format_iso(p.time), text(p.residual), text(p.distance),
+                          text(p.azimuth), text(p.amplitude), text(p.period), p.mag_type, text(p.mag)]) + '\n')
 
-def main():
+#逐个返回转换后的事件 (标题行, [震相行]), 没有满足条件的台站的事件不返回
+#seq: 标题行末尾加序号(从 0 开始, 原 convertYNcatalog2hypoDD_sq.py)
+#amp_dist: 震相行最后两列写台站最大振幅(SME/SMN)和震中距, 默认写 1,1
+#phase_table: 打开的文件, 给出时同时把每个事件的全部震相写成 CSV 行
+def iter_converted(input_file, p_phases = P_PHASES, s_phases = S_PHASES, utc_shift_hours = UTC_SHIFT_HOURS,
+                   seq = False, amp_dist = False, phase_table = None):
+    p_phases = set(p_phases.split(',')) if isinstance(p_phases, str) else set(p_phases)
+    s_phases = set(s_phases.split(',')) if isinstance(s_phases, str) else set(s_phases)
+    seq_no = 0
+    for k, event in enumerate(iter_bulletin(input_file, utc_shift_hours)):
+        if phase_table is not None:
+            write_phase_rows(phase_table, k, event)
+        values = event.fields
+        fields = [format_pal(event.time, 2), values[3], values[4], values[5], values[6]]
+        if seq:
+            fields.append(str(seq_no))
+        phases = []
+        for station in event.stations():
+            pair = pick_pair(station, p_phases, s_phases)
+            if pair is None:
+                continue
+            p, s = pair
+            if amp_dist:
+                amp = max_amplitude(station)
+                extra = '{},{}'.format(1 if amp is None else amp, 1 if p.distance is None else p.distance)
+            else:
+                extra = '1,1'
+            phases.append('{}.{},{},{},{}'.format(p.net, p.sta, format_iso(p.time), format_iso(s.time), extra))
+        if phases:
+            seq_no += 1
+            yield ','.join(fields), phases
+
+#转换, 返回写出的事件数
+def convert(input_filename, output_pha_filename, output_ctlg_filename, phase_table = None, **options):
     input_file = open(input_filename, 'r', encoding = 'utf8')
     output_pha = open(output_pha_filename, 'w')
     output_ctlg = open(output_ctlg_filename, 'w')
+    table = None
+    if phase_table:
+        table = open(phase_table, 'w')
+        table.write(','.join(PHASE_TABLE_COLUMNS) + '\n')
     seq_no = 0
-    lines = input_file.readlines()
-    i = 0
-    while i < len(lines):
-        if ':' in lines[i] and '/' in lines[i]: #数据单元的标题
-            values = lines[i].split()
-            date = values[1]
-            is_ignore = False
-            #如果缺少数据,舍弃这个数据单元
-            if len(values) < 9:
-                is_ignore = True
-            else:
-                #得到标题写到文件
-                date_time = UTCDateTime(values[1] + ' ' + values[2]) - datetime.timedelta(hours=8)
-                date_time = date_time.strftime('%Y%m%d%H%M%S.%f')[:-4]
-                #title = '{},{},{},{},{},{}'.format(date_time,values[3],values[4],values[5],values[6],seq_no)
-                title = '{},{},{},{},{}'.format(date_time,values[3],values[4],values[5],values[6])
-                is_title_writed = False
-            #跳过标题继续读数据
-            i += 1
-            while i < len(lines) and not (':' in lines[i] and '/' in lines[i]):
-                #读前两行的数据
-                if not is_ignore and lines[i][0].isalpha():
-                    match_line1 = None
-                    match_line2 = None
-                    v1, v2 = lines[i].split()[0:2]
-                    #读前两行的数据
-                    while i < len(lines):
-                        #第一行数据有Pg或者Pn，第二行数据必须有Sg，才提取
-                        if match_line1 == None and (' Pg ' in lines[i] or ' Pn ' in lines[i]):
-                            match_line1 = lines[i]
-                        elif match_line1 != None and match_line2 == None and ' Sg ' in lines[i]:
-                            match_line2 = lines[i]
-                        #读到下一个数据块返回
-                        i += 1
-                        if i < len(lines) and lines[i][0].isalpha():
-                            break
-                    if match_line1 != None and match_line2 != None:
-                        time1 = get_time(match_line1)
-                        time2 = get_time(match_line2)
-                        date_time1 = UTCDateTime('{} {}'.format(date, time1)) - datetime.timedelta(hours=8)
-                        date_time2 = UTCDateTime('{} {}'.format(date, time2)) - datetime.timedelta(hours=8)
-                        if not is_title_writed:
-                            seq_no += 1
-                            print(title)
-                            is_title_writed = True
-                            output_pha.write(title + '\n')
-                            output_ctlg.write(title + '\n')
-                        output_pha.write('{}.{},{},{},1,1\n'.format(v1, v2, date_time1, date_time2))
-                else:
-                    i += 1
-        else:
-            i += 1
+    for title, phases in iter_converted(input_file, phase_table = table, **options):
+        seq_no += 1
+        print(title)
+        output_pha.write(title + '\n')
+        output_ctlg.write(title + '\n')
+        for line in phases:
+            output_pha.write(line + '\n')
     input_file.close()
     output_pha.close()
     output_ctlg.close()
+    if table:
+        table.close()
+    return seq_no
+
+#是否为通配符
+def is_pattern(path):
+    return any(c in path for c in '*?[')
+
+#批量模式的输入: 目录(其中的 *.dat)、通配符或文件, 按文件名排序
+def list_inputs(inputs, pattern = '*.dat'):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(glob.glob(os.path.join(item, pattern)))
+        elif is_pattern(item):
+            paths += sorted(glob.glob(item))
+        else:
+            paths.append(item)
+    return paths
+
+#标题行的发震时刻(YYYYMMDDhhmmss.ff, 按字符串比较就是按时间)
+def title_time(event):
+    return event[0].split(',', 1)[0]
+
+#批量模式的一个文件: 转换后按发震时刻排序写到临时文件, 出错时返回错误信息而不是抛出
+#返回 (输入文件, 临时文件, 事件数, 错误)
+def convert_part(input_path, part_like, options):
+    try:
+        with open(input_path, 'r', encoding = 'utf8') as input_file:
+            events = sorted(iter_converted(input_file, **options), key = title_time)
+        part = temp_path(part_like)
+        with open(part, 'w') as f:
+            for title, phases in events:
+                f.write('\n'.join([title] + phases) + '\n')
+        return input_path, part, len(events), None
+    except Exception as e:
+        return input_path, None, 0, '{}: {}'.format(type(e).__name__, e)
+
+#批量转换: 各文件在进程池里转换, 再按发震时刻多路归并到一个 .pha 和 .ctlg, 序号在归并后统一编
+#返回 (写出的事件数, [(出错的文件, 错误)])
+def convert_batch(input_paths, output_pha_filename, output_ctlg_filename, jobs = None, seq = False, **options):
+    jobs = jobs or os.cpu_count() or 1
+    args = [(path, output_pha_filename, options) for path in input_paths]
+    if jobs <= 1 or len(args) <= 1:
+        results = [convert_part(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers = min(jobs, len(args))) as pool:
+            results = list(pool.map(convert_part, *zip(*args)))
+    failures = []
+    parts = []
+    for path, part, count, error in results:
+        if error:
+            failures.append((path, error))
+        else:
+            parts.append(part)
+            print('{}: {} 个事件'.format(path, count))
+    seq_no = 0
+    try:
+        with open(output_pha_filename, 'w') as output_pha, open(output_ctlg_filename, 'w') as output_ctlg:
+            for title, phases in heapq.merge(*[iter_events(part) for part in parts], key = title_time):
+                if seq:
+                    title = '{},{}'.format(title, seq_no)
+                seq_no += 1
+                output_pha.write(title + '\n')
+                output_ctlg.write(title + '\n')
+                for line in phases:
+                    output_pha.write(line + '\n')
+    finally:
+        for part in parts:
+            os.remove(part)
+    return seq_no, failures
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'convert YN phase to PALM hypodd file input')
+    parser.add_argument('input', nargs = '?', default = input_filename,
+                        help = '观测报告, 例如 1.dat; 目录或通配符(如 "YN/2018*.dat")时批量转换, 按发震时刻合并')
+    parser.add_argument('output_pha', nargs = '?', default = output_pha_filename)
+    parser.add_argument('output_ctlg', nargs = '?', default = output_ctlg_filename)
+    parser.add_argument('--p-phases', default = P_PHASES, help = '每个台站取第一个这些 P 震相(默认 %(default)s)')
+    parser.add_argument('--s-phases', default = S_PHASES, help = '在 P 之后取第一个这些 S 震相(默认 %(default)s)')
+    parser.add_argument('--utc-shift', type = float, default = UTC_SHIFT_HOURS,
+                        help = '报告时间减去的小时数, 北京时间为 8(默认), 报告已是 UTC 时为 0')
+    parser.add_argument('--seq', action = 'store_true', help = '标题行末尾加序号(从 0 开始)')
+    parser.add_argument('--amp-dist', action = 'store_true', help = '震相行最后两列写最大振幅和震中距, 默认写 1,1')
+    parser.add_argument('--phase-table', help = '另外把全部震相(权重、残差、振幅等)写到 CSV')
+    parser.add_argument('--jobs', type = int, help = '批量转换的进程数(默认为 CPU 核数)')
+    args = parser.parse_args(argv)
+    options = dict(p_phases = args.p_phases, s_phases = args.s_phases, utc_shift_hours = args.utc_shift,
+                   amp_dist = args.amp_dist)
+    if os.path.isdir(args.input) or is_pattern(args.input):
+        if args.phase_table:
+            parser.error('批量转换不支持 --phase-table')
+        input_paths = list_inputs([args.input])
+        if not input_paths:
+            parser.error('没有找到输入文件: {}'.format(args.input))
+        count, failures = convert_batch(input_paths, args.output_pha, args.output_ctlg, jobs = args.jobs,
+                                        seq = args.seq, **options)
+        print('{} 个文件, {} 个事件'.format(len(input_paths), count))
+        print('saved:')
+        print(os.path.abspath(args.output_pha))
+        print(os.path.abspath(args.output_ctlg))
+        if failures:
+            print('{} 个文件转换失败:'.format(len(failures)), file = sys.stderr)
+            for path, error in failures:
+                print('  {}: {}'.format(path, error), file = sys.stderr)
+            sys.exit(1)
+        return
+    convert(args.input, args.output_pha, args.output_ctlg, phase_table = args.phase_table, seq = args.seq, **options)
     print('saved:')
-    print(os.path.abspath(output_pha_filename))
-    print(os.path.abspath(output_ctlg_filename))
-main()
+    print(os.path.abspath(args.output_pha))
+    print(os.path.abspath(args.output_ctlg))
+    if args.phase_table:
+        print(os.path.abspath(args.phase_table))
+
+if __name__ == '__main__':
+    main()
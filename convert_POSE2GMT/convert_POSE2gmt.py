@@ -1,70 +1,120 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
 import pandas as pd
-import math
-from obspy import UTCDateTime
 
-def calculate_new_coordinates(lon, lat, offset_km, azimuth_deg):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.geodesy import forward
+
+# 输出列格式（空格分隔）：lon lat depth strike dip rake mag new_lon new_lat id
+OUTPUT_FMT = ['%.6f', '%.6f', '%.2f', '%.1f', '%.1f', '%.1f', '%.2f', '%.6f', '%.6f', '%s']
+
+def calculate_new_coordinates(lon, lat, offset_km, azimuth_deg, model="wgs84"):
     """
-    根据原坐标、偏移距离和方位角计算新坐标 (简单平面近似计算，适合小范围)
+    根据原坐标、偏移距离和方位角计算新坐标
+    参数可以是标量，也可以是 NumPy 数组（逐元素计算）
+    :param model: 'wgs84' 椭球、'sphere' 球面，'flat' 为原来的简单平面近似（只适合小范围）
     """
+    if model != "flat":
+        new_lon, new_lat, _ = forward(lon, lat, azimuth_deg, offset_km, model)
+        return new_lon, new_lat
+
     R = 6371.0  # 地球半径 km
-    azimuth_rad = math.radians(azimuth_deg)
+    azimuth_rad = np.radians(azimuth_deg)
 
-    new_lat = lat + (offset_km / R) * (180 / math.pi) * math.cos(azimuth_rad)
-    new_lon = lon + (offset_km / R) * (180 / math.pi) * math.sin(azimuth_rad) / math.cos(math.radians(lat))
+    new_lat = lat + (offset_km / R) * (180 / np.pi) * np.cos(azimuth_rad)
+    new_lon = lon + (offset_km / R) * (180 / np.pi) * np.sin(azimuth_rad) / np.cos(np.radians(lat))
 
     return new_lon, new_lat
 
+def column_or_value(df, value):
+    """偏移距离/方位角：数字对所有事件相同，字符串表示取 CSV 中的这一列（每个事件不同）"""
+    if isinstance(value, str):
+        return df[value].to_numpy(dtype=np.float64)
+    return np.full(len(df), float(value))
+
+def quality_ranks(df):
+    """质量等级，大写；没有 quality_rank 列时为空字符串"""
+    if 'quality_rank' not in df:
+        return pd.Series([''] * len(df), index=df.index)
+    return df['quality_rank'].astype(str).str.strip().str.upper()
+
+def kms_time_ids(times):
+    """
+    KMSYYYYMMDDhhmmss 形式的ID，pd.to_datetime 批量解析
+    pandas 解析不了的时间再交给 UTCDateTime，仍然失败的使用默认ID
+    """
+    parsed = pd.to_datetime(times, errors='coerce', utc=True)
+    seconds = parsed.to_numpy(dtype='datetime64[ns]').astype('datetime64[s]')
+    # 'YYYY-MM-DDThh:mm:ss' 按字符取出数字部分，整列一次完成
+    chars = np.datetime_as_string(seconds, unit='s').astype('U19').view('U1').reshape(len(times), 19)
+    digits = np.ascontiguousarray(chars[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]])
+    ids = pd.Series(np.char.add('KMS', digits.view('U14').ravel()), index=times.index, dtype=object)
+    for k in np.flatnonzero(parsed.isna()):
+        time_str = times.iloc[k]
+        try:
+            from obspy import UTCDateTime  # 只有 pandas 解析不了时才用到
+            event_time = UTCDateTime(time_str)
+            ids.iloc[k] = f"KMS{event_time.year:04d}{event_time.month:02d}{event_time.day:02d}" \
+                          f"{event_time.hour:02d}{event_time.minute:02d}{event_time.second:02d}"
+        except Exception as e:
+            print(f"时间格式解析错误: {time_str}, 使用默认ID")
+            ids.iloc[k] = "KMS000000000000"
+    return ids
+
+def event_ids(df, id_mode="kms_time", fixed_id="KMS", add_quality=False, quality=None):
+    """生成每个事件的ID"""
+    if id_mode == "kms_time":
+        return kms_time_ids(df['time'])
+    elif id_mode == "fixed":
+        if add_quality:
+            return fixed_id + '_' + (quality_ranks(df) if quality is None else quality)
+        return pd.Series([fixed_id] * len(df), index=df.index)
+    raise ValueError("id_mode 只能是 'kms_time' 或 'fixed'。")
+
 def convert_fms_format(input_csv, output_txt, offset_km=0.0, azimuth_deg=0.0,
                        id_mode="kms_time", fixed_id="KMS", add_quality=False,
-                       filter_quality=False, desired_quality=None):
+                       filter_quality=False, desired_quality=None, geodesic="wgs84"):
     """
     转换震源机制csv文件为指定格式
+    :param input_csv: CSV 文件路径，或者已经读入的 DataFrame
+    :param offset_km, azimuth_deg: 数字，或者 CSV 中的列名（每个事件单独的偏移距离/方位角）
+    :param geodesic: 计算偏移坐标的模型，见 calculate_new_coordinates
+    :return: 写出的事件数
     """
     # 读取CSV
-    df = pd.read_csv(input_csv)
+    df = input_csv if isinstance(input_csv, pd.DataFrame) else pd.read_csv(input_csv)
 
+    # 如果需要筛选质量等级，用掩码一次选出
+    quality = quality_ranks(df)
+    if filter_quality:
+        keep = (quality == desired_quality).to_numpy()
+        df, quality = df[keep], quality[keep]
+
+    # 生成ID
+    ids = event_ids(df, id_mode, fixed_id, add_quality, quality)
+
+    # 计算新的坐标
+    lon = df['longitude'].to_numpy(dtype=np.float64)
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    new_lon, new_lat = calculate_new_coordinates(
+        lon, lat, column_or_value(df, offset_km), column_or_value(df, azimuth_deg), geodesic)
+
+    # 各列拼成一个表，np.savetxt 按每列的格式一次写出（空格分隔）
+    columns = [lon, lat] + [df[name].to_numpy() for name in ['depth', 'strike', 'dip', 'rake', 'magnitude']]
+    columns += [new_lon, new_lat, ids.to_numpy()]
+    table = np.column_stack([c.astype(object) for c in columns]) if len(df) else np.empty((0, len(OUTPUT_FMT)))
     with open(output_txt, 'w') as f_out:
-        for idx, row in df.iterrows():
-            lon = row['longitude']
-            lat = row['latitude']
-            depth = row['depth']
-            strike = row['strike']
-            dip = row['dip']
-            rake = row['rake']
-            magnitude = row['magnitude']
-            time_str = row['time']  # UTC时间字符串
-            quality_rank = str(row.get('quality_rank', '')).strip().upper()  # 质量等级，大写
-
-            # 如果需要筛选质量等级
-            if filter_quality and (quality_rank != desired_quality):
-                continue  # 跳过不符合要求的记录
-
-            # 生成ID
-            if id_mode == "kms_time":
-                try:
-                    event_time = UTCDateTime(time_str)
-                    event_id = f"KMS{event_time.year:04d}{event_time.month:02d}{event_time.day:02d}" \
-                               f"{event_time.hour:02d}{event_time.minute:02d}{event_time.second:02d}"
-                except Exception as e:
-                    print(f"时间格式解析错误: {time_str}, 使用默认ID")
-                    event_id = "KMS000000000000"
-            elif id_mode == "fixed":
-                if add_quality:
-                    event_id = f"{fixed_id}_{quality_rank}"
-                else:
-                    event_id = fixed_id
-            else:
-                raise ValueError("id_mode 只能是 'kms_time' 或 'fixed'。")
-
-            # 计算新的坐标
-            new_lon, new_lat = calculate_new_coordinates(lon, lat, offset_km, azimuth_deg)
-
-            # 写入一行（空格分隔）
-            f_out.write(f"{lon:.6f} {lat:.6f} {depth:.2f} {strike:.1f} {dip:.1f} {rake:.1f} {magnitude:.2f} {new_lon:.6f} {new_lat:.6f} {event_id}\n")
+        np.savetxt(f_out, table, fmt=OUTPUT_FMT)
 
     print(f"转换完成，结果保存至 {output_txt}")
+    return len(df)
 
-if __name__ == "__main__":
+def interactive():
+    """原来的交互方式：逐项输入参数，处理 example_fms.csv"""
     # ======= 配置部分 =======
     input_csv = "example_fms.csv"  # 输入文件路径
     output_txt = "example_converted.txt"  # 输出文件路径
@@ -97,3 +147,91 @@ if __name__ == "__main__":
         id_mode, fixed_id, add_quality,
         filter_quality, desired_quality
     )
+
+# 批量模式中每个输出可以设置的参数（缺省时用命令行参数的值）
+VARIANT_KEYS = ("offset_km", "azimuth_deg", "id_mode", "fixed_id", "add_quality", "quality", "geodesic")
+
+def offset_value(text):
+    """命令行中的偏移距离/方位角：数字，或者 CSV 列名"""
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def run_batch(input_csv, variants):
+    """
+    只读一次 CSV，按 variants 输出多个文件
+    :param variants: [{"output": 输出文件, "offset_km": .., "azimuth_deg": .., "id_mode": ..,
+                      "fixed_id": .., "add_quality": .., "quality": "A", "geodesic": "wgs84"}, ...]
+                     quality 为空时不筛选质量等级
+    :return: {输出文件: 事件数}
+    """
+    df = pd.read_csv(input_csv)
+    counts = {}
+    for variant in variants:
+        unknown = set(variant) - set(VARIANT_KEYS) - {"output"}
+        if unknown:
+            raise ValueError(f"未知的参数: {', '.join(sorted(unknown))}")
+        quality = variant.get("quality")
+        counts[variant["output"]] = convert_fms_format(
+            df, variant["output"],
+            variant.get("offset_km", 0.0), variant.get("azimuth_deg", 0.0),
+            variant.get("id_mode", "kms_time"), variant.get("fixed_id", "KMS"),
+            variant.get("add_quality", False),
+            bool(quality), quality.strip().upper() if quality else None,
+            variant.get("geodesic", "wgs84")
+        )
+    return counts
+
+def quality_output(output_txt, quality):
+    """多个质量等级时输出文件名加上等级：example_converted_A.txt"""
+    base, ext = os.path.splitext(output_txt)
+    return f"{base}_{quality}{ext}"
+
+def build_variants(args):
+    """由命令行参数生成输出列表：--config 文件中的每一项，或者按 --quality 每个等级一个文件"""
+    defaults = {
+        "offset_km": args.offset, "azimuth_deg": args.azimuth, "id_mode": args.id_mode,
+        "fixed_id": args.fixed_id, "add_quality": args.add_quality, "geodesic": args.geodesic,
+    }
+    if args.config:
+        with open(args.config, 'r', encoding='utf8') as f:
+            config = json.load(f)
+        items = config["outputs"] if isinstance(config, dict) else config
+        return [dict(defaults, **item) for item in items]
+    qualities = args.quality or [None]
+    variants = []
+    for quality in qualities:
+        output = args.output if len(qualities) == 1 else quality_output(args.output, quality)
+        variants.append(dict(defaults, output=output, quality=quality))
+    return variants
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="震源机制 CSV 转换为 GMT 沙滩球输入，CSV 只读一次，可以一次输出多个文件",
+        epilog="不带任何参数运行时使用原来的交互方式。\n"
+               "--config 为 JSON 文件: {\"outputs\": [{\"output\": \"a.txt\", \"offset_km\": 5, \"azimuth_deg\": 30, "
+               "\"id_mode\": \"fixed\", \"fixed_id\": \"KMS\", \"add_quality\": true, \"quality\": \"A\"}, ...]}，"
+               "每项缺省的参数取命令行的值",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_csv", nargs="?", default="example_fms.csv", help="震源机制 CSV")
+    parser.add_argument("-o", "--output", default="example_converted.txt", help="输出文件")
+    parser.add_argument("--offset", type=offset_value, default=0.0, help="偏移距离(km)，或 CSV 中的列名")
+    parser.add_argument("--azimuth", type=offset_value, default=0.0, help="偏移方向(度，北为0度，顺时针)，或 CSV 中的列名")
+    parser.add_argument("--id-mode", choices=["kms_time", "fixed"], default="kms_time", help="ID模式")
+    parser.add_argument("--fixed-id", default="KMS", help="固定ID前缀")
+    parser.add_argument("--add-quality", action="store_true", help="在ID后加上质量等级")
+    parser.add_argument("--quality", nargs="+", type=str.upper,
+                        help="只保留这些质量等级，多个等级时每个等级输出一个文件（文件名加 _A/_B/_C）")
+    parser.add_argument("--geodesic", choices=["wgs84", "sphere", "flat"], default="wgs84",
+                        help="偏移坐标的计算模型：WGS84 椭球(默认)、球面、平面近似")
+    parser.add_argument("--config", help="JSON 配置文件，列出要输出的全部文件")
+    args = parser.parse_args()
+    counts = run_batch(args.input_csv, build_variants(args))
+    print(f"共输出 {len(counts)} 个文件，{sum(counts.values())} 个事件")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        interactive()
+    else:
+        main()
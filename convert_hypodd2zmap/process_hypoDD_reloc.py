@@ -1,27 +1,26 @@
+# 读取 hypoDD.reloc, 按第 3,2,11,12,13,17,4,14,15 列写成 zmap 格式
+# (经度 纬度 年 月 日 震级 深度 时 分), 少于 17 列的行跳过
+# Usage: python process_hypoDD_reloc.py [hypoDD.reloc] [hypoDD_reloc_zmap.dat] [--chunksize N]
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.table_convert import FORMATS, convert_table
+
 input_file = 'hypoDD.reloc'
 output_file = 'hypoDD_reloc_zmap.dat'
 
-# 读取输入文件并提取指定列数据
-with open(input_file, 'r') as file:
-    lines = file.readlines()
+def main():
+    parser = argparse.ArgumentParser(description='hypoDD.reloc 转换为 zmap 格式')
+    parser.add_argument('input_file', nargs='?', default=input_file)
+    parser.add_argument('output_file', nargs='?', default=output_file)
+    parser.add_argument('--chunksize', type=int, default=100000, help='每块读取的行数')
+    args = parser.parse_args()
 
-data = []
-for line in lines:
-    columns = line.strip().split()
-    if len(columns) >= 17:
-        data.append([
-            columns[2],   # 第3列
-            columns[1],   # 第2列
-            columns[10],  # 第11列
-            columns[11],  # 第12列
-            columns[12],  # 第13列
-            columns[16],  # 第17列
-            columns[3],   # 第4列
-            columns[13],  # 第14列
-            columns[14]   # 第15列
-        ])
+    # 按块读取, 整列取出后一次写出
+    count = convert_table(args.input_file, args.output_file, FORMATS['hypodd-zmap'], args.chunksize)
+    print(f"转换完成, {count} 个事件, 结果已保存到 {args.output_file}")
 
-# 写入输出文件
-with open(output_file, 'w') as file:
-    for row in data:
-        file.write(' '.join(row) + '\n')
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,35 @@
 #  
 # 
-# Usage:
+# Usage: python convert_hypoinverse2zmap.py [输入目录] [输出zmap] [--chunksize N]
 # Yuan Yao@KMS 2025-04-08
 
-def convert_datetime(orig_time):
-    """将原始时间字符串分解为年、月、日、时、分"""
-    year = orig_time[:4]
-    month = orig_time[4:6]
-    day = orig_time[6:8]
-    hour = orig_time[8:10]
-    minute = orig_time[10:12]
-    return year, month, day, hour, minute
+import os
+import sys
+import argparse
 
-def convert_catalog(input_file, output_file):
-    """转换地震目录格式"""
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for line in infile:
-            # 分割每行数据
-            parts = line.strip().split()
-            if len(parts) < 5:
-                continue  # 跳过不完整的行
-                
-            orig_time = parts[0]
-            latitude = parts[1]
-            longitude = parts[2]
-            depth = parts[3]
-            magnitude = parts[4]
-            
-            # 处理时间
-            year, month, day, hour, minute = convert_datetime(orig_time)
-            
-            # 写入新格式
-            outfile.write(f"{longitude} {latitude} {year} {month} {day} {magnitude} {depth} {hour} {minute}\n")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.table_convert import FORMATS, convert_table
+
+def convert_catalog(input_file, output_file, chunksize=100000):
+    """
+    转换地震目录格式: 发震时刻 纬度 经度 深度 震级 -> 经度 纬度 年 月 日 震级 深度 时 分
+    时间 YYYYMMDDhhmm... 按字符位置整列切分出年、月、日、时、分, 少于 5 列的行跳过
+    :return: 转换的行数
+    """
+    return convert_table(input_file, output_file, FORMATS['hypoinverse-zmap'], chunksize)
 
 # 使用示例
 input_filename = "example_pal_hyp_good_gt_4_lonlat_manual_check_catalog.dat"
 output_filename = "example_pal_hyp_good_gt_4_lonlat_manual_check_catalog_zmap.dat"
 
-convert_catalog(input_filename, output_filename)
-print(f"转换完成，结果已保存到 {output_filename}")
+def main():
+    parser = argparse.ArgumentParser(description="hypoinverse 目录转换为 zmap 格式")
+    parser.add_argument("input_file", nargs="?", default=input_filename)
+    parser.add_argument("output_file", nargs="?", default=output_filename)
+    parser.add_argument("--chunksize", type=int, default=100000, help="每块读取的行数")
+    args = parser.parse_args()
+    convert_catalog(args.input_file, args.output_file, args.chunksize)
+    print(f"转换完成，结果已保存到 {args.output_file}")
+
+if __name__ == "__main__":
+    main()
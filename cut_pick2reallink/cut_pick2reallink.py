@@ -1,23 +1,73 @@
 #!/usr/bin/env python
 #!Written by Yao Yuan
+# 把拾取结果按月(或按天、按台站)拆分到 <关键字>.txt
+# Usage: python cut_pick2reallink.py [zsy_newmodel_test.txt] [--by month|day|station] [--max-open 256]
 
-file = open('zsy_newmodel_test.txt', 'r', encoding = 'utf8')
-file_dict = {}
-def get_file(key):
-    if key not in file_dict:
-        file_dict[key] = open('{}.txt'.format(key), 'w', encoding = 'utf8')
-    return file_dict[key]
-n = 0
-for line in file:
-    line = line.strip()
-    fields = line.split(',')
-    if line.startswith('#') or len(fields) < 4 or '-' not in fields[3]:
-        #print(line.strip())
-        continue
-    filename = fields[3][0:7].replace('-', '')
-    n += 1
-    print('\r', n, filename, end = '    ')
-    get_file(filename).write(line + "\n")
-file.close()
-for filename in file_dict:
-    file_dict[filename].close()
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.fanout import FanoutWriter
+
+# 输出文件的关键字: 第 4 列时间取到月/天, 或者第 1 列台站
+KEY_FUNCS = {
+    'month': lambda fields: fields[3][0:7].replace('-', ''),
+    'day': lambda fields: fields[3][0:10].replace('-', ''),
+    'station': lambda fields: fields[0].strip().replace(os.sep, '_'),
+}
+
+class Progress:
+    """限速的进度显示: 每 interval 秒最多刷新一次"""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.last = 0.0
+
+    def update(self, n, text='', force=False):
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            print('\r', n, text, end = '    ', flush = True)
+            self.last = now
+
+def cut_picks(input_file, by='month', outdir='.', max_open=256, flush_bytes=1 << 16):
+    """
+    按关键字拆分拾取文件, 返回 {关键字: 行数}
+    :param max_open: 同时打开的输出文件数上限
+    :param flush_bytes: 每个输出文件的内存缓冲大小
+    """
+    key_func = KEY_FUNCS[by]
+    progress = Progress()
+    n = 0
+    filename = ''
+    with open(input_file, 'r', encoding = 'utf8') as file, \
+            FanoutWriter(lambda key: os.path.join(outdir, '{}.txt'.format(key)),
+                         buffering = 1 << 16, max_open = max_open, flush_bytes = flush_bytes) as writer:
+        for line in file:
+            line = line.strip()
+            fields = line.split(',')
+            if line.startswith('#') or len(fields) < 4 or '-' not in fields[3]:
+                #print(line.strip())
+                continue
+            filename = key_func(fields)
+            n += 1
+            # 每 1024 行检查一次时间, 终端刷新不再成为瓶颈
+            if n & 1023 == 0:
+                progress.update(n, filename)
+            writer.write(filename, line + "\n")
+        progress.update(n, filename, force = True)
+        print()
+        return dict(writer.counts)
+
+def main():
+    parser = argparse.ArgumentParser(description = '按月/天/台站拆分拾取文件')
+    parser.add_argument('input_file', nargs = '?', default = 'zsy_newmodel_test.txt')
+    parser.add_argument('--by', choices = list(KEY_FUNCS), default = 'month', help = '输出文件的关键字(默认按月)')
+    parser.add_argument('--outdir', default = '.', help = '输出目录')
+    parser.add_argument('--max-open', type = int, default = 256, help = '同时打开的输出文件数上限')
+    args = parser.parse_args()
+    counts = cut_picks(args.input_file, by = args.by, outdir = args.outdir, max_open = args.max_open)
+    print('{} 个文件, {} 行'.format(len(counts), sum(counts.values())))
+
+if __name__ == '__main__':
+    main()
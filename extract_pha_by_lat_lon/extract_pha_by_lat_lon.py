@@ -1,19 +1,50 @@
 #  
 # Usage:python extract_pha_by_lat_lon.py example_pal_hyp_good.txt example_pal_hyp_full.pha output.pha --mode lat-lon --remove-id
 # -remove-id can remove pha id
+# --mode time-lat-lon --time-window 0.1 --tolerance 1e-4 同时按时间和经纬度容差匹配，一对一取误差最小的事件
+# --incremental 只处理 full.pha 上次运行之后追加的事件并追加到输出（检查点 output.pha.ckpt）
 # Yuan Yao@KMS 2025-04-03
 
 import sys
 import os
 import argparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+from phasetool.catalog import pal_time_to_ns
+from phasetool.selection import iter_mmap_batches, parse_headers
+from phasetool.mmap_scan import open_mmap, copy_blocks
+from phasetool.join import best_matches
+from phasetool.checkpoint import Checkpoint
+
+# 各匹配模式使用的列
+MODE_KEYS = {
+    "lat-lon": ("lat", "lon"),
+    "time": ("time",),
+    "time-lat-lon": ("time", "lat", "lon"),
+}
+
+def times_to_seconds(time_strs):
+    """20241114223008.27 格式的时间批量转为秒(float)，无法解析的为 NaN"""
+    try:
+        return pal_time_to_ns(time_strs) / 1e9
+    except ValueError:
+        seconds = np.full(len(time_strs), np.nan)
+        for i, time_str in enumerate(time_strs):
+            try:
+                seconds[i] = pal_time_to_ns([time_str])[0] / 1e9
+            except ValueError:
+                pass
+        return seconds
+
 def read_good_records(file_path, mode="lat-lon", tolerance=1e-4):
     """
     读取 example_pal_hyp_good.txt 的记录
-    :param mode: "lat-lon"（按经纬度）或 "time"（按时间）
-    :param tolerance: 浮点数容差
+    :param mode: 所有模式都读取时间和经纬度，按时间匹配的模式对无法解析的时间给出警告
+    :return: dict，time（秒）、lat、lon 数组，无法解析的时间为 NaN
     """
-    records = set()
+    times, lats, lons = [], [], []
     try:
         with open(file_path, 'r') as file:
             for line in file:
@@ -22,90 +53,176 @@ def read_good_records(file_path, mode="lat-lon", tolerance=1e-4):
                     parts = line.split()
                     if len(parts) >= 3:
                         try:
-                            if mode == "lat-lon":
-                                # 按经纬度匹配
-                                lat = round(float(parts[1]) / tolerance) * tolerance
-                                lon = round(float(parts[2]) / tolerance) * tolerance
-                                records.add((lat, lon))
-                            elif mode == "time":
-                                # 按时间匹配（标准化为 XXXXXX.0）
-                                time_str = parts[0]
-                                if '.' not in time_str:
-                                    time_str += ".0"
-                                records.add(time_str)
+                            lats.append(float(parts[1]))
+                            lons.append(float(parts[2]))
+                            times.append(parts[0])
                         except ValueError:
                             print(f"Warning: Invalid data in line: {line}")
-        return records
     except FileNotFoundError:
         print(f"Error: File {file_path} not found!")
         sys.exit(1)
+    seconds = times_to_seconds(times)
+    if "time" in MODE_KEYS.get(mode, ()):
+        # 时间无法解析（如秒为 60）的记录不会匹配到任何事件
+        for k in np.flatnonzero(np.isnan(seconds)):
+            print(f"Warning: Invalid time in record: {times[k]}")
+    return {
+        "time": seconds,
+        "lat": np.array(lats, dtype=np.float64),
+        "lon": np.array(lons, dtype=np.float64),
+    }
+
+def read_event_keys(input_pha, start=0, end=None):
+    """
+    第一遍读取：mmap 扫描，只解析事件行的时间和经纬度，同时记下每个事件块的字节范围
+    :param start, end: 只读取 [start, end) 字节范围
+    """
+    times, lats, lons, starts, ends = [], [], [], [], []
+    with open_mmap(input_pha) as mm:
+        for block_starts, block_ends, headers in iter_mmap_batches(mm, start, end):
+            fields = parse_headers(headers)
+            times.append(times_to_seconds([h.split(',', 1)[0] for h in headers]))
+            lats.append(fields['lat'])
+            lons.append(fields['lon'])
+            starts.append(block_starts)
+            ends.append(block_ends)
+    if not times:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"time": np.zeros(0), "lat": np.zeros(0), "lon": np.zeros(0), "start": empty, "end": empty}
+    return {"time": np.concatenate(times), "lat": np.concatenate(lats), "lon": np.concatenate(lons),
+            "start": np.concatenate(starts), "end": np.concatenate(ends)}
+
+def match_records(good_records, event_keys, mode="lat-lon", tolerance=1e-4, time_window=0.1):
+    """
+    网格哈希近似连接，一对一最佳匹配
+    :param tolerance: 经纬度容差（度）
+    :param time_window: 时间容差（秒）
+    :return: (记录下标, 事件下标, 误差)
+    """
+    keys = MODE_KEYS[mode]
+    tol = {"time": time_window, "lat": tolerance, "lon": tolerance}
+    # 时间减去公共起点，避免大数值损失精度
+    t0 = np.nanmin(np.concatenate([good_records["time"], event_keys["time"], [0.0]])) if "time" in keys else 0.0
+    def columns(table):
+        return np.column_stack([table[k] - t0 if k == "time" else table[k] for k in keys])
+    return best_matches(columns(good_records), columns(event_keys), [tol[k] for k in keys])
+
+def extract_stream(events, good_records, mode="lat-lon", remove_id=False, tolerance=1e-4, time_window=0.1):
+    """
+    流水线版本：输入输出都是 (事件行, [震相行]) 迭代器
+    一对一匹配需要全部事件，所以先把事件收集到内存，再按原顺序返回匹配的事件
+    """
+    events = list(events)
+    headers = [header for header, phases in events]
+    if headers:
+        fields = parse_headers(headers)
+        event_keys = {"time": times_to_seconds([h.split(',', 1)[0] for h in headers]),
+                      "lat": fields['lat'], "lon": fields['lon']}
+    else:
+        event_keys = {"time": np.zeros(0), "lat": np.zeros(0), "lon": np.zeros(0)}
+    record_idx, event_idx, score = match_records(
+        good_records, event_keys, mode=mode, tolerance=tolerance, time_window=time_window
+    )
+    for i in np.sort(event_idx).tolist():
+        header, phases = events[i]
+        # 移除编号（如 ,0）
+        if remove_id and ',' in header:
+            header = ','.join(header.split(',')[:-1])
+        yield header, phases
 
 def extract_events(
     input_pha, output_pha, good_records, mode="lat-lon",
-    remove_id=False, tolerance=1e-4
+    remove_id=False, tolerance=1e-4, time_window=0.1, report=None,
+    start=0, end=None, append=False, event_base=0, used_records=None
 ):
     """
     从 example_pal_hyp_full.pha 提取匹配的事件和震相行
+    第一遍解析事件行做匹配，第二遍只把匹配的事件写出
     :param remove_id: 是否移除事件行末尾的编号（如 ,0）
+    :param report: 匹配对照表的输出路径（记录序号 事件序号 误差）
+    :param start, end: 只处理 [start, end) 字节范围内的事件（增量模式）
+    :param append: 追加到 output_pha 和 report
+    :param event_base: report 中事件序号的起点（前面已处理的事件数）
+    :param used_records: 前几次已经匹配过的记录下标，不再参与匹配（增量模式保持一对一）
+    :return: (匹配的事件数, 读取的事件数, 匹配的记录下标)
     """
     try:
         if os.path.getsize(input_pha) == 0:
             print(f"Error: {input_pha} is empty!")
             sys.exit(1)
 
-        with open(input_pha, 'r') as infile, open(output_pha, 'w') as outfile:
-            current_event = None
-            write_mode = False
-            matched_events = 0
+        event_keys = read_event_keys(input_pha, start, end)
+        available = np.arange(len(good_records["lat"]))
+        if used_records is not None and len(used_records):
+            available = np.setdiff1d(available, np.asarray(used_records, dtype=np.int64))
+        records = {k: v[available] for k, v in good_records.items()}
+        record_idx, event_idx, score = match_records(
+            records, event_keys, mode=mode, tolerance=tolerance, time_window=time_window
+        )
+        # 换回 good_records 中的下标
+        record_idx = available[record_idx]
+        matched = np.zeros(len(event_keys["lat"]), dtype=bool)
+        matched[event_idx] = True
 
-            for line in infile:
-                line = line.strip()
-                if not line:
-                    continue
+        starts = event_keys["start"][matched]
+        ends = event_keys["end"][matched]
+        with open_mmap(input_pha) as mm, open(output_pha, 'ab' if append else 'wb') as outfile:
+            if not remove_id:
+                # 匹配的事件块（事件行 + 震相行）按原始字节复制
+                copy_blocks(mm, outfile, starts, ends)
+            else:
+                for start, end in zip(starts.tolist(), ends.tolist()):
+                    stop = mm.find(b'\n', start, end)
+                    stop = end if stop < 0 else stop + 1
+                    line = mm[start:stop].decode('utf8').strip()
+                    # 移除编号（如 ,0）
+                    if ',' in line:
+                        line = ','.join(line.split(',')[:-1])
+                    outfile.write((line + '\n').encode('utf8'))
+                    copy_blocks(mm, outfile, np.array([stop]), np.array([end]))
 
-                # 事件行（以数字开头）
-                if line[0].isdigit():
-                    parts = line.split(',')
-                    if len(parts) >= 3:
-                        try:
-                            match = False
-                            if mode == "lat-lon":
-                                # 按经纬度匹配
-                                lat = round(float(parts[1]) / tolerance) * tolerance
-                                lon = round(float(parts[2]) / tolerance) * tolerance
-                                match = (lat, lon) in good_records
-                            elif mode == "time":
-                                # 按时间匹配
-                                time_str = parts[0]
-                                if '.' in time_str:
-                                    time_str = time_str.split('.')[0] + ".0"
-                                match = time_str in good_records
-
-                            if match:
-                                current_event = line
-                                write_mode = True
-                                # 移除编号（如果启用）
-                                if remove_id and ',' in line:
-                                    line = ','.join(line.split(',')[:-1])
-                                outfile.write(line + '\n')
-                                matched_events += 1
-                            else:
-                                write_mode = False
-                        except ValueError:
-                            print(f"Warning: Invalid data in line: {line}")
-                            write_mode = False
-                # 震相行（以字母开头）
-                elif write_mode:
-                    outfile.write(line + '\n')
+        if report:
+            with open(report, 'a' if append else 'w') as f:
+                for i, j, e in zip(record_idx.tolist(), event_idx.tolist(), score.tolist()):
+                    f.write(f"{i} {j + event_base} {e:.4f}\n")
 
-            print(f"Matched {matched_events} events in {input_pha}.")
-            if matched_events == 0:
-                print("Warning: No matching events found!")
+        matched_events = len(event_idx)
+        print(f"Matched {matched_events} events in {input_pha}.")
+        print(f"Unmatched records: {len(records['lat']) - matched_events}")
+        if matched_events == 0:
+            print("Warning: No matching events found!")
+        return matched_events, len(event_keys["lat"]), record_idx
 
     except FileNotFoundError:
         print(f"Error: File {input_pha} not found!")
         sys.exit(1)
 
+def extract_incremental(good_txt, full_pha, output_pha, good_records, report=None, final=False, **options):
+    """
+    增量提取：只处理检查点之后追加的事件，追加到 output_pha
+    新追加的事件只和以前没有匹配过的记录匹配；good_txt 或匹配参数变化时从头处理
+    :param final: full_pha 已经写完，最后一个事件也处理（否则留到下次）
+    :return: 本次匹配的事件数
+    """
+    outputs = [output_pha] + ([report] if report else [])
+    checkpoint = Checkpoint(full_pha, outputs, params=dict(options, good_txt=os.path.abspath(good_txt),
+                                                           good_size=os.path.getsize(good_txt)))
+    offset, state = checkpoint.resume()
+    end = checkpoint.end(final=final)
+    events = state.get("events", 0)
+    used_records = state.get("matched_records", [])
+    matched = 0
+    if end > offset:
+        matched, n, record_idx = extract_events(full_pha, output_pha, good_records, report=report,
+                                                start=offset, end=end, append=checkpoint.resumed,
+                                                event_base=events, used_records=used_records, **options)
+        events += n
+        used_records = sorted(used_records + record_idx.tolist())
+    else:
+        print("No new events.")
+    checkpoint.save(end, events=events, matched_records=used_records)
+    return matched
+
 def main():
     parser = argparse.ArgumentParser(
         description="Extract earthquake events from example_pal_hyp_full.pha based on example_pal_hyp_good.txt."
@@ -114,24 +231,45 @@ def main():
     parser.add_argument("full_pha", help="Path to example_pal_hyp_full.pha")
     parser.add_argument("output_pha", help="Path to output example_pal_hyp_good.pha")
     parser.add_argument(
-        "--mode", choices=["lat-lon", "time"], default="lat-lon",
-        help="Matching mode: 'lat-lon' (default) or 'time'"
+        "--mode", choices=list(MODE_KEYS), default="lat-lon",
+        help="Matching mode: 'lat-lon' (default), 'time' or 'time-lat-lon'"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=1e-4,
+        help="Lat/lon tolerance in degrees (default 1e-4)"
+    )
+    parser.add_argument(
+        "--time-window", type=float, default=0.1,
+        help="Origin time tolerance in seconds (default 0.1)"
+    )
+    parser.add_argument(
+        "--report", help="Write matched pairs (record index, event index, misfit) to this file"
     )
     parser.add_argument(
         "--remove-id", action="store_true",
         help="Remove the trailing ID from event lines (e.g., ',0')"
     )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only process events appended to full_pha since the last run and append them to output_pha"
+    )
+    parser.add_argument(
+        "--final", action="store_true",
+        help="With --incremental: full_pha is complete, also process its last event (otherwise held for the next run)"
+    )
     args = parser.parse_args()
 
     print(f"Reading records from {args.good_txt} (mode: {args.mode})...")
     good_records = read_good_records(args.good_txt, mode=args.mode)
-    print(f"Found {len(good_records)} unique records.")
+    print(f"Found {len(good_records['lat'])} records.")
 
     print(f"Extracting matching events from {args.full_pha} to {args.output_pha}...")
-    extract_events(
-        args.full_pha, args.output_pha, good_records,
-        mode=args.mode, remove_id=args.remove_id
-    )
+    options = dict(mode=args.mode, remove_id=args.remove_id, tolerance=args.tolerance, time_window=args.time_window)
+    if not args.incremental:
+        extract_events(args.full_pha, args.output_pha, good_records, report=args.report, **options)
+        return
+    extract_incremental(args.good_txt, args.full_pha, args.output_pha, good_records, report=args.report,
+                        final=args.final, **options)
 
 if __name__ == "__main__":
     main()
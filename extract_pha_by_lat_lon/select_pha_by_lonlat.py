@@ -1,8 +1,24 @@
 #  
 # 
-# Usage:python extract_pha_by_lat_lon.py example_pal_hyp_good.txt example_pal_hyp_full.pha output.pha --mode lat-lon -remove-id
+# Usage:python select_pha_by_lonlat.py example_pal_hyp_good_gt_4.pha filtered_events.pha --box 98.0 98.2 24.19 24.38
+#       python select_pha_by_lonlat.py in.pha out.pha --polygon area.txt --circle 98.1 24.3 15 --depth 0 20 --mag 1 9
+# 多个 --box/--polygon/--circle 取并集, --depth/--mag 对所有区域生效
+#       python select_pha_by_lonlat.py in.pha --regions regions.txt --outdir regions/
+# --regions 读一遍输入, 每个区域输出到 outdir/名称.pha, 区域文件格式见 phasetool/selection.py read_regions
+# --incremental 只处理上次运行之后追加的事件并追加到输出(检查点 out.pha.ckpt), 输入不断增长时每天只处理新数据
 # Yuan Yao@KMS 2025-04-07
 
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events
+from phasetool.catalog import PhaseCatalog
+from phasetool.parallel import run_chunks, temp_path, concat_outputs
+from phasetool.checkpoint import Checkpoint
+from phasetool.selection import Region, select_events_mmap, select_events_multi, select_catalog, read_polygon, read_regions
+
 def is_event_header(line):
     """检查是否是事件头行（包含日期、经纬度等信息）"""
     line = line.strip()
@@ -17,62 +33,139 @@ def filter_by_coordinates(input_file, output_file, min_lon, max_lon, min_lat, ma
     total_count = 0
     
     with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        current_event = []
-        in_selected_area = False
-        
-        for line in infile:
-            stripped_line = line.strip()
-            
-            # 如果是事件头行
-            if is_event_header(stripped_line):
-                total_count += 1
-                # 如果有正在处理的事件，且在当前区域，则写入
-                if current_event and in_selected_area:
-                    outfile.writelines(current_event)
-                    selected_count += 1
-                
-                # 开始新事件
-                current_event = [line]
-                parts = stripped_line.split(',')
-                try:
-                    lon = float(parts[2])  # 经度是第三列
-                    lat = float(parts[1])  # 纬度是第二列
-                    in_selected_area = (min_lon <= lon <= max_lon) and (min_lat <= lat <= max_lat)
-                except (IndexError, ValueError):
-                    in_selected_area = False
+        for header, phases in iter_events(infile, is_header=is_event_header):
+            total_count += 1
+            parts = header.split(',')
+            try:
+                lon = float(parts[2])  # 经度是第三列
+                lat = float(parts[1])  # 纬度是第二列
+                in_selected_area = (min_lon <= lon <= max_lon) and (min_lat <= lat <= max_lat)
+            except (IndexError, ValueError):
+                in_selected_area = False
             
-            # 如果是震相数据行或空行
-            else:
-                if current_event:
-                    current_event.append(line)
-        
-        # 写入最后一个事件（如果在选定区域内）
-        if current_event and in_selected_area:
-            outfile.writelines(current_event)
-            selected_count += 1
+            # 在选定区域内的事件写入标题行和震相行
+            if in_selected_area:
+                outfile.write(header + '\n')
+                for line in phases:
+                    outfile.write(line + '\n')
+                selected_count += 1
     
     return total_count, selected_count
 
+def filter_catalog_by_coordinates(catalog, output_file, min_lon, max_lon, min_lat, max_lat):
+    """列式目录(.npz)的经纬度筛选，用掩码一次判断全部事件"""
+    return select_catalog(catalog, output_file, [Region(box=(min_lon, max_lon, min_lat, max_lat))])
+
+def build_regions(args):
+    """根据命令行参数生成区域列表"""
+    depth = tuple(args.depth) if args.depth else None
+    mag = tuple(args.mag) if args.mag else None
+    regions = []
+    for box in args.box or []:
+        regions.append(Region(box=box, depth=depth, mag=mag))
+    for path in args.polygon or []:
+        regions.append(Region(polygon=read_polygon(path), depth=depth, mag=mag))
+    for circle in args.circle or []:
+        regions.append(Region(circle=circle, depth=depth, mag=mag))
+    if not regions:
+        # 没有给出区域时使用默认经纬度范围
+        regions.append(Region(box=DEFAULT_BOX, depth=depth, mag=mag))
+    return regions
+
+def select_chunk(input_file, start, end, regions, output_file):
+    """并行处理的一块，返回 (临时文件, 总事件数, 选中事件数)"""
+    part = temp_path(output_file)
+    total, selected = select_events_mmap(input_file, part, regions, start, end)
+    return part, total, selected
+
+def select_parallel(input_file, output_file, regions, jobs, start=0, end=None, append=False):
+    """按事件边界分块多进程筛选，按原顺序拼接"""
+    results = run_chunks(input_file, select_chunk, args=(regions, output_file), jobs=jobs, start=start, end=end)
+    concat_outputs([r[0] for r in results], output_file, append=append)
+    return sum(r[1] for r in results), sum(r[2] for r in results)
+
+def select_incremental(input_file, output_file, regions, jobs=1, final=False):
+    """
+    增量筛选：只处理检查点之后追加的事件，追加到 output_file
+    :param final: 输入已经写完，最后一个事件也处理（否则留到下次）
+    :return: (本次事件数, 本次选中事件数, 累计事件数, 累计选中事件数)
+    """
+    checkpoint = Checkpoint(input_file, [output_file], params=[vars(r) for r in regions])
+    offset, state = checkpoint.resume()
+    end = checkpoint.end(final=final)
+    if jobs > 1:
+        total, selected = select_parallel(input_file, output_file, regions, jobs, offset, end, checkpoint.resumed)
+    else:
+        total, selected = select_events_mmap(input_file, output_file, regions, offset, end, checkpoint.resumed)
+    all_total = state.get("total", 0) + total
+    all_selected = state.get("selected", 0) + selected
+    checkpoint.save(end, total=all_total, selected=all_selected)
+    return total, selected, all_total, all_selected
+
+# 默认参数
+DEFAULT_INPUT = "example_pal_hyp_good_gt_4.pha"  # 输入文件名
+DEFAULT_OUTPUT = "filtered_events.pha"      # 输出文件名
+DEFAULT_BOX = (98.0, 98.2, 24.19, 24.38)    # 最小经度, 最大经度, 最小纬度, 最大纬度
+
 def main():
-    # 直接在脚本中设置参数
-    input_file = "example_pal_hyp_good_gt_4.pha"  # 输入文件名
-    output_file = "filtered_events.pha"      # 输出文件名
-    min_lon = 98.0   # 最小经度
-    max_lon = 98.2   # 最大经度
-    min_lat = 24.19   # 最小纬度
-    max_lat = 24.38   # 最大纬度
+    parser = argparse.ArgumentParser(description="按经纬度范围、多边形、半径、深度、震级筛选地震事件")
+    parser.add_argument("input_file", nargs="?", default=DEFAULT_INPUT, help="输入 .pha 或 .npz 目录")
+    parser.add_argument("output_file", nargs="?", default=DEFAULT_OUTPUT, help="输出 .pha")
+    parser.add_argument("--box", nargs=4, type=float, action="append",
+                        metavar=("MIN_LON", "MAX_LON", "MIN_LAT", "MAX_LAT"), help="经纬度矩形")
+    parser.add_argument("--polygon", action="append", help="多边形文件，每行 lon lat")
+    parser.add_argument("--circle", nargs=3, type=float, action="append",
+                        metavar=("LON", "LAT", "RADIUS_KM"), help="圆心和大圆半径(km)")
+    parser.add_argument("--depth", nargs=2, type=float, metavar=("MIN", "MAX"), help="深度范围(km)")
+    parser.add_argument("--mag", nargs=2, type=float, metavar=("MIN", "MAX"), help="震级范围")
+    parser.add_argument("--regions", help="区域列表文件，一次读取输入分别输出每个区域")
+    parser.add_argument("--outdir", default=".", help="--regions 模式的输出目录")
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数")
+    parser.add_argument("--incremental", action="store_true", help="只处理上次运行之后追加的事件，追加到输出文件")
+    parser.add_argument("--final", action="store_true", help="增量模式下输入已经写完，最后一个事件也处理（否则留到下次）")
+    args = parser.parse_args()
+    input_file = args.input_file
+    output_file = args.output_file
+    
+    if args.incremental and (args.regions or input_file.endswith('.npz')):
+        parser.error("--incremental 只用于 .pha 输入，不能和 --regions 同时使用")
+    if args.regions:
+        regions = read_regions(args.regions)
+        total, counts = select_events_multi(input_file, regions, args.outdir)
+        print(f"输入文件: {input_file}")
+        print(f"总事件数: {total}")
+        for name, count in counts.items():
+            print(f"{name}: {count} 个事件 -> {os.path.join(args.outdir, name + '.pha')}")
+        return
+    regions = build_regions(args)
     
-    total, selected = filter_by_coordinates(input_file, output_file, min_lon, max_lon, min_lat, max_lat)
+    if input_file.endswith('.npz'):
+        catalog = PhaseCatalog.load(input_file, mmap=True)
+        total, selected = select_catalog(catalog, output_file, regions)
+    elif args.incremental:
+        total, selected, all_total, all_selected = select_incremental(input_file, output_file, regions, args.jobs, args.final)
+        print(f"新追加的事件数: {total}，选中: {selected}")
+        total, selected = all_total, all_selected
+    elif args.jobs > 1:
+        total, selected = select_parallel(input_file, output_file, regions, args.jobs)
+    else:
+        total, selected = select_events_mmap(input_file, output_file, regions)
     
     # 打印结果
     print("地震事件筛选结果：")
     print(f"输入文件: {input_file}")
     print(f"输出文件: {output_file}")
-    print(f"经度范围: {min_lon} 到 {max_lon}")
-    print(f"纬度范围: {min_lat} 到 {max_lat}")
+    for region in regions:
+        if region.box is not None:
+            print(f"经度范围: {region.box[0]} 到 {region.box[1]}")
+            print(f"纬度范围: {region.box[2]} 到 {region.box[3]}")
+        if region.polygon is not None:
+            print(f"多边形: {len(region.polygon)} 个顶点")
+        if region.circle is not None:
+            print(f"圆心: {region.circle[0]}, {region.circle[1]} 半径: {region.circle[2]} km")
     print(f"总事件数: {total}")
     print(f"筛选出的事件数: {selected}")
     print(f"筛选完成，结果已保存到 {output_file}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,7 +3,19 @@
 # Usage:python extract_pha_by_lat_lon.py example_pal_hyp_good.txt example_pal_hyp_full.pha output.pha --mode lat-lon -remove-id
 # Yuan Yao@KMS 2025-04-07
 
+import os
 import sys
+import argparse
+from bisect import bisect_left
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events
+from phasetool.catalog import PhaseCatalog
+from phasetool.parallel import run_chunks, iter_range_lines, temp_path, concat_outputs
+from phasetool.fanout import FanoutWriter
+from phasetool.mmap_scan import open_mmap, iter_block_batches, copy_blocks
 
 def is_event_header(line):
     """检查是否是事件头行（包含日期、经纬度等信息）"""
@@ -13,80 +25,210 @@ def is_event_header(line):
     parts = line.split(',')
     return len(parts) >= 5 and all(part.replace('.', '').replace('-', '').isdigit() for part in parts[:5])
 
-def process_pha_file(input_file, max_phases):
-    """处理PHA文件并返回分类后的事件列表"""
-    events_leq = []  # 震相行≤max_phases的事件
-    events_gt = []   # 震相行>max_phases的事件
-    
-    with open(input_file, 'r') as f:
-        current_event = []
-        phase_count = 0
-        
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue  # 跳过空行
-            
-            if is_event_header(line):
-                # 保存上一个事件（如果有）
-                if current_event:
-                    if phase_count <= max_phases:
-                        events_leq.append(current_event)
-                    else:
-                        events_gt.append(current_event)
-                
-                # 开始新事件
-                current_event = [line]
-                phase_count = 0
-            else:
-                current_event.append(line)
-                phase_count += 1
-        
-        # 处理最后一个事件
-        if current_event:
-            if phase_count <= max_phases:
-                events_leq.append(current_event)
+def count_stations(header, phases):
+    """台站数（同一台站多行只算一次）"""
+    return len({phase.split(',', 1)[0] for phase in phases})
+
+def ps_ratio(header, phases):
+    """P 震相数 / S 震相数，没有 S 震相时返回 None"""
+    n_p = n_s = 0
+    for phase in phases:
+        parts = phase.split(',')
+        n_p += len(parts) > 1 and bool(parts[1].strip())
+        n_s += len(parts) > 2 and bool(parts[2].strip())
+    return n_p / n_s if n_s else None
+
+def event_mag(header, phases):
+    """事件行第 5 列震级，没有或无法解析时返回 None"""
+    try:
+        return float(header.split(',')[4])
+    except (IndexError, ValueError):
+        return None
+
+# 拆分依据：震相行数、台站数、P/S 比、震级
+SPLIT_KEYS = {
+    'phases': lambda header, phases: len(phases),
+    'stations': count_stations,
+    'ps_ratio': ps_ratio,
+    'mag': event_mag,
+}
+
+def bucket_names(thresholds, key='phases'):
+    """
+    阈值 [t0, t1, ...] 对应的分组名称：leq_t0, gt_t0_leq_t1, ..., gt_tn
+    按震相行数拆分时没有前缀，与原来的 _leq_N / _gt_N 文件名相同
+    """
+    prefix = '' if key == 'phases' else key + '_'
+    t = ['{:g}'.format(v) for v in thresholds]
+    names = [f"{prefix}leq_{t[0]}"]
+    names += [f"{prefix}gt_{a}_leq_{b}" for a, b in zip(t, t[1:])]
+    names.append(f"{prefix}gt_{t[-1]}")
+    return names
+
+def unknown_name(key):
+    """拆分依据无法计算的事件（如没有震级）单独成组"""
+    return f"{key}_unknown"
+
+def output_path(base_name, name):
+    return f"{base_name}_{name}.pha"
+
+def split_mmap(input_file, thresholds, path_for_name, start=0, end=None, write=True):
+    """
+    按震相行数拆分的快速路径：mmap 扫描只统计每个事件块的震相行数，事件块按原始字节写出
+    :return: {分组名称: 事件数}
+    """
+    names = bucket_names(thresholds)
+    counts = dict.fromkeys(names, 0)
+    edges = np.asarray(thresholds)
+    with open_mmap(input_file) as mm, FanoutWriter(path_for_name, mode='wb') as writer:
+        if write:
+            for name in names:
+                writer.get_file(name)
+        for starts, ends, n_phases in iter_block_batches(mm, start=start, end=end):
+            bucket = np.searchsorted(edges, n_phases, side='left')
+            for k, n in enumerate(np.bincount(bucket, minlength=len(names)).tolist()):
+                counts[names[k]] += n
+                if write and n:
+                    mask = bucket == k
+                    copy_blocks(mm, writer.get_file(names[k]), starts[mask], ends[mask])
+    return counts
+
+def split_events(events, thresholds, key, path_for_name, write=True):
+    """
+    按任意拆分依据流式拆分：每来一个事件就写到所在分组的文件，内存只保留一个事件
+    :param events: (事件行, [震相行]) 迭代器
+    :return: {分组名称: 事件数}
+    """
+    names = bucket_names(thresholds, key)
+    counts = dict.fromkeys(names, 0)
+    key_func = SPLIT_KEYS[key]
+    with FanoutWriter(path_for_name) as writer:
+        if write:
+            for name in names:
+                writer.get_file(name)
+        for header, phases in events:
+            value = key_func(header, phases)
+            if value is None or value != value:
+                name = unknown_name(key)
             else:
-                events_gt.append(current_event)
-    
-    return events_leq, events_gt
+                name = names[bisect_left(thresholds, value)]
+            counts[name] = counts.get(name, 0) + 1
+            if write:
+                writer.write(name, '\n'.join([header] + phases) + '\n')
+    return counts
 
-def write_events_to_file(events, output_file):
-    """将事件列表写入文件"""
-    with open(output_file, 'w') as f:
-        for event in events:
-            f.write('\n'.join(event) + '\n')
+def split_stream(input_file, thresholds, key, path_for_name, write=True):
+    """
+    :param input_file: 文件路径或按行迭代的对象
+    :return: {分组名称: 事件数}
+    """
+    return split_events(iter_events(input_file, is_header=is_event_header), thresholds, key, path_for_name, write)
 
-def main():
-    if len(sys.argv) != 3:
-        print("使用方法: python split_phases.py <输入文件> <最大震相行数>")
-        print("示例: python split_phases.py example_pal_hyp_good.pha 12")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
+def split_file(input_file, thresholds, key, path_for_name, start=0, end=None, write=True):
+    """读一遍输入完成拆分和统计，按震相行数拆分时走 mmap 快速路径"""
+    if key == 'phases':
+        return split_mmap(input_file, thresholds, path_for_name, start, end, write)
+    if start != 0 or end is not None:
+        input_file = iter_range_lines(input_file, start, end)
+    return split_stream(input_file, thresholds, key, path_for_name, write)
+
+def split_chunk(input_file, start, end, thresholds, key, base_name, write):
+    """并行处理的一块：每个分组写到一个临时文件，返回 ({分组名称: 临时文件}, {分组名称: 事件数})"""
+    parts = {}
+    def path_for_name(name):
+        if name not in parts:
+            parts[name] = temp_path(output_path(base_name, name))
+        return parts[name]
+    counts = split_file(input_file, thresholds, key, path_for_name, start, end, write)
+    return parts, counts
+
+def split_parallel(input_file, thresholds, key, base_name, jobs, write=True):
+    """按事件边界分块，多进程拆分后每个分组按原顺序拼接，返回 {分组名称: 事件数}"""
+    results = run_chunks(input_file, split_chunk, args=(thresholds, key, base_name, write),
+                         jobs=jobs, is_header=is_event_header)
+    counts = {}
+    for _, chunk_counts in results:
+        for name, n in chunk_counts.items():
+            counts[name] = counts.get(name, 0) + n
+    if write:
+        for name in counts:
+            parts = [r[0][name] for r in results if name in r[0]]
+            if parts:
+                concat_outputs(parts, output_path(base_name, name))
+    return counts
+
+def split_catalog(catalog, thresholds, key='phases'):
+    """列式目录按震相数或震级用掩码拆分，返回 {分组名称: 目录}"""
+    if key == 'phases':
+        values = catalog.events['n_phases']
+    elif key == 'mag':
+        values = catalog.events['mag'].astype(np.float64)
+    else:
+        raise ValueError(f".npz 目录不支持按 {key} 拆分")
+    names = bucket_names(thresholds, key)
+    bucket = np.searchsorted(np.asarray(thresholds), values, side='left')
+    if key == 'mag':
+        bucket[np.isnan(values)] = -1
+    result = {name: catalog.select(bucket == k) for k, name in enumerate(names)}
+    if (bucket < 0).any():
+        result[unknown_name(key)] = catalog.select(bucket < 0)
+    return result
+
+def parse_thresholds(text, key):
+    """'4' 或 '4,8,12'，震相数和台站数为整数"""
+    cast = int if key in ('phases', 'stations') else float
     try:
-        max_phases = int(sys.argv[2])
+        thresholds = sorted(cast(v) for v in text.split(','))
     except ValueError:
-        print("错误: 最大震相行数必须是整数")
-        sys.exit(1)
+        raise argparse.ArgumentTypeError(f"阈值必须是{'整数' if cast is int else '数字'}: {text}")
+    return thresholds
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="按震相行数（或台站数、P/S 比、震级）把事件拆分到多个文件，读一遍输入同时给出各组事件数",
+        epilog="示例: python split_phases.py example_pal_hyp_good.pha 12\n"
+               "      python split_phases.py example_pal_hyp_good.pha 4,8,12 --key stations\n"
+               "输入也可以是 python -m phasetool.catalog 生成的 .npz 目录",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_file", help="输入 .pha 或 .npz 目录")
+    parser.add_argument("thresholds", help="阈值，多个用逗号分隔；事件按 值<=t0, t0<值<=t1, ..., 值>tn 分组")
+    parser.add_argument("--key", choices=list(SPLIT_KEYS), default="phases", help="拆分依据（默认震相行数）")
+    parser.add_argument("--histogram", action="store_true", help="只统计各组事件数，不写文件")
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数")
+    parser.add_argument("--base", help="输出文件名前缀（默认为输入文件名去掉扩展名），输出为 <前缀>_<分组>.pha")
+    args = parser.parse_args()
+    input_file = args.input_file
+    try:
+        thresholds = parse_thresholds(args.thresholds, args.key)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    write = not args.histogram
     
     # 生成输出文件名
-    base_name = input_file.rsplit('.', 1)[0]
-    output_leq = f"{base_name}_leq_{max_phases}.pha"
-    output_gt = f"{base_name}_gt_{max_phases}.pha"
-    
-    # 处理文件
-    events_leq, events_gt = process_pha_file(input_file, max_phases)
+    base_name = args.base or input_file.rsplit('.', 1)[0]
     
-    # 写入文件
-    write_events_to_file(events_leq, output_leq)
-    write_events_to_file(events_gt, output_gt)
+    # 处理文件并写入
+    if input_file.endswith('.npz'):
+        # 列式目录直接内存映射，用掩码拆分
+        catalog = PhaseCatalog.load(input_file, mmap=True)
+        groups = split_catalog(catalog, thresholds, args.key)
+        if write:
+            for name, group in groups.items():
+                group.to_pha(output_path(base_name, name))
+        counts = {name: len(group) for name, group in groups.items()}
+    elif args.jobs > 1:
+        counts = split_parallel(input_file, thresholds, args.key, base_name, args.jobs, write)
+    else:
+        counts = split_file(input_file, thresholds, args.key, lambda name: output_path(base_name, name), write=write)
     
     # 输出统计信息
-    print(f"处理完成:")
-    print(f"- 震相行 ≤ {max_phases} 的事件: {len(events_leq)} 个 (保存到 {output_leq})")
-    print(f"- 震相行 > {max_phases} 的事件: {len(events_gt)} 个 (保存到 {output_gt})")
-    print(f"总事件数: {len(events_leq) + len(events_gt)}")
+    total = sum(counts.values())
+    print(f"处理完成（拆分依据: {args.key}）:")
+    for name, n in counts.items():
+        percent = 100.0 * n / total if total else 0.0
+        target = f" (保存到 {output_path(base_name, name)})" if write else ""
+        print(f"- {name}: {n} 个事件 {percent:.1f}%{target}")
+    print(f"总事件数: {total}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,3 @@
+'''
+phasetool: 各转换脚本共用的震相文件处理模块
+'''
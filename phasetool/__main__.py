@@ -0,0 +1,6 @@
+'''
+python -m phasetool <子命令> [参数...], 见 phasetool/cli.py
+'''
+from phasetool.cli import main
+
+main()
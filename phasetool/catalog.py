@@ -0,0 +1,278 @@
+'''
+紧凑的列式震相目录(NumPy 结构化数组), 代替按字符串保存事件的列表
+1. events: 每个事件一行, 发震时刻为 int64 纳秒, 经纬度/深度/震级为 float32
+2. phases: 每个震相一行, 台站为 stations 表中的序号, 到时为 int64 纳秒
+3. save/load 使用不压缩的 .npz, load(mmap=True) 直接内存映射各个数组
+
+转换: python -m phasetool.catalog example_pal_hyp_good.pha example_pal_hyp_good.npz
+'''
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from phasetool.pha_reader import iter_events, is_header
+from phasetool.timeparse import NAT, parse_times_ns
+
+EVENT_DTYPE = np.dtype([
+    ('origin_ns', '<i8'),
+    ('lat', '<f4'),
+    ('lon', '<f4'),
+    ('depth', '<f4'),
+    ('mag', '<f4'),
+    ('evid', '<i8'),        # 标题行末尾的编号, 没有为 -1
+    ('phase_start', '<i8'),
+    ('n_phases', '<i4'),
+])
+
+
+def phase_dtype(n_extra):
+    """震相数组的类型, extra 保存到时之后的数值列(振幅、权重等)"""
+    return np.dtype([
+        ('station', '<i4'),
+        ('tp_ns', '<i8'),
+        ('ts_ns', '<i8'),
+        ('extra', '<f8', (n_extra,)),
+    ])
+
+
+def pal_time_to_ns(values):
+    """20241114223008.27 格式的时间字符串数组转为 int64 纳秒"""
+    return parse_times_ns(values)
+
+
+def iso_time_to_ns(values):
+    """2024-11-14T22:30:10.600000Z 格式的时间字符串数组转为 int64 纳秒, 空字符串为 NaT"""
+    return parse_times_ns(values)
+
+
+def ns_to_pal_time(ns):
+    """int64 纳秒数组转为 20241114223008.27 格式"""
+    ns = np.asarray(ns, dtype=np.int64)
+    sec = np.datetime_as_string(ns.view('datetime64[ns]').astype('datetime64[s]'), unit='s')
+    cs = (ns % 10**9) // 10**7
+    return ['{}{}{}{}{}{}.{:02d}'.format(s[0:4], s[5:7], s[8:10], s[11:13], s[14:16], s[17:19], c)
+            for s, c in zip(sec, cs.tolist())]
+
+
+def ns_to_iso_time(ns):
+    """int64 纳秒数组转为 2024-11-14T22:30:10.600000Z 格式, NaT 为空字符串"""
+    ns = np.asarray(ns, dtype=np.int64)
+    out = np.char.add(np.datetime_as_string(ns.view('datetime64[ns]'), unit='us'), 'Z')
+    out[ns == NAT] = ''
+    return out
+
+
+def _format_float32(values):
+    return [np.format_float_positional(v, trim='0') for v in np.asarray(values, dtype=np.float32)]
+
+
+def _mmap_npz_member(path, info):
+    """不解压直接内存映射 .npz 里的一个 .npy 数组(要求 ZIP_STORED)"""
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len = int.from_bytes(local[26:28], 'little')
+        extra_len = int.from_bytes(local[28:30], 'little')
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if shape == () or 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran else 'C')
+
+
+class PhaseCatalog:
+    """
+    列式震相目录
+    :param events: EVENT_DTYPE 结构化数组
+    :param phases: phase_dtype(n) 结构化数组, 每个事件的震相是 phases[phase_start:phase_start+n_phases]
+    :param stations: 台站名数组(NET.STA)
+    :param extra_is_int: 每个 extra 列是否按整数写回文本
+    """
+
+    def __init__(self, events, phases, stations, extra_is_int=None):
+        self.events = events
+        self.phases = phases
+        self.stations = np.asarray(stations, dtype=str)
+        n_extra = phases.dtype['extra'].shape[0] if phases.dtype['extra'].shape else 0
+        if extra_is_int is None:
+            extra_is_int = np.zeros(n_extra, dtype=bool)
+        self.extra_is_int = np.asarray(extra_is_int, dtype=bool)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def n_phases(self):
+        return int(self.events['n_phases'].sum())
+
+    @classmethod
+    def from_pha(cls, file_or_path, is_header=is_header, chunk_size=200000):
+        """
+        读取 PAL 格式的 .pha 文件
+        标题行: 20241114223008.27,lat,lon,depth,mag[,id]
+        震相行: NET.STA,tp,ts[,数值列...]
+        :param chunk_size: 每读多少个震相转换一次数组, 控制中间列表的大小
+        """
+        station_ids = {}
+        event_chunks = []
+        phase_chunks = []
+        headers = []
+        rows = []
+        n_extra = 0
+        extra_is_int = []
+        phase_total = 0
+
+        def flush():
+            nonlocal phase_total
+            if headers:
+                ev = np.zeros(len(headers), dtype=EVENT_DTYPE)
+                ev['origin_ns'] = pal_time_to_ns([h[0] for h, n in headers])
+                for k, name in enumerate(('lat', 'lon', 'depth', 'mag'), 1):
+                    ev[name] = [float(h[k]) if len(h) > k and h[k] else np.nan for h, n in headers]
+                ev['evid'] = [int(h[5]) if len(h) > 5 and h[5] else -1 for h, n in headers]
+                counts = np.array([n for h, n in headers], dtype=np.int32)
+                ev['n_phases'] = counts
+                ev['phase_start'] = phase_total + np.concatenate(([0], np.cumsum(counts[:-1], dtype=np.int64)))
+                phase_total += int(counts.sum())
+                event_chunks.append(ev)
+                headers.clear()
+            if rows:
+                part = np.zeros(len(rows), dtype=phase_dtype(n_extra))
+                part['station'] = [r[0] for r in rows]
+                part['tp_ns'] = iso_time_to_ns([r[1] for r in rows])
+                part['ts_ns'] = iso_time_to_ns([r[2] for r in rows])
+                if n_extra:
+                    part['extra'] = [[float(v) for v in r[3]] + [np.nan] * (n_extra - len(r[3])) for r in rows]
+                phase_chunks.append(part)
+                rows.clear()
+
+        for header, lines in iter_events(file_or_path, is_header=is_header):
+            n = 0
+            for line in lines:
+                values = line.split(',')
+                if len(values) < 3:
+                    continue
+                n += 1
+                sid = station_ids.setdefault(values[0], len(station_ids))
+                extra = values[3:]
+                if len(extra) > n_extra:
+                    extra_is_int.extend([True] * (len(extra) - n_extra))
+                    n_extra = len(extra)
+                for k, v in enumerate(extra):
+                    if extra_is_int[k] and not v.lstrip('-').isdigit():
+                        extra_is_int[k] = False
+                rows.append((sid, values[1], values[2], extra))
+            headers.append((header.split(','), n))
+            if len(rows) >= chunk_size:
+                flush()
+        flush()
+
+        # 前面的块可能数值列较少, 合并时用 NaN 补齐
+        phases = np.zeros(sum(len(c) for c in phase_chunks), dtype=phase_dtype(n_extra))
+        phases['extra'] = np.nan
+        pos = 0
+        for chunk in phase_chunks:
+            part = phases[pos:pos + len(chunk)]
+            for name in ('station', 'tp_ns', 'ts_ns'):
+                part[name] = chunk[name]
+            k = chunk.dtype['extra'].shape[0] if chunk.dtype['extra'].shape else 0
+            part['extra'][:, :k] = chunk['extra'].reshape(len(chunk), k)
+            pos += len(chunk)
+        events = np.concatenate(event_chunks) if event_chunks else np.zeros(0, dtype=EVENT_DTYPE)
+        stations = sorted(station_ids, key=station_ids.get)
+        return cls(events, phases, stations, extra_is_int)
+
+    def save(self, path):
+        """保存为不压缩的 .npz, 可以用 load(mmap=True) 直接映射"""
+        np.savez(path, events=self.events, phases=self.phases,
+                 stations=self.stations, extra_is_int=self.extra_is_int)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        读取 save 保存的目录
+        :param mmap: True 时 events/phases 以只读内存映射方式打开, 不读入内存
+        """
+        if not mmap:
+            with np.load(path) as data:
+                return cls(data['events'], data['phases'], data['stations'], data['extra_is_int'])
+        arrays = {}
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError('{} 是压缩的 .npz, 不能内存映射'.format(path))
+                arrays[os.path.splitext(info.filename)[0]] = _mmap_npz_member(path, info)
+        return cls(arrays['events'], arrays['phases'], arrays['stations'], arrays['extra_is_int'])
+
+    def phase_index(self, event_mask=None):
+        """选中事件的全部震相在 phases 中的下标(向量化, 不逐个事件循环)"""
+        events = self.events if event_mask is None else self.events[event_mask]
+        counts = events['n_phases'].astype(np.int64)
+        if len(counts) == 0:
+            return np.zeros(0, dtype=np.int64)
+        ends = np.cumsum(counts)
+        return np.repeat(events['phase_start'] - (ends - counts), counts) + np.arange(ends[-1])
+
+    def select(self, event_mask):
+        """按事件掩码(布尔数组或下标)取子目录"""
+        events = self.events[event_mask].copy()
+        phases = self.phases[self.phase_index(event_mask)]
+        counts = events['n_phases'].astype(np.int64)
+        events['phase_start'] = np.cumsum(counts) - counts
+        return PhaseCatalog(events, phases, self.stations, self.extra_is_int)
+
+    def iter_lines(self, remove_id=False):
+        """逐个事件返回 (标题行, [震相行, ...]) 文本"""
+        ev = self.events
+        times = ns_to_pal_time(ev['origin_ns'])
+        cols = [_format_float32(ev[name]) for name in ('lat', 'lon', 'depth', 'mag')]
+        evids = ev['evid'].tolist()
+        for i, (start, count) in enumerate(zip(ev['phase_start'].tolist(), ev['n_phases'].tolist())):
+            header = ','.join([times[i]] + [c[i] for c in cols])
+            if not remove_id and evids[i] >= 0:
+                header += ',{}'.format(evids[i])
+            yield header, self._phase_lines(self.phases[start:start + count])
+
+    def _phase_lines(self, phases):
+        names = self.stations[phases['station']]
+        tp = ns_to_iso_time(phases['tp_ns'])
+        ts = ns_to_iso_time(phases['ts_ns'])
+        lines = []
+        for k in range(len(phases)):
+            fields = [names[k], tp[k], ts[k]]
+            for v, is_int in zip(phases['extra'][k].tolist(), self.extra_is_int):
+                if v != v:
+                    break
+                fields.append(str(int(v)) if is_int else repr(v))
+            lines.append(','.join(fields))
+        return lines
+
+    def to_pha(self, path, remove_id=False):
+        """写回 PAL 格式的 .pha 文本"""
+        with open(path, 'w') as f:
+            for header, lines in self.iter_lines(remove_id=remove_id):
+                f.write(header + '\n')
+                for line in lines:
+                    f.write(line + '\n')
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("使用方法: python -m phasetool.catalog <输入.pha> <输出.npz>")
+        sys.exit(1)
+    catalog = PhaseCatalog.from_pha(sys.argv[1])
+    catalog.save(sys.argv[2])
+    print(f"{len(catalog)} 个事件, {catalog.n_phases} 个震相, {len(catalog.stations)} 个台站")
+    print(f"保存到 {os.path.abspath(sys.argv[2])}")
+
+
+if __name__ == "__main__":
+    main()
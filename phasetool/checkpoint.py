@@ -0,0 +1,178 @@
+'''
+不断追加的输入文件(如每天追加的 MESS 检测结果)的增量处理检查点
+1. 检查点记录已处理到的字节偏移(总在最后一个事件标题行的行首)、偏移之前最后 64 KB 的哈希、各输出文件的大小和工具自己的状态(如下一个事件编号)
+2. 重新运行时先核对: 输入文件不短于偏移且末尾哈希相同(已处理的部分没有被改写), 参数相同, 输出文件不短于记录的大小
+   核对通过就只处理偏移之后新追加的部分并追加到输出; 否则从头处理
+3. 输出比记录的长(上次写完输出但没保存检查点就中断)时截回记录的大小
+4. 输入最后一个事件可能还在写入(后面还会追加震相行), 留到下次从它的标题行开始处理;
+   最后没有换行符的半行也一样; 输入以换行结束且大小和上次运行时相同(已经不再增长)时, 最后一个事件也处理,
+   final(各脚本的 --final)时处理到文件末尾
+检查点保存在 <第一个输出文件>.ckpt(JSON)
+'''
+import os
+import json
+import hashlib
+
+from phasetool.pha_reader import is_header as pal_is_header
+
+TAIL_BYTES = 1 << 16
+
+
+def checkpoint_path(out_path):
+    return out_path + '.ckpt'
+
+
+def tail_hash(path, offset, n=TAIL_BYTES):
+    """文件 [offset - n, offset) 字节的 sha256"""
+    start = max(0, offset - n)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def complete_end(path, block=1 << 16):
+    """最后一个换行符之后的位置, 即完整行的结束位置"""
+    pos = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while pos > 0:
+            step = min(pos, block)
+            f.seek(pos - step)
+            k = f.read(step).rfind(b'\n')
+            if k >= 0:
+                return pos - step + k + 1
+            pos -= step
+    return 0
+
+
+def last_header_start(path, is_header=pal_is_header, end=None, block=1 << 16):
+    """
+    [0, end) 里最后一个标题行的行首位置, 没有标题行时返回 0
+    :param is_header: 判断标题行的函数(参数为解码后的行)
+    :param end: 默认为最后一个完整行的结束位置
+    """
+    pos = complete_end(path) if end is None else end
+    tail = b''
+    with open(path, 'rb') as f:
+        while pos > 0:
+            step = min(pos, block)
+            base = pos - step
+            f.seek(base)
+            lines = (f.read(step) + tail).split(b'\n')
+            # 各行的行首位置; 第一段不在文件开头时可能是半行, 和前一块拼起来再判断
+            starts = [base]
+            for line in lines[:-1]:
+                starts.append(starts[-1] + len(line) + 1)
+            first = 0 if base == 0 else 1
+            for k in range(len(lines) - 1, first - 1, -1):
+                if lines[k] and is_header(lines[k].decode('utf8', 'replace')):
+                    return starts[k]
+            tail = lines[0]
+            pos = base
+    return 0
+
+
+def _jsonable(value):
+    """参数转为 JSON 往返后的形式, 以便和检查点里的比较"""
+    return json.loads(json.dumps(value, default=lambda v: v.tolist() if hasattr(v, 'tolist') else str(v)))
+
+
+class Checkpoint:
+    """
+    :param input_path: 输入文件
+    :param outputs: 输出文件列表, 检查点默认保存在第一个输出文件旁边
+    :param params: 影响输出的参数(可以 JSON 序列化), 和上次不同时从头处理
+    """
+
+    def __init__(self, input_path, outputs, params=None, path=None):
+        self.input_path = os.path.abspath(input_path)
+        self.outputs = [os.path.abspath(p) for p in outputs]
+        self.params = _jsonable(params)
+        self.path = path or checkpoint_path(self.outputs[0])
+        self.offset = 0
+        self.state = {}
+        # 上次运行时输入文件的大小, 本次 end() 时的大小
+        self.last_size = None
+        self.input_size = None
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _check(self, record):
+        """不能接着上次处理的原因, 可以时返回 None"""
+        if record.get('input') != self.input_path:
+            return '输入文件不同'
+        if record.get('params') != self.params:
+            return '参数不同'
+        offset = record.get('offset', 0)
+        if os.path.getsize(self.input_path) < offset:
+            return '输入文件变短了'
+        if tail_hash(self.input_path, offset) != record.get('tail_hash'):
+            return '输入文件已处理的部分被修改'
+        sizes = record.get('outputs', {})
+        for path in self.outputs:
+            if path not in sizes:
+                return '输出文件不同'
+            if not os.path.exists(path) or os.path.getsize(path) < sizes[path]:
+                return '输出文件 {} 不完整'.format(path)
+        return None
+
+    def resume(self):
+        """
+        读取并核对检查点
+        :return: (开始处理的字节偏移, 上次保存的状态字典); 从头处理时为 (0, {})
+        """
+        self.offset, self.state, self.last_size = 0, {}, None
+        record = self._load()
+        if record is None:
+            return 0, {}
+        reason = self._check(record)
+        if reason:
+            print('检查点 {} 无效({}), 从头处理'.format(self.path, reason))
+            return 0, {}
+        for path in self.outputs:
+            size = record['outputs'][path]
+            if os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        self.offset = record['offset']
+        self.state = record.get('state', {})
+        self.last_size = record.get('input_size')
+        return self.offset, dict(self.state)
+
+    @property
+    def resumed(self):
+        """是否接着上次处理(输出要用追加模式)"""
+        return self.offset > 0
+
+    def end(self, is_header=pal_is_header, final=False):
+        """
+        本次处理到的位置: 最后一个事件的标题行行首, 这个事件留到下次处理;
+        输入以换行结束且大小和上次运行时相同时为文件末尾, 不再增长的输入最后一个事件也处理
+        :param is_header: 判断标题行的函数(参数为解码后的行)
+        :param final: 输入已经写完, 处理到文件末尾(包括最后没有换行符的行)
+        """
+        self.input_size = os.path.getsize(self.input_path)
+        if final or (self.input_size == self.last_size and complete_end(self.input_path) == self.input_size):
+            return max(self.offset, self.input_size)
+        return max(self.offset, last_header_start(self.input_path, is_header))
+
+    def save(self, offset, **state):
+        """处理完 [.., offset) 并关闭输出文件之后保存"""
+        record = {
+            'input': self.input_path,
+            'offset': offset,
+            'tail_hash': tail_hash(self.input_path, offset),
+            'input_size': self.input_size if self.input_size is not None else os.path.getsize(self.input_path),
+            'params': self.params,
+            'outputs': {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in self.outputs},
+            'state': state,
+        }
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(record, f, indent=1)
+        os.replace(tmp, self.path)
+        self.offset, self.state, self.last_size = offset, state, record['input_size']
@@ -0,0 +1,146 @@
+'''
+phasetool 命令行: 各脚本作为子命令在一个进程里运行
+用法: python -m phasetool <子命令> [参数...]        子命令的参数和原脚本相同
+      python -m phasetool chain "yn2pal 1.dat @out @null" "select-yn -i @in -o @out YN.BAS,YN.NLA" "number-pal @in -o 2.pha"
+1. 子命令只在运行时才导入对应的脚本, pandas 等较重的依赖只在需要的子命令里加载
+2. chain 在一个进程里依次运行多个子命令, 每一步是一个字符串:
+   @out 是这一步的输出, 下一步用 @in 读取; @null 丢弃输出(如 yn2pal 的目录文件)
+   中间结果放在内存文件里(Linux memfd, 有 /proc/<pid>/fd/<n> 路径, 脚本可以正常 open/mmap), 不写到磁盘;
+   其它系统上用临时文件, 运行结束后删除
+'''
+import os
+import sys
+import shlex
+import tempfile
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子命令: (脚本路径或 phasetool 模块, 入口函数, 说明)
+COMMANDS = {
+    'yn2pal': ('convertYNcatalog2hypoDD/convertYNcatalog2hypoDD.py', 'main', '云南台网观测报告(1.dat) -> PAL 震相和目录'),
+    'yn2pal-sq': ('convertYNcatalog2hypoDD/convertYNcatalog2hypoDD_sq.py', 'main', '同 yn2pal --seq, 标题行末尾加序号'),
+    'select-yn': ('selectYNnetEVT2cutMESS/selectYNnetEVT2cutMESS.py', 'main', '按台站(和日期、经纬度)选 PAL 事件'),
+    'mess2cutpha': ('convertMESS2cutpha/convertMESS2cutpha.py', 'main', '按 cc 值选 MESS 事件转为 cutpha'),
+    'number-mess': ('convertMESS2PALHypoDD/convertMESS2PALHypoDD.py', 'cli', 'MESS 标题行末尾加编号(从 1 开始)'),
+    'number-pal': ('convertMESS2PALHypoDD/convertMESS2PALHypoDDv2.py', 'cli', 'PAL 标题行末尾加编号(从 0 开始)'),
+    'tomodd': ('convertMESSdetect2tomoDD/convertMESSdetect2tomoDD.py', 'main', 'MESS 检测结果 + reloc 目录 -> tomoDD phase.dat'),
+    'combine-phase': ('convertMESSdetect2tomoDD/combine_phase.py', 'main', '按发震时刻归并多个 phase.dat, 合并重复事件'),
+    'extract': ('extract_pha_by_lat_lon/extract_pha_by_lat_lon.py', 'main', '按好事件列表提取 PAL 事件'),
+    'select': ('extract_pha_by_lat_lon/select_pha_by_lonlat.py', 'main', '按经纬度范围、多边形、半径、深度、震级选事件'),
+    'split': ('extract_pha_by_lat_lon/split_phases.py', 'main', '按震相数等拆分到多个文件'),
+    'cut-picks': ('cut_pick2reallink/cut_pick2reallink.py', 'main', '拾取结果按月/天/台站拆分'),
+    'pose2gmt': ('convert_POSE2GMT/convert_POSE2gmt.py', 'main', '震源机制 CSV -> GMT 沙滩球输入(pandas)'),
+    'hypodd2zmap': ('convert_hypodd2zmap/process_hypoDD_reloc.py', 'main', 'hypoDD.reloc -> zmap(pandas)'),
+    'hypoinv2zmap': ('convert_hypoinverse2zmap/convert_hypoinverse2zmap.py', 'main', 'hypoinverse 目录 -> zmap(pandas)'),
+    'table': ('phasetool.table_convert', 'main', '按列映射转换空白分隔的目录文件(pandas)'),
+    'ph2dt': ('phasetool.ph2dt', 'main', 'tomoDD phase.dat -> dt.ct、event.dat(代替 ph2dt)'),
+    'sort-phase': ('phasetool.phase_sort', 'main', '震相文件按发震时刻外部排序(PAL/MESS/tomoDD)'),
+    'catalog': ('phasetool.catalog', 'main', '.pha -> 列式目录 .npz'),
+    'pipeline': ('phasetool.pipeline', 'main', '按 JSON/YAML 配置在内存里串联各工具, 只写需要的文件'),
+}
+
+
+def import_script(target):
+    """导入 phasetool 模块或脚本(相对仓库根目录的路径)"""
+    if target.endswith('.py'):
+        # 脚本所在目录加到 sys.path, 按模块名导入, 多进程(--jobs)的子进程也能导入同一个模块
+        directory = os.path.join(ROOT, os.path.dirname(target))
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+        target = os.path.splitext(os.path.basename(target))[0]
+    return importlib.import_module(target)
+
+
+def load_entry(name):
+    """导入子命令对应的脚本(第一次用到时)并返回入口函数"""
+    target, entry, _ = COMMANDS[name]
+    return getattr(import_script(target), entry)
+
+
+def run_command(name, args):
+    """运行一个子命令, args 为参数列表(不含子命令名)"""
+    if name not in COMMANDS:
+        raise SystemExit('未知的子命令: {}\n{}'.format(name, usage()))
+    entry = load_entry(name)
+    old_argv = sys.argv
+    sys.argv = ['phasetool ' + name] + list(args)
+    try:
+        return entry()
+    finally:
+        sys.argv = old_argv
+
+
+class MemoryFile:
+    """
+    chain 的中间结果: 有真实路径的内存文件
+    Linux 上用 memfd, 路径 /proc/<pid>/fd/<n> 在 --jobs 的子进程里也能打开; 其它系统用临时文件
+    """
+
+    def __init__(self, name):
+        self.temp = not (hasattr(os, 'memfd_create') and os.path.isdir('/proc/self/fd'))
+        if self.temp:
+            self.fd, self.path = tempfile.mkstemp(prefix='phasetool_{}_'.format(name))
+        else:
+            self.fd = os.memfd_create('phasetool_' + name)
+            self.path = '/proc/{}/fd/{}'.format(os.getpid(), self.fd)
+
+    def close(self):
+        os.close(self.fd)
+        if self.temp and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def run_chain(stages):
+    """
+    在一个进程里依次运行多个子命令
+    :param stages: [[子命令, 参数, ...], ...], 参数中的 @in/@out/@null 替换为内存文件路径
+    """
+    previous = None
+    buffers = []
+    try:
+        for k, stage in enumerate(stages):
+            if not stage:
+                raise SystemExit('第 {} 步为空'.format(k + 1))
+            if '@in' in stage and previous is None:
+                raise SystemExit('第 {} 步用了 @in, 但上一步没有 @out'.format(k + 1))
+            current = None
+            if '@out' in stage:
+                current = MemoryFile('{}_{}'.format(k + 1, stage[0]))
+                buffers.append(current)
+            replace = {'@in': previous.path if previous else None,
+                       '@out': current.path if current else None,
+                       '@null': os.devnull}
+            args = [replace.get(arg, arg) for arg in stage[1:]]
+            print('[{}/{}] phasetool {}'.format(k + 1, len(stages), ' '.join(stage)), file=sys.stderr)
+            run_command(stage[0], args)
+            # 上一步的内存文件已经用完
+            if previous is not None:
+                previous.close()
+                buffers.remove(previous)
+            previous = current
+    finally:
+        for buffer in buffers:
+            buffer.close()
+
+
+def usage():
+    lines = ['用法: python -m phasetool <子命令> [参数...]  (子命令 -h 查看参数)',
+             '      python -m phasetool chain "<子命令> 参数 @out" "<子命令> @in 参数" ...', '', '子命令:']
+    for name, (_, _, text) in COMMANDS.items():
+        lines.append('  {:14s} {}'.format(name, text))
+    lines.append('  {:14s} {}'.format('chain', '一个进程里依次运行多个子命令, 中间结果不写到磁盘'))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    if argv[0] == 'chain':
+        if len(argv) < 2:
+            raise SystemExit('chain 需要至少一步, 每一步是一个带引号的字符串')
+        run_chain([shlex.split(stage) for stage in argv[1:]])
+        return
+    run_command(argv[0], argv[1:])
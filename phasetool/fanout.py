@@ -0,0 +1,100 @@
+'''
+按关键字分发写入多个输出文件(类似 cut_pick2reallink 原来的 get_file)
+1. 每个关键字有自己的内存缓冲, 超过 flush_bytes 才写到文件, 避免大量零碎的小写入
+2. 同时打开的文件数不超过 max_open, 超过时关闭最久没有用到的文件(LRU),
+   以后再写这个关键字时用追加模式重新打开
+'''
+import os
+from collections import OrderedDict
+
+
+class FanoutWriter:
+    """
+    :param path_for_key: 由关键字得到输出文件路径的函数
+    :param buffering: 每个文件的写缓冲大小(字节)
+    :param mode: 'w' 覆盖, 'a' 追加, 加 'b' 时写入字节
+    :param max_open: 同时打开的文件数上限, None 不限制
+    :param flush_bytes: 每个关键字的内存缓冲超过这个大小时写到文件, None 不缓冲直接写
+    :param max_buffered: 全部关键字的缓冲合计超过这个大小时全部写出
+    """
+
+    def __init__(self, path_for_key, buffering=1 << 20, mode='w', encoding='utf8',
+                 max_open=None, flush_bytes=None, max_buffered=1 << 26):
+        self.path_for_key = path_for_key
+        self.buffering = buffering
+        self.mode = mode
+        self.encoding = encoding
+        self.max_open = max_open
+        self.flush_bytes = flush_bytes
+        self.max_buffered = max_buffered
+        self.files = OrderedDict()  # 打开的文件, 按最近使用排序
+        self.opened = set()  # 打开过的关键字, 重新打开时用追加模式
+        self.buffers = {}
+        self.buffer_sizes = {}
+        self.buffered = 0
+        self.counts = {}
+
+    def _handle(self, key):
+        f = self.files.get(key)
+        if f is not None:
+            self.files.move_to_end(key)
+            return f
+        if self.max_open is not None:
+            while len(self.files) >= self.max_open:
+                _, oldest = self.files.popitem(last=False)
+                oldest.close()
+        path = self.path_for_key(key)
+        mode = self.mode
+        if key in self.opened:
+            mode = mode.replace('w', 'a')
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.opened.add(key)
+        f = open(path, mode, buffering=self.buffering, encoding=None if 'b' in mode else self.encoding)
+        self.files[key] = f
+        return f
+
+    def _flush(self, key):
+        chunks = self.buffers.pop(key, None)
+        if chunks:
+            self._handle(key).write((b'' if 'b' in self.mode else '').join(chunks))
+            self.buffered -= self.buffer_sizes.pop(key)
+
+    def flush(self):
+        """写出全部缓冲"""
+        for key in list(self.buffers):
+            self._flush(key)
+
+    def get_file(self, key):
+        """返回关键字对应的文件(已写出缓冲), 调用方可以直接写入, 但不要保存以后再用"""
+        self._flush(key)
+        self.counts.setdefault(key, 0)
+        return self._handle(key)
+
+    def write(self, key, text):
+        if self.flush_bytes is None:
+            self.get_file(key).write(text)
+        else:
+            self.buffers.setdefault(key, []).append(text)
+            size = self.buffer_sizes.get(key, 0) + len(text)
+            self.buffer_sizes[key] = size
+            self.buffered += len(text)
+            if size >= self.flush_bytes:
+                self._flush(key)
+            elif self.buffered >= self.max_buffered:
+                self.flush()
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
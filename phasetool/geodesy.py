@@ -0,0 +1,207 @@
+'''
+批量大地测量计算, 输入输出都是 NumPy 数组(标量也可以)
+1. forward: 由起点、方位角、距离求终点
+2. inverse: 由两点求距离、方位角、反方位角
+model='sphere' 为球面(半径 6371 km), model='wgs84' 为 WGS84 椭球(Vincenty 公式)
+经纬度、方位角单位为度, 方位角北为 0 度顺时针, 距离单位为 km
+'''
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180
+
+MODELS = ('sphere', 'wgs84')
+
+
+def _check_model(model):
+    if model not in MODELS:
+        raise ValueError('未知的模型: {}, 只能是 {}'.format(model, ' 或 '.join(MODELS)))
+
+
+def _wrap_lon(lon):
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def _wrap_azimuth(az):
+    return np.degrees(az) % 360.0
+
+
+def distance_km(lon1, lat1, lon2, lat2, model='sphere'):
+    """两点间距离(km), 球面时用 haversine 公式"""
+    _check_model(model)
+    if model == 'wgs84':
+        return inverse(lon1, lat1, lon2, lat2, model)[0]
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _sphere_inverse(lon1, lat1, lon2, lat2):
+    dist = distance_km(lon1, lat1, lon2, lat2)
+    lon1, lat1, lon2, lat2 = (np.radians(v) for v in (lon1, lat1, lon2, lat2))
+    dlon = lon2 - lon1
+    az12 = np.arctan2(np.sin(dlon) * np.cos(lat2),
+                      np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon))
+    az21 = np.arctan2(-np.sin(dlon) * np.cos(lat1),
+                      np.cos(lat2) * np.sin(lat1) - np.sin(lat2) * np.cos(lat1) * np.cos(dlon))
+    return dist, _wrap_azimuth(az12), _wrap_azimuth(az21)
+
+
+def _sphere_forward(lon, lat, azimuth, dist):
+    lat1 = np.radians(lat)
+    az = np.radians(azimuth)
+    d = dist / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.clip(np.sin(lat1) * np.cos(d) + np.cos(lat1) * np.sin(d) * np.cos(az), -1, 1))
+    dlon = np.arctan2(np.sin(az) * np.sin(d) * np.cos(lat1), np.cos(d) - np.sin(lat1) * np.sin(lat2))
+    lon2 = _wrap_lon(lon + np.degrees(dlon))
+    lat2 = np.degrees(lat2)
+    _, _, back = _sphere_inverse(lon, lat, lon2, lat2)
+    return lon2, lat2, back
+
+
+def _delta_sigma(B, sin_sigma, cos_sigma, cos_2sm):
+    return B * sin_sigma * (cos_2sm + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2)
+        - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+
+
+def _ab_coefficients(cos2_alpha, a, b):
+    u2 = cos2_alpha * (a * a - b * b) / (b * b)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    return A, B
+
+
+def _vincenty_inverse(lon1, lat1, lon2, lat2, max_iter=200, tol=1e-12):
+    """
+    Vincenty 反算, 所有点一起迭代
+    :return: (距离, 方位角, 反方位角, 是否收敛); 接近对跖点时可能不收敛
+    """
+    a = WGS84_A_KM
+    f = WGS84_F
+    b = a * (1 - f)
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # 赤道上的线 cos2_alpha = 0
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_new = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+            converged = np.abs(lam_new - lam) <= tol
+            lam = np.where(np.isfinite(lam_new), lam_new, lam)
+            if converged.all():
+                break
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+    A, B = _ab_coefficients(cos2_alpha, a, b)
+    dist = b * A * (sigma - _delta_sigma(B, sin_sigma, cos_sigma, cos_2sm))
+    az12 = np.arctan2(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+    az2 = np.arctan2(cos_u1 * sin_lam, -sin_u1 * cos_u2 + cos_u1 * sin_u2 * cos_lam)
+    return dist, _wrap_azimuth(az12), _wrap_azimuth(az2 + np.pi), converged
+
+
+def _vincenty_forward(lon, lat, azimuth, dist, max_iter=200, tol=1e-12):
+    a = WGS84_A_KM
+    f = WGS84_F
+    b = a * (1 - f)
+    alpha1 = np.radians(azimuth)
+    sin_a1, cos_a1 = np.sin(alpha1), np.cos(alpha1)
+    tan_u1 = (1 - f) * np.tan(np.radians(lat))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    sin_u1 = tan_u1 * cos_u1
+    sigma1 = np.arctan2(tan_u1, cos_a1)
+    sin_alpha = cos_u1 * sin_a1
+    cos2_alpha = 1 - sin_alpha ** 2
+    A, B = _ab_coefficients(cos2_alpha, a, b)
+
+    sigma = dist / (b * A)
+    for _ in range(max_iter):
+        cos_2sm = np.cos(2 * sigma1 + sigma)
+        sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+        sigma_new = dist / (b * A) + _delta_sigma(B, sin_sigma, cos_sigma, cos_2sm)
+        done = np.all(np.abs(sigma_new - sigma) <= tol)
+        sigma = sigma_new
+        if done:
+            break
+    cos_2sm = np.cos(2 * sigma1 + sigma)
+    sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+    tmp = sin_u1 * sin_sigma - cos_u1 * cos_sigma * cos_a1
+    lat2 = np.arctan2(sin_u1 * cos_sigma + cos_u1 * sin_sigma * cos_a1,
+                      (1 - f) * np.hypot(sin_alpha, tmp))
+    lam = np.arctan2(sin_sigma * sin_a1, cos_u1 * cos_sigma - sin_u1 * sin_sigma * cos_a1)
+    C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+    L = lam - (1 - C) * f * sin_alpha * (
+        sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+    az2 = np.arctan2(sin_alpha, -tmp)
+    return _wrap_lon(lon + np.degrees(L)), np.degrees(lat2), _wrap_azimuth(az2 + np.pi)
+
+
+def _arrays(*values):
+    arrays = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in values))
+    return [np.atleast_1d(np.array(v, dtype=np.float64)) for v in arrays]
+
+
+def _result(values, scalar):
+    return tuple(float(v[0]) for v in values) if scalar else tuple(values)
+
+
+def inverse(lon1, lat1, lon2, lat2, model='sphere'):
+    """
+    两点间的距离和方位角
+    :return: (距离 km, 点 1 到点 2 的方位角, 点 2 到点 1 的反方位角)
+    椭球上接近对跖点不收敛时改用球面结果
+    """
+    _check_model(model)
+    scalar = all(np.ndim(v) == 0 for v in (lon1, lat1, lon2, lat2))
+    lon1, lat1, lon2, lat2 = _arrays(lon1, lat1, lon2, lat2)
+    if model == 'sphere':
+        return _result(_sphere_inverse(lon1, lat1, lon2, lat2), scalar)
+    dist, az12, az21, converged = _vincenty_inverse(lon1, lat1, lon2, lat2)
+    if not converged.all():
+        bad = ~converged
+        dist[bad], az12[bad], az21[bad] = _sphere_inverse(lon1[bad], lat1[bad], lon2[bad], lat2[bad])
+    return _result((dist, az12, az21), scalar)
+
+
+def forward(lon, lat, azimuth, distance, model='sphere'):
+    """
+    由起点、方位角和距离求终点
+    :return: (终点经度, 终点纬度, 终点到起点的反方位角)
+    """
+    _check_model(model)
+    scalar = all(np.ndim(v) == 0 for v in (lon, lat, azimuth, distance))
+    lon, lat, azimuth, distance = _arrays(lon, lat, azimuth, distance)
+    if model == 'sphere':
+        return _result(_sphere_forward(lon, lat, azimuth, distance), scalar)
+    return _result(_vincenty_forward(lon, lat, azimuth, distance), scalar)
+
+
+def epicentral_distance(ev_lon, ev_lat, st_lon, st_lat, model='wgs84'):
+    """
+    震中距
+    :return: (震中距 km, 震中距 度(球面角距), 震中到台站的方位角, 台站到震中的反方位角)
+    """
+    dist, az, baz = inverse(ev_lon, ev_lat, st_lon, st_lat, model)
+    deg = distance_km(ev_lon, ev_lat, st_lon, st_lat) / KM_PER_DEG
+    return dist, (float(deg) if np.ndim(deg) == 0 else deg), az, baz
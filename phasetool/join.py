@@ -0,0 +1,118 @@
+'''
+带容差的近似连接(approximate join)
+把记录按容差大小分到网格中, 用网格的哈希值排序后二分查找相邻网格,
+候选对再按真实差值检查容差, 最后按误差从小到大做一对一匹配
+'''
+import numpy as np
+
+_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def _cell_hash(cells):
+    """多维网格坐标(int64)混合成一个 uint64 哈希, 冲突只会多出候选对, 不影响结果"""
+    h = np.zeros(len(cells), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for k in range(cells.shape[1]):
+            h ^= cells[:, k].astype(np.uint64) * _MIX[k % len(_MIX)]
+            h = (h << np.uint64(31)) | (h >> np.uint64(33))
+    return h
+
+
+def candidate_pairs(a, b, tolerances):
+    """
+    找出所有每一维差值都不超过容差的记录对
+    :param a: (M, d) 数组
+    :param b: (N, d) 数组
+    :param tolerances: 长度为 d 的容差
+    :return: (a 下标, b 下标), 没有重复
+    """
+    tol = np.asarray(tolerances, dtype=np.float64)
+    # 按容差的维数变形, a 或 b 为空时也可以
+    a = np.asarray(a, dtype=np.float64).reshape(len(a), len(tol))
+    b = np.asarray(b, dtype=np.float64).reshape(len(b), len(tol))
+    empty = np.zeros(0, dtype=np.int64)
+    if len(a) == 0 or len(b) == 0:
+        return empty, empty
+    a_ok = np.flatnonzero(np.all(np.isfinite(a), axis=1))
+    b_ok = np.flatnonzero(np.all(np.isfinite(b), axis=1))
+    a_cells = np.floor(a[a_ok] / tol).astype(np.int64)
+    b_cells = np.floor(b[b_ok] / tol).astype(np.int64)
+    b_hash = _cell_hash(b_cells)
+    order = np.argsort(b_hash, kind='stable')
+    b_sorted = b_hash[order]
+
+    a_parts = []
+    b_parts = []
+    d = a.shape[1]
+    # 容差等于网格大小, 相邻 3^d 个网格内一定包含全部候选
+    for offset in np.array(np.meshgrid(*[[-1, 0, 1]] * d, indexing='ij')).reshape(d, -1).T:
+        query = _cell_hash(a_cells + offset)
+        lo = np.searchsorted(b_sorted, query, side='left')
+        hi = np.searchsorted(b_sorted, query, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        ai = np.repeat(np.arange(len(a_ok)), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        bi = order[starts + np.arange(total)]
+        a_parts.append(a_ok[ai])
+        b_parts.append(b_ok[bi])
+    if not a_parts:
+        return empty, empty
+    ai = np.concatenate(a_parts)
+    bi = np.concatenate(b_parts)
+    keep = np.all(np.abs(a[ai] - b[bi]) <= tol, axis=1)
+    ai, bi = ai[keep], bi[keep]
+    # 哈希冲突时同一对可能被找到多次
+    code = np.unique(ai * np.int64(len(b)) + bi)
+    return code // len(b), code % len(b)
+
+
+def best_matches(a, b, tolerances):
+    """
+    一对一最佳匹配: 误差为各维差值/容差的平方和, 从误差最小的候选对开始贪心选择
+    :return: (a 下标, b 下标, 误差), 按 a 下标排序
+    """
+    tol = np.asarray(tolerances, dtype=np.float64)
+    # 按容差的维数变形, a 或 b 为空时也可以
+    a = np.asarray(a, dtype=np.float64).reshape(len(a), len(tol))
+    b = np.asarray(b, dtype=np.float64).reshape(len(b), len(tol))
+    ai, bi = candidate_pairs(a, b, tol)
+    score = np.sum(((a[ai] - b[bi]) / tol) ** 2, axis=1)
+    order = np.lexsort((bi, ai, score))
+    used_a = np.zeros(len(a), dtype=bool)
+    used_b = np.zeros(len(b), dtype=bool)
+    chosen = []
+    for k, i, j in zip(order.tolist(), ai[order].tolist(), bi[order].tolist()):
+        if not used_a[i] and not used_b[j]:
+            used_a[i] = True
+            used_b[j] = True
+            chosen.append(k)
+    chosen = np.array(chosen, dtype=np.int64)
+    result = chosen[np.argsort(ai[chosen], kind='stable')]
+    return ai[result], bi[result], score[result]
+
+
+def nearest_within(ref_sorted, query, tolerance):
+    """
+    最近值连接: 对每个查询值在有序参考数组中二分查找(searchsorted)最近的一个, 差值超过容差返回 -1
+    各查询值独立查找, 不是一对一: 几个查询值可能对应同一个参考值
+    :param ref_sorted: 升序数组(例如目录的发震时刻)
+    :param query: 查询值数组
+    :return: 参考数组下标数组
+    """
+    ref_sorted = np.asarray(ref_sorted)
+    query = np.asarray(query)
+    result = np.full(len(query), -1, dtype=np.int64)
+    if len(ref_sorted) == 0 or len(query) == 0:
+        return result
+    right = np.searchsorted(ref_sorted, query, side='left')
+    left = np.clip(right - 1, 0, len(ref_sorted) - 1)
+    right = np.clip(right, 0, len(ref_sorted) - 1)
+    d_left = np.abs(query - ref_sorted[left])
+    d_right = np.abs(ref_sorted[right] - query)
+    best = np.where(d_right < d_left, right, left)
+    ok = np.minimum(d_left, d_right) <= tolerance
+    result[ok] = best[ok]
+    return result
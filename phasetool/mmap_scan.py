@@ -0,0 +1,109 @@
+'''
+基于 mmap 的事件块扫描
+1. 按窗口在字节层面查找行首(换行符之后), 行首字节是数字的就是 PAL/MESS 事件标题行
+2. 每个事件块用 (起始偏移, 结束偏移, 震相行数) 表示, 不解码震相行
+3. 输出时直接把 memoryview 切片写到二进制文件, 不经过字符串
+'''
+import mmap
+from contextlib import contextmanager
+
+import numpy as np
+
+DIGITS = b'0123456789'
+
+
+@contextmanager
+def open_mmap(path):
+    """只读映射整个文件, 空文件返回 b''"""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b''
+            return
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def iter_block_batches(mm, header_bytes=DIGITS, start=0, end=None, window=1 << 26):
+    """
+    按窗口扫描事件块, 内存只和窗口大小有关
+    :param header_bytes: 标题行首字节可能的取值
+    :param start, end: 只扫描 [start, end) 字节范围(start 必须是行首)
+    :return: 生成器, 每次返回 (起始偏移数组, 结束偏移数组, 震相行数数组)
+             第一个标题行之前的行被忽略, 空行不计入震相行数
+    """
+    arr = np.frombuffer(mm, dtype=np.uint8)
+    size = len(arr) if end is None else end
+    is_head = np.zeros(256, dtype=bool)
+    is_head[list(header_bytes)] = True
+    cur_start = None
+    cur_count = 0
+    for w0 in range(start, size, window):
+        w1 = min(size, w0 + window)
+        starts = np.flatnonzero(arr[w0:w1] == 10) + (w0 + 1)
+        starts = starts[starts < size]
+        if w0 == start:
+            starts = np.concatenate(([start], starts))
+        first = arr[starts]
+        head = is_head[first]
+        phase = ~head & (first != 10) & (first != 13)
+        hpos = starts[head]
+        # 每一行属于哪个标题, -1 表示属于上一个窗口延续下来的事件块
+        owner = np.cumsum(head) - 1
+        counts = np.bincount(owner[phase] + 1, minlength=len(hpos) + 1)
+        if len(hpos) == 0:
+            if cur_start is not None:
+                cur_count += int(counts[0])
+            continue
+        if cur_start is not None:
+            block_starts = np.concatenate(([cur_start], hpos[:-1]))
+            block_counts = np.concatenate(([cur_count + counts[0]], counts[1:-1]))
+        else:
+            block_starts = hpos[:-1]
+            block_counts = counts[1:-1]
+        if len(block_starts):
+            yield block_starts.astype(np.int64), hpos.astype(np.int64)[-len(block_starts):], block_counts
+        cur_start = int(hpos[-1])
+        cur_count = int(counts[-1])
+    if cur_start is not None:
+        yield np.array([cur_start], dtype=np.int64), np.array([size], dtype=np.int64), np.array([cur_count])
+
+
+def header_line(mm, start, end):
+    """解码事件块的标题行(去掉首尾空白)"""
+    stop = mm.find(b'\n', start, end)
+    if stop < 0:
+        stop = end
+    return bytes(mm[start:stop]).decode('utf8', 'replace').strip()
+
+
+def header_lines(mm, starts, ends):
+    return [header_line(mm, s, e) for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def copy_blocks(mm, out, starts, ends):
+    """
+    把事件块的原始字节写到二进制文件, 相邻的块合并成一次写入
+    文件最后一个块没有换行符时补上
+    """
+    view = memoryview(mm)
+    run_start = None
+    run_end = None
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        if run_end == s:
+            run_end = e
+            continue
+        if run_start is not None:
+            _write(view, out, run_start, run_end)
+        run_start, run_end = s, e
+    if run_start is not None:
+        _write(view, out, run_start, run_end)
+
+
+def _write(view, out, start, end):
+    out.write(view[start:end])
+    if end > start and view[end - 1] != 10:
+        out.write(b'\n')
@@ -0,0 +1,89 @@
+'''
+在事件标题行末尾添加递增的事件编号(convertMESS2PALHypoDD 系列脚本使用)
+'''
+import os
+import re
+
+from phasetool.checkpoint import Checkpoint
+from phasetool.parallel import run_chunks, iter_range_lines, temp_path, concat_outputs, renumber_fixup
+
+
+def number_chunk(path, start, end, header_pattern, out_path):
+    """并行的一块: 本块从 0 开始编号, 返回 (临时文件, 事件数)"""
+    r = re.compile(header_pattern)
+    num = 0
+    part = temp_path(out_path)
+    with open(part, 'w') as out_file:
+        for line in iter_range_lines(path, start, end):
+            if r.match(line):
+                out_file.write(line.strip() + "," + str(num) + "\n")
+                num += 1
+            else:
+                out_file.write(line)
+    return part, num
+
+
+def _add_base(line, base):
+    """标题行最后一列的编号加上 base"""
+    head, sep, num = line.rstrip('\n').rpartition(',')
+    return '{},{}\n'.format(head, int(num) + base)
+
+
+def _number_lines(lines, out_file, r, num):
+    """标题行后面添加数字, 返回下一个编号"""
+    for line in lines:
+        if r.match(line):
+            out_file.write(line.strip() + "," + str(num) + "\n")
+            num += 1 #数字递增
+        else:
+            out_file.write(line)
+    return num
+
+
+def _number_range(file_path, out_path, header_pattern, start, jobs, begin=0, end=None, append=False):
+    """给 [begin, end) 字节范围内的事件编号, 写到(或追加到) out_path, 返回事件数"""
+    if jobs <= 1:
+        r = re.compile(header_pattern)
+        with open(out_path, "a" if append else "w") as out_file:
+            if begin == 0 and end is None:
+                with open(file_path, "r") as in_file:
+                    return _number_lines(in_file, out_file, r, start) - start
+            # 按字节范围读取时和文本模式一样把 \r\n 换成 \n
+            lines = (line.replace("\r\n", "\n") for line in iter_range_lines(file_path, begin, end or os.path.getsize(file_path)))
+            return _number_lines(lines, out_file, r, start) - start
+    is_header = re.compile(header_pattern).match
+    results = run_chunks(file_path, number_chunk, args=(header_pattern, out_path), jobs=jobs,
+                         is_header=lambda line: is_header(line) is not None, start=begin, end=end)
+    counts = [count for part, count in results]
+    r = re.compile(header_pattern)
+    rewrite = lambda line, base: _add_base(line, base) if r.match(line) else line
+    concat_outputs([part for part, count in results], out_path, fixup=renumber_fixup(counts, rewrite, start),
+                   append=append)
+    return sum(counts)
+
+
+def number_stream(events, start=1):
+    """逐个返回标题行末尾加了编号的事件, 输入输出都是 (标题行, [震相行]) 迭代器"""
+    for num, (header, phases) in enumerate(events, start):
+        yield header.strip() + "," + str(num), phases
+
+
+def number_events(file_path, out_path, header_pattern, start=1, jobs=1, incremental=False, final=False):
+    """
+    :param header_pattern: 匹配标题行的正则
+    :param start: 第一个事件的编号
+    :param jobs: 进程数
+    :param incremental: 增量模式, 只处理检查点(out_path.ckpt)之后新追加的部分, 追加到 out_path, 编号接着上次
+    :param final: 增量模式下输入已经写完, 最后一个事件也处理(否则留到下次)
+    :return: 本次编号的事件数
+    """
+    if not incremental:
+        return _number_range(file_path, out_path, header_pattern, start, jobs)
+    checkpoint = Checkpoint(file_path, [out_path], params={"header_pattern": header_pattern, "start": start})
+    offset, state = checkpoint.resume()
+    next_id = state.get("next_id", start)
+    is_header = re.compile(header_pattern).match
+    end = checkpoint.end(lambda line: is_header(line) is not None, final)
+    count = _number_range(file_path, out_path, header_pattern, next_id, jobs, offset, end, append=checkpoint.resumed)
+    checkpoint.save(end, next_id=next_id + count)
+    return count
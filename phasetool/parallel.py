@@ -0,0 +1,153 @@
+'''
+大震相文件的分块并行处理
+1. chunk_ranges 在事件标题行处把文件切成若干字节范围, 每块都是完整的事件
+2. run_chunks 用 ProcessPoolExecutor 处理各块, 每块结果写到临时文件
+3. concat_outputs 按原顺序拼接临时文件, 需要时顺便修正序号
+'''
+import os
+import errno
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from phasetool.pha_reader import iter_events, is_header
+
+
+def chunk_ranges(path, n_chunks, is_header=is_header, start=0, end=None):
+    """
+    把文件(或 [start, end) 字节范围, start 必须是行首)分成大约 n_chunks 个字节范围, 每个范围从事件标题行开始
+    :return: [(start, end), ...]
+    """
+    size = os.path.getsize(path) if end is None else end
+    if size <= start:
+        return []
+    n_chunks = max(1, min(n_chunks, size - start))
+    starts = [start]
+    with open(path, 'rb') as f:
+        for k in range(1, n_chunks):
+            pos = max(start + (size - start) * k // n_chunks, starts[-1])
+            f.seek(pos)
+            if pos > 0:
+                f.readline()  # 跳过可能不完整的行
+            while True:
+                line_start = f.tell()
+                line = f.readline()
+                if not line or line_start >= size:
+                    line_start = size
+                    break
+                text = line.decode('utf8', 'replace').strip()
+                if text and is_header(text):
+                    break
+            if line_start > starts[-1]:
+                starts.append(line_start)
+    ends = starts[1:] + [size]
+    return [(s, e) for s, e in zip(starts, ends) if e > s]
+
+
+def iter_range_lines(path, start, end):
+    """读取 [start, end) 字节范围内的行(解码后, 保留换行符)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode('utf8')
+
+
+def iter_range_events(path, start, end, is_header=is_header):
+    """读取字节范围内的事件, 返回 (标题行, [震相行, ...]), 与 pha_reader.iter_events 相同"""
+    return iter_events(iter_range_lines(path, start, end), is_header=is_header)
+
+
+def temp_path(like_path, suffix='.part'):
+    """在输出文件所在目录建立临时文件, 拼接时可以直接移动; 不能建立时(如内存文件)用系统临时目录"""
+    directory = os.path.dirname(os.path.abspath(like_path))
+    prefix = '.' + os.path.basename(like_path) + '.'
+    try:
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory)
+    except OSError:
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def publish(path, out_path):
+    """
+    temp_path 建立的临时文件换成输出(出错时不会留下不完整的输出)
+    和输出在同一目录时改名, 临时文件是 0600, 改为原输出文件的权限, 没有时按 umask;
+    不在同一目录(如 chain 的内存文件 /proc/<pid>/fd/<n>)或不能跨设备改名时, 复制到输出后删除临时文件
+    """
+    if os.path.dirname(os.path.abspath(path)) == os.path.dirname(os.path.abspath(out_path)):
+        if os.path.exists(out_path):
+            mode = os.stat(out_path).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(path, mode)
+        try:
+            os.replace(path, out_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    with open(path, 'rb') as f, open(out_path, 'wb') as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+    os.remove(path)
+
+
+def run_chunks(path, worker, args=(), jobs=1, is_header=is_header, chunks_per_job=4, start=0, end=None):
+    """
+    并行处理文件的各块
+    :param worker: 顶层函数 worker(path, start, end, *args), 返回值需要可以 pickle
+    :param jobs: 进程数, 1 时在本进程内顺序执行
+    :param start, end: 只处理 [start, end) 字节范围(增量处理新追加的部分)
+    :return: 各块的返回值, 按文件顺序
+    """
+    ranges = chunk_ranges(path, max(1, jobs) * chunks_per_job, is_header=is_header, start=start, end=end)
+    if jobs <= 1 or len(ranges) <= 1:
+        return [worker(path, start, end, *args) for start, end in ranges]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(worker, path, start, end, *args) for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def concat_outputs(parts, out_path, fixup=None, append=False):
+    """
+    按顺序拼接各块的临时文件并删除
+    :param parts: 临时文件路径列表
+    :param fixup: fixup(line, chunk_index) 返回修正后的行, None 时直接复制字节
+    :param append: 追加到 out_path 已有的内容之后
+    """
+    mode = 'a' if append else 'w'
+    with open(out_path, mode + 'b' if fixup is None else mode) as out:
+        for k, part in enumerate(parts):
+            if fixup is None:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+            else:
+                with open(part, 'r') as f:
+                    for line in f:
+                        out.write(fixup(line, k))
+            os.remove(part)
+
+
+def renumber_fixup(counts, rewrite, start=0):
+    """
+    生成修正序号的 fixup: 各块按本块从 0 开始编号, 拼接时加上前面各块的事件数
+    :param counts: 各块的事件数
+    :param rewrite: rewrite(line, base) 返回序号加上 base 后的行, 不是标题行时原样返回
+    :param start: 第一个块的起始序号
+    """
+    bases = []
+    total = start
+    for count in counts:
+        bases.append(total)
+        total += count
+
+    def fixup(line, k):
+        return rewrite(line, bases[k])
+    return fixup
@@ -0,0 +1,299 @@
+'''
+ph2dt 的替代: 从 tomoDD/hypoDD phase.dat(# 标题行 + 台站行)生成事件对的走时差 dt.ct 和 event.dat/event.sel
+1. 震源位置转为地心直角坐标(km, 半径减去深度), 两点直线距离就是震源间距, 不受研究区大小影响
+2. 邻近事件用 KD 树(scipy.spatial.cKDTree)查找, 没有 scipy 时用 join.py 的网格哈希, 结果相同
+3. 每个事件按距离从近到远检查最近的 max_candidates 个事件(MAXSEP 以内):
+   共同的台站震相数 >= MINLNK 算一个邻居, 够 MAXNGH 个邻居就停止; 共同震相数 >= MINOBS 的事件对被保存
+4. 每对最多保留 MAXOBS 个震相, 优先离两个事件距离之和最近的台站(给出台站文件时), 权重取两个拾取权重的平均
+5. 第一遍(找事件对)和第二遍(写 dt.ct)都按事件分块, --jobs 时用进程池
+和 ph2dt 的区别: ph2dt 按顺序处理并把已保存的事件对计入后面事件的邻居数, 这里各事件独立选择邻居后去重, 事件对可能略多
+用法: python -m phasetool.ph2dt phase.dat --stations station.dat --maxsep 10 --maxngh 10 --minlnk 8 --jobs 8
+'''
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from phasetool.pha_reader import iter_events, is_tomo_header
+from phasetool.geodesy import EARTH_RADIUS_KM, distance_km
+from phasetool.parallel import temp_path, concat_outputs
+from phasetool.timeparse import days_from_civil, civil_from_days
+
+# 和 ph2dt.inp 对应的默认参数
+DEFAULTS = {
+    'minwght': 0.0,     # 拾取权重下限
+    'maxdist': 500.0,   # 台站到事件的最大距离(km), 需要台站文件
+    'maxsep': 10.0,     # 事件对的最大震源间距(km)
+    'maxngh': 10,       # 每个事件的最多邻居数
+    'minlnk': 8,        # 算作邻居需要的最少共同震相数
+    'minobs': 8,        # 保存事件对需要的最少共同震相数
+    'maxobs': 50,       # 每对最多保存的震相数
+}
+
+# 进程池各进程共用的数据, 由 _init_state 设置
+_STATE = {}
+
+
+def _kdtree():
+    """scipy 的 cKDTree, 没有安装时返回 None"""
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        return None
+    return cKDTree
+
+
+class PhaseData:
+    """
+    phase.dat 的事件和拾取
+    :param header: 各事件标题行的列 [yr, mo, dy, hr, mn, sc, lat, lon, dep, mag, eh, ez, rms, id]
+    :param picks: 每个事件的 {(台站, 震相): (走时, 权重)}
+    """
+
+    def __init__(self, header, picks):
+        self.header = header
+        self.picks = picks
+        self.ids = np.array([int(h[13]) for h in header], dtype=np.int64)
+        self.lat = np.array([float(h[6]) for h in header])
+        self.lon = np.array([float(h[7]) for h in header])
+        self.depth = np.array([float(h[8]) for h in header])
+
+    def __len__(self):
+        return len(self.header)
+
+    def xyz(self):
+        """震源的地心直角坐标(km)"""
+        r = EARTH_RADIUS_KM - self.depth
+        lat = np.radians(self.lat)
+        lon = np.radians(self.lon)
+        return np.column_stack((r * np.cos(lat) * np.cos(lon), r * np.cos(lat) * np.sin(lon), r * np.sin(lat)))
+
+
+def read_phase(path, minwght=DEFAULTS['minwght']):
+    """读取 phase.dat, 权重低于 minwght 的拾取不要; 同一事件同一台站同一震相只保留第一个"""
+    header = []
+    picks = []
+    for title, lines in iter_events(path, is_header=is_tomo_header):
+        fields = title[1:].split()
+        if len(fields) < 14:
+            continue
+        event = {}
+        for line in lines:
+            values = line.split()
+            if len(values) < 4:
+                continue
+            weight = float(values[2])
+            if weight < minwght:
+                continue
+            event.setdefault((values[0], values[3]), (float(values[1]), weight))
+        header.append(fields[:14])
+        picks.append(event)
+    return PhaseData(header, picks)
+
+
+def read_stations(path):
+    """读取台站文件(hypoDD station.dat): 每行 台站 纬度 经度 [高程], 返回 {台站: (纬度, 经度)}"""
+    stations = {}
+    with open(path, 'r') as f:
+        for line in f:
+            values = line.split()
+            if len(values) >= 3 and not line.startswith('#'):
+                stations[values[0]] = (float(values[1]), float(values[2]))
+    return stations
+
+
+def station_distances(data, stations, maxdist):
+    """
+    去掉台站文件里没有的台站和距离超过 maxdist 的拾取
+    :return: 每个事件的 {台站: 距离km}
+    """
+    rows = [(k, sta) for k, event in enumerate(data.picks) for sta in {s for s, _ in event} if sta in stations]
+    if rows:
+        index = np.array([k for k, _ in rows])
+        st = np.array([stations[sta] for _, sta in rows])
+        dist = distance_km(data.lon[index], data.lat[index], st[:, 1], st[:, 0]).tolist()
+    else:
+        dist = []
+    result = [{} for _ in data.picks]
+    for (k, sta), d in zip(rows, dist):
+        if d <= maxdist:
+            result[k][sta] = d
+    for k, event in enumerate(data.picks):
+        near = result[k]
+        data.picks[k] = {key: value for key, value in event.items() if key[0] in near}
+    return result
+
+
+def neighbor_candidates(xyz, rows, maxsep, k, tree=None):
+    """
+    每个事件 MAXSEP 以内最近的 k 个事件(不含自己)
+    :param rows: 要查询的事件下标
+    :return: [事件下标数组(按距离从近到远), ...], 和 rows 对应
+    """
+    if tree is not None:
+        dist, idx = tree.query(xyz[rows], k=min(k + 1, len(xyz)), distance_upper_bound=maxsep)
+        dist = dist.reshape(len(rows), -1)
+        idx = idx.reshape(len(rows), -1)
+        return [j[(d <= maxsep) & (j != i)][:k] for i, d, j in zip(rows.tolist(), dist, idx)]
+    # 没有 scipy: 网格哈希找出每一维都在 MAXSEP 以内的候选, 再按直线距离筛选排序
+    from phasetool.join import candidate_pairs
+    a, b = candidate_pairs(xyz[rows], xyz, [maxsep] * 3)
+    dist = np.sqrt(np.sum((xyz[rows][a] - xyz[b]) ** 2, axis=1))
+    keep = (dist <= maxsep) & (rows[a] != b)
+    a, b, dist = a[keep], b[keep], dist[keep]
+    order = np.lexsort((b, dist, a))
+    a, b = a[order], b[order]
+    bounds = np.searchsorted(a, np.arange(len(rows) + 1))
+    return [b[bounds[n]:bounds[n + 1]][:k] for n in range(len(rows))]
+
+
+def _init_state(state):
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def select_pairs(rows):
+    """第一遍的一块: 为 rows 中的事件选邻居, 返回事件对 (i, j) 数组, i < j"""
+    picks, options = _STATE['picks'], _STATE['options']
+    candidates = neighbor_candidates(_STATE['xyz'], rows, options['maxsep'], options['max_candidates'],
+                                     _STATE.get('tree'))
+    pairs = []
+    for i, neighbors in zip(rows.tolist(), candidates):
+        keys = picks[i].keys()
+        if len(keys) < options['minobs']:
+            continue
+        found = 0
+        for j in neighbors.tolist():
+            links = len(keys & picks[j].keys())
+            if links >= options['minobs']:
+                pairs.append((i, j) if i < j else (j, i))
+            if links >= options['minlnk']:
+                found += 1
+                if found >= options['maxngh']:
+                    break
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def write_pairs(pairs, like_path):
+    """第二遍的一块: 把事件对的走时写到临时文件, 返回 (临时文件, 事件对数, P 数, S 数)"""
+    picks, ids, options = _STATE['picks'], _STATE['ids'], _STATE['options']
+    distances = _STATE.get('distances')
+    part = temp_path(like_path)
+    n_p = n_s = 0
+    with open(part, 'w') as out:
+        for i, j in pairs.tolist():
+            a, b = picks[i], picks[j]
+            common = a.keys() & b.keys()
+            if distances is not None:
+                di, dj = distances[i], distances[j]
+                common = sorted(common, key=lambda key: (di[key[0]] + dj[key[0]], key))
+            else:
+                common = sorted(common)
+            common = common[:options['maxobs']]
+            out.write('#{:>10d}{:>10d}\n'.format(ids[i], ids[j]))
+            for sta, pha in common:
+                (t1, w1), (t2, w2) = a[(sta, pha)], b[(sta, pha)]
+                out.write('{:<7s}{:10.3f}{:10.3f}{:8.3f} {}\n'.format(sta, t1, t2, (w1 + w2) / 2, pha))
+                if pha.upper().startswith('P'):
+                    n_p += 1
+                else:
+                    n_s += 1
+    return part, len(pairs), n_p, n_s
+
+
+def _run(worker, blocks, jobs, state, extra=()):
+    """按块运行, jobs > 1 时用进程池, 各进程在初始化时收到共用数据"""
+    if jobs <= 1 or len(blocks) <= 1:
+        _init_state(state)
+        return [worker(block, *extra) for block in blocks]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_state, initargs=(state,)) as pool:
+        return list(pool.map(worker, blocks, *[[e] * len(blocks) for e in extra]))
+
+
+def build_pairs(data, options, jobs=1, block_size=2000):
+    """
+    找出所有事件对
+    :return: (N, 2) 事件下标数组, 按 (i, j) 排序
+    """
+    cKDTree = _kdtree()
+    xyz = data.xyz()
+    state = {'xyz': xyz, 'picks': data.picks, 'options': options,
+             'tree': cKDTree(xyz) if cKDTree is not None and len(xyz) else None}
+    rows = np.arange(len(data))
+    blocks = [rows[k:k + block_size] for k in range(0, len(rows), block_size)]
+    results = _run(select_pairs, blocks, jobs, state)
+    if not results:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(results), axis=0)
+
+
+def write_dt(data, pairs, out_path, options, jobs=1, block_size=20000, distances=None):
+    """写 dt.ct, 返回 (事件对数, P 数, S 数)"""
+    state = {'picks': data.picks, 'ids': data.ids.tolist(), 'options': options, 'distances': distances}
+    blocks = [pairs[k:k + block_size] for k in range(0, len(pairs), block_size)]
+    results = _run(write_pairs, blocks, jobs, state, extra=(out_path,))
+    concat_outputs([r[0] for r in results], out_path)
+    return len(pairs), sum(r[2] for r in results), sum(r[3] for r in results)
+
+
+def event_line(fields):
+    """event.dat 的一行: 日期 时间(hhmmss+百分之一秒) 纬度 经度 深度 震级 水平误差 垂直误差 残差 编号"""
+    yr, mo, dy, hr, mn, sc, lat, lon, dep, mag, eh, ez, rms, cuspid = fields
+    # 先把整个时刻四舍五入到百分之一秒再拆分, 59.996 秒进位到下一分钟(必要时到下一天)
+    centi = int(round((int(hr) * 3600 + int(mn) * 60 + float(sc)) * 100))
+    days, centi = divmod(centi, 8640000)
+    yr, mo, dy = civil_from_days(int(days_from_civil(int(yr), int(mo), int(dy))) + days)
+    hr, centi = divmod(centi, 360000)
+    mn, centi = divmod(centi, 6000)
+    return '{:04d}{:02d}{:02d}  {:8d} {:9.4f} {:10.4f} {:9.3f} {:4.1f} {:6.2f} {:6.2f} {:5.2f} {:10d}\n'.format(
+        int(yr), int(mo), int(dy), hr * 1000000 + mn * 10000 + centi,
+        float(lat), float(lon), float(dep), float(mag), float(eh), float(ez), float(rms), int(cuspid))
+
+
+def write_events(data, path, rows=None):
+    """写 event.dat(全部事件)或 event.sel(rows 给出的事件)"""
+    rows = range(len(data)) if rows is None else rows
+    with open(path, 'w') as f:
+        for k in rows:
+            f.write(event_line(data.header[k]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从 tomoDD/hypoDD phase.dat 生成 dt.ct、event.dat(代替 ph2dt)')
+    parser.add_argument('phase', help='phase.dat, 如 convertMESSdetect2tomoDD.py 或 combine_phase.py 的输出')
+    parser.add_argument('--stations', help='台站文件(station.dat: 台站 纬度 经度), 给出时按 --maxdist 去掉远台并优先近台')
+    parser.add_argument('--outdir', default='.', help='dt.ct、event.dat、event.sel 的输出目录')
+    for name, value in DEFAULTS.items():
+        parser.add_argument('--' + name, type=type(value), default=value, help='默认 %(default)s')
+    parser.add_argument('--max-candidates', type=int, help='每个事件最多检查的近邻数(默认 MAXNGH*10, 至少 50)')
+    parser.add_argument('--jobs', type=int, default=1, help='并行进程数')
+    args = parser.parse_args()
+
+    options = {name: getattr(args, name) for name in DEFAULTS}
+    options['max_candidates'] = args.max_candidates or max(50, 10 * args.maxngh)
+    data = read_phase(args.phase, args.minwght)
+    print('事件数: {}'.format(len(data)))
+    distances = None
+    if args.stations:
+        distances = station_distances(data, read_stations(args.stations), args.maxdist)
+    else:
+        print('没有台站文件, 不按 MAXDIST 筛选台站', file=sys.stderr)
+    if _kdtree() is None:
+        print('没有安装 scipy, 用网格哈希查找邻近事件', file=sys.stderr)
+
+    pairs = build_pairs(data, options, args.jobs)
+    os.makedirs(args.outdir, exist_ok=True)
+    n_pairs, n_p, n_s = write_dt(data, pairs, os.path.join(args.outdir, 'dt.ct'), options, args.jobs,
+                                 distances=distances)
+    write_events(data, os.path.join(args.outdir, 'event.dat'))
+    selected = np.unique(pairs)
+    write_events(data, os.path.join(args.outdir, 'event.sel'), selected.tolist())
+    print('事件对: {}, P 走时差: {}, S 走时差: {}'.format(n_pairs, n_p, n_s))
+    print('有事件对的事件: {}'.format(len(selected)))
+    print('saved to:', os.path.abspath(args.outdir))
+
+
+if __name__ == '__main__':
+    main()
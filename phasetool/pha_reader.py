@@ -0,0 +1,62 @@
+'''
+流式读取震相文件, 每次只在内存中保留一个事件
+支持的格式:
+1. PAL/MESS: 标题行 20241114223008.27,lat,lon,... 震相行 NET.STA,tp,ts,...
+2. tomoDD/hypoDD phase.dat: 标题行以 # 开头
+3. 其它格式通过 is_header 参数自定义标题行判断
+'''
+import os
+
+
+def is_header(line):
+    """PAL/MESS 事件头行以数字开头"""
+    return line[:1].isdigit()
+
+
+def is_tomo_header(line):
+    """tomoDD/hypoDD phase.dat 事件头行以 # 开头"""
+    return line.startswith('#')
+
+
+def open_input(file_or_path, encoding=None):
+    """
+    打开输入文件
+    :param file_or_path: 文件路径或者已经打开的文件对象
+    :return: (文件对象, 是否需要由调用者关闭)
+    """
+    if isinstance(file_or_path, (str, bytes, os.PathLike)):
+        return open(file_or_path, 'r', encoding=encoding), True
+    return file_or_path, False
+
+
+def iter_events(file_or_path, is_header=is_header, strip=True, encoding=None):
+    """
+    逐个事件读取震相文件
+    :param file_or_path: 文件路径、文件对象或者可迭代的行
+    :param is_header: 判断事件头行的函数
+    :param strip: True 去掉行首尾空白; False 只去掉行尾换行符(保留固定列格式)
+    :return: 生成器, 每次返回 (标题行, [震相行, ...]); 空行和第一个标题之前的行被忽略
+    """
+    f, need_close = open_input(file_or_path, encoding=encoding)
+    try:
+        header = None
+        phases = []
+        for line in f:
+            if strip:
+                line = line.strip()
+            else:
+                line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            if is_header(line):
+                if header is not None:
+                    yield header, phases
+                header = line
+                phases = []
+            elif header is not None:
+                phases.append(line)
+        if header is not None:
+            yield header, phases
+    finally:
+        if need_close:
+            f.close()
@@ -0,0 +1,278 @@
+'''
+震相文件按发震时刻的外部排序(PAL/MESS/tomoDD phase.dat), 事件块(标题行 + 震相行)作为整体移动
+1. 按字节读入, 事件块原样输出, 不解码震相行
+2. 输入已经有序的部分直接写到输出的临时文件; 全部有序时改名为输出, 只读一遍
+3. 遇到第一个顺序不对的事件后, 已写出的部分作为第 1 段, 其余事件在内存里攒到 --memory/--run-size
+   后排序写到临时段文件(每条记录前面是 8 字节时间和 8 字节长度), 最后用 heapq.merge 多路归并
+4. 段数超过 --fan-in 时分几轮归并, 同时打开的文件数不超过 fan_in
+5. 稳定排序: 时间相同的事件保持输入顺序; 时间无法解析的事件排在最后
+标题行第一行之前的内容原样放在输出开头
+用法: python -m phasetool sort-phase in.pha out.pha [--memory 256] [--run-size N]
+      python -m phasetool sort-phase phase.dat --check
+'''
+import os
+import sys
+import heapq
+import struct
+import argparse
+from operator import itemgetter
+
+from phasetool.parallel import temp_path, publish
+from phasetool.timeparse import parse_time_ns, tomo_header_ns, NAT
+
+FORMATS = ('pal', 'mess', 'tomo')
+# 每个事件块在内存里除了字节本身的大约开销(元组、bytes 对象头)
+BLOCK_OVERHEAD = 120
+# 无法解析的时间排在最后
+LAST = 2 ** 63 - 1
+RECORD = struct.Struct('<qQ')
+
+
+def pal_time(header):
+    """PAL 标题行第一列 20241114223008.27"""
+    return parse_time_ns(header.split(',', 1)[0])
+
+
+def mess_time(header):
+    """MESS 标题行第二列 2024-01-01T00:01:12.200000Z"""
+    return parse_time_ns(header.split(',')[1])
+
+
+HEADER_TIME = {'pal': pal_time, 'mess': mess_time, 'tomo': tomo_header_ns}
+
+
+def is_head_func(fmt):
+    """按字节判断标题行: tomoDD 以 # 开头, PAL/MESS 以数字开头"""
+    if fmt == 'tomo':
+        return lambda line: line.lstrip()[:1] == b'#'
+    return lambda line: line.lstrip()[:1].isdigit()
+
+
+def detect_format(path):
+    """按第一个标题行判断格式: # 开头为 tomo, 第一列带 _ (1_20240117000112.20) 为 mess, 否则 pal"""
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line[:1] == b'#':
+                return 'tomo'
+            if line[:1].isdigit():
+                return 'mess' if b'_' in line.split(b',', 1)[0] else 'pal'
+    return 'pal'
+
+
+def header_key(header, fmt):
+    """标题行(字节)的排序关键字: 发震时刻纳秒, 无法解析时为 LAST"""
+    try:
+        ns = HEADER_TIME[fmt](header.decode('utf8', 'replace').strip())
+    except (ValueError, IndexError):
+        return LAST
+    return LAST if ns == NAT else ns
+
+
+def iter_blocks(f, fmt):
+    """
+    按字节逐个读取事件块
+    :return: 生成器, 每次返回 (标题行, 事件块字节); 第一个标题之前的内容返回 (None, 字节)
+             每个事件块以换行结束(文件最后一行没有换行时补上)
+    """
+    is_head = is_head_func(fmt)
+    header = None
+    lines = []
+    for line in f:
+        if is_head(line):
+            if lines:
+                yield header, b''.join(lines)
+            header = line
+            lines = [line]
+        else:
+            lines.append(line)
+    if lines:
+        if not lines[-1].endswith(b'\n'):
+            lines[-1] += b'\n'
+        yield header, b''.join(lines)
+
+
+def _iter_text_run(path, fmt):
+    """已经有序的原格式段, 返回 (关键字, 事件块)"""
+    with open(path, 'rb') as f:
+        for header, block in iter_blocks(f, fmt):
+            if header is not None:
+                yield header_key(header, fmt), block
+
+
+def _write_run(records, path):
+    """排好序的 (关键字, 事件块) 写成段文件"""
+    with open(path, 'wb') as f:
+        for key, block in records:
+            f.write(RECORD.pack(key, len(block)))
+            f.write(block)
+
+
+def _iter_run(path):
+    """读段文件, 返回 (关键字, 事件块)"""
+    with open(path, 'rb') as f:
+        while True:
+            head = f.read(RECORD.size)
+            if not head:
+                return
+            key, length = RECORD.unpack(head)
+            yield key, f.read(length)
+
+
+def _open_run(run, fmt):
+    path, text = run
+    return _iter_text_run(path, fmt) if text else _iter_run(path)
+
+
+def check_sorted(path, fmt=None):
+    """
+    检查文件是否按发震时刻排序, 只读一遍
+    :return: (读到的事件数, 第一个比前一个事件早的事件序号(从 1 开始), 有序时为 None)
+    """
+    fmt = fmt or detect_format(path)
+    last = None
+    n = 0
+    with open(path, 'rb') as f:
+        for header, block in iter_blocks(f, fmt):
+            if header is None:
+                continue
+            n += 1
+            key = header_key(header, fmt)
+            if last is not None and key < last:
+                return n, n
+            last = key
+    return n, None
+
+
+def sort_phase(in_path, out_path, fmt=None, memory_mb=256, run_size=None, fan_in=64, tmpdir=None):
+    """
+    外部排序, out_path 可以和 in_path 相同
+    :param fmt: pal/mess/tomo, None 时按第一个标题行判断
+    :param memory_mb: 每段在内存里攒的事件块大约占用的内存(MB)
+    :param run_size: 每段最多的事件数, None 时只按内存限制
+    :param fan_in: 一次归并最多打开的段数
+    :param tmpdir: 内存段写出的目录, 默认输出文件所在目录
+    :return: {'events': 事件数, 'runs': 段数(已有序时为 0), 'bad_times': 时间无法解析的事件数}
+    """
+    fmt = fmt or detect_format(in_path)
+    if fan_in < 2:
+        raise ValueError('fan_in 至少为 2')
+    limit = memory_mb * (1 << 20)
+    like = os.path.join(tmpdir, os.path.basename(out_path)) if tmpdir else out_path
+    stats = {'events': 0, 'runs': 0, 'bad_times': 0}
+    preamble = b''
+    # 第 1 段和最终结果放在输出文件所在目录, 最后直接改名
+    prefix = temp_path(out_path)
+    result = None
+    # 段: (路径, 是否为原格式)
+    runs = [(prefix, True)]
+    buffer = []
+    size = 0
+    last = None
+    try:
+        with open(in_path, 'rb') as f:
+            out = open(prefix, 'wb')
+            try:
+                for header, block in iter_blocks(f, fmt):
+                    if header is None:
+                        # 开头内容也写到第 1 段, 有序时原样留在输出里
+                        preamble = block
+                        out.write(block)
+                        continue
+                    key = header_key(header, fmt)
+                    stats['events'] += 1
+                    stats['bad_times'] += key == LAST
+                    if out is not None:
+                        if last is None or key >= last:
+                            out.write(block)
+                            last = key
+                            continue
+                        # 第一个顺序不对的事件, 之前写出的部分是第 1 段
+                        out.close()
+                        out = None
+                    buffer.append((key, block))
+                    size += len(block) + BLOCK_OVERHEAD
+                    if size >= limit or (run_size and len(buffer) >= run_size):
+                        runs.append(_spill(buffer, like))
+                        buffer = []
+                        size = 0
+            finally:
+                if out is not None:
+                    out.close()
+        if len(runs) == 1 and not buffer:
+            # 输入已经有序
+            publish(prefix, out_path)
+            return stats
+        if buffer:
+            runs.append(_spill(buffer, like))
+            buffer = []
+        stats['runs'] = len(runs)
+        while len(runs) > fan_in:
+            merged = []
+            for k in range(0, len(runs), fan_in):
+                group = runs[k:k + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                path = temp_path(like, '.run')
+                _write_run(heapq.merge(*[_open_run(r, fmt) for r in group], key=itemgetter(0)), path)
+                for r in group:
+                    os.remove(r[0])
+                merged.append((path, False))
+            runs = merged
+        result = temp_path(out_path)
+        with open(result, 'wb') as out:
+            out.write(preamble)
+            for key, block in heapq.merge(*[_open_run(r, fmt) for r in runs], key=itemgetter(0)):
+                out.write(block)
+        publish(result, out_path)
+        return stats
+    finally:
+        for path in [r[0] for r in runs] + [result]:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def _spill(buffer, like):
+    """内存里的一段排序后写到段文件(sort 是稳定的, 时间相同保持输入顺序)"""
+    buffer.sort(key=itemgetter(0))
+    path = temp_path(like, '.run')
+    _write_run(buffer, path)
+    return path, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='震相文件按发震时刻外部排序, 事件块整体移动, 已有序时只读一遍')
+    parser.add_argument('input', help='PAL/MESS .pha 或 tomoDD phase.dat')
+    parser.add_argument('output', nargs='?', help='输出文件, 可以和输入相同; --check 时不需要')
+    parser.add_argument('--format', choices=FORMATS, help='文件格式, 默认按第一个标题行判断')
+    parser.add_argument('--memory', type=float, default=256, help='每段在内存里最多占用的 MB(默认 %(default)s)')
+    parser.add_argument('--run-size', type=int, help='每段最多的事件数')
+    parser.add_argument('--fan-in', type=int, default=64, help='一次归并最多打开的段数(默认 %(default)s)')
+    parser.add_argument('--tmpdir', help='临时段文件目录, 默认输出文件所在目录')
+    parser.add_argument('--check', action='store_true', help='只检查是否有序, 无序时返回 1')
+    args = parser.parse_args()
+    if args.check:
+        n, bad = check_sorted(args.input, args.format)
+        if bad is not None:
+            print('{}: 第 {} 个事件早于前一个事件, 没有按发震时刻排序'.format(args.input, bad))
+            sys.exit(1)
+        print('{}: {} 个事件, 已按发震时刻排序'.format(args.input, n))
+        return
+    if not args.output:
+        parser.error('需要输出文件(或 --check)')
+    try:
+        stats = sort_phase(args.input, args.output, args.format, args.memory, args.run_size, args.fan_in, args.tmpdir)
+    except ValueError as e:
+        parser.error(str(e))
+    if stats['runs']:
+        print('{} 个事件, {} 段归并'.format(stats['events'], stats['runs']))
+    else:
+        print('{} 个事件, 输入已经有序'.format(stats['events']))
+    if stats['bad_times']:
+        print('{} 个事件的发震时刻无法解析, 放在最后'.format(stats['bad_times']), file=sys.stderr)
+    print('saved to:', os.path.abspath(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+'''
+流水线: 各工具的核心逻辑作为生成器阶段在一个进程里串联, 中间结果不写文件
+1. 事件在阶段之间以 (标题行, [震相行, ...]) 传递, 和 pha_reader.iter_events 相同
+2. 第一步是读取阶段(read_pha/read_yn), 中间是变换阶段, 最后可以是 split(拆分写文件)
+   最后一步不是 split 时, 事件读完后只统计个数
+3. 每一步可以加 "write": "路径", 把这一步的结果另外写到文件(需要时才写)
+4. extract 的一对一匹配需要全部事件, 这一步会把事件收集到内存; 其它阶段每次只保留一个事件(select 为一批)
+配置文件(JSON, 或 .yaml/.yml, 需要 PyYAML), 路径相对当前目录:
+{"stages": [
+    {"stage": "read_yn", "path": "1.dat", "ctlg": "3.ctlg"},
+    {"stage": "select_yn", "keys": "YN.BAS,YN.NLA", "write": "2_select.pha"},
+    {"stage": "number", "start": 0},
+    {"stage": "select", "box": [98, 101, 24, 27], "depth": [0, 30]},
+    {"stage": "extract", "good": "good.txt", "mode": "lat-lon"},
+    {"stage": "split", "thresholds": [4, 8], "base": "good"}
+]}
+用法: python -m phasetool pipeline spec.json
+Python 里也可以直接组合: split(number(read_pha('a.pha')), [4], 'a')
+'''
+import os
+import json
+import inspect
+import argparse
+
+from phasetool.pha_reader import iter_events
+from phasetool.cli import import_script
+
+YN_SCRIPT = 'convertYNcatalog2hypoDD/convertYNcatalog2hypoDD.py'
+SELECT_YN_SCRIPT = 'selectYNnetEVT2cutMESS/selectYNnetEVT2cutMESS.py'
+EXTRACT_SCRIPT = 'extract_pha_by_lat_lon/extract_pha_by_lat_lon.py'
+SPLIT_SCRIPT = 'extract_pha_by_lat_lon/split_phases.py'
+
+
+class SpecError(ValueError):
+    """配置错误(阶段名称、参数), 和运行时读数据出的错区分开"""
+
+
+def _as_list(value):
+    """单个值或列表都转为列表, 如 [98, 101, 24, 27] 和 [[98, 101, 24, 27], ...]"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)) and value and not isinstance(value[0], (list, tuple)):
+        return [value]
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _range(value):
+    """[最小, 最大] 或 "最小-最大", 可以有负数如 "-5-10" """
+    if value is None:
+        return None, None
+    if isinstance(value, str):
+        # 在最后一个跟在数字后面的 - 处分开, 负号前面不是数字
+        cuts = [k for k in range(1, len(value)) if value[k] == '-' and value[:k].rstrip()[-1:].isdigit()]
+        value = [value[:cuts[-1]], value[cuts[-1] + 1:]] if cuts else [value]
+    try:
+        low, high = value
+        return float(low), float(high)
+    except (TypeError, ValueError):
+        raise SpecError('范围应为 [最小, 最大] 或 "最小-最大": {!r}'.format(value))
+
+
+# 读取阶段
+
+def read_pha(path):
+    """读取 PAL/MESS 震相文件"""
+    return iter_events(path)
+
+
+def read_yn(path, ctlg=None, p_phases=None, s_phases=None, utc_shift_hours=None, seq=False, amp_dist=False):
+    """
+    云南台网观测报告转为 PAL 事件(同 yn2pal)
+    :param ctlg: 目录文件, 给出时同时写出标题行
+    :param p_phases, s_phases, utc_shift_hours, seq, amp_dist: 同 yn2pal 的选项, None 时用 yn2pal 的默认值
+    """
+    module = import_script(YN_SCRIPT)
+    options = dict(seq=seq, amp_dist=amp_dist)
+    for key, value in (('p_phases', p_phases), ('s_phases', s_phases), ('utc_shift_hours', utc_shift_hours)):
+        if value is not None:
+            options[key] = value
+    with open(path, 'r', encoding='utf8') as input_file:
+        if ctlg is None:
+            yield from module.iter_converted(input_file, **options)
+            return
+        with open(ctlg, 'w') as output_ctlg:
+            for title, phases in module.iter_converted(input_file, **options):
+                output_ctlg.write(title + '\n')
+                yield title, phases
+
+
+# 变换阶段
+
+def select_yn(events, keys, dates=None, lat=None, lon=None):
+    """
+    按台站选震相行(同 select-yn), 没有选中震相的事件被丢弃
+    :param keys: 台站列表, "YN.BAS,YN.NLA" 或 ["YN.BAS", "YN.NLA"]
+    :param dates: 日期范围 "20180901-20180915"
+    :param lat, lon: 纬度、经度范围 [最小, 最大]
+    """
+    module = import_script(SELECT_YN_SCRIPT)
+    rangeCheck = module.RangeCheck()
+    rangeCheck.keys = set(keys.split(',') if isinstance(keys, str) else keys)
+    if dates is not None:
+        rangeCheck.min_date, rangeCheck.max_date = str(dates).split('-')
+    if lat is not None:
+        rangeCheck.n1_min, rangeCheck.n1_max = _range(lat)
+    if lon is not None:
+        rangeCheck.n2_min, rangeCheck.n2_max = _range(lon)
+    return module.filter_events(events, rangeCheck)
+
+
+def number(events, start=1):
+    """标题行末尾加编号(同 number-mess/number-pal)"""
+    from phasetool.numbering import number_stream
+    return number_stream(events, start)
+
+
+def select(events, box=None, polygon=None, circle=None, depth=None, mag=None, regions=None):
+    """
+    按经纬度矩形、多边形文件、圆选事件(同 select), 满足任一区域即选中
+    :param box: [最小经度, 最大经度, 最小纬度, 最大纬度], 多个时为列表的列表
+    :param polygon: 多边形文件路径, 可以是列表
+    :param circle: [经度, 纬度, 半径km], 多个时为列表的列表
+    :param depth, mag: [最小, 最大], 对所有区域生效
+    :param regions: 区域列表文件(select --regions 的格式), 选出落在任一区域内的事件
+    """
+    from phasetool.selection import Region, read_polygon, read_regions, select_stream
+    depth = tuple(depth) if depth else None
+    mag = tuple(mag) if mag else None
+    areas = [Region(box=b, depth=depth, mag=mag) for b in _as_list(box)]
+    areas += [Region(polygon=read_polygon(p), depth=depth, mag=mag) for p in _as_list(polygon)]
+    areas += [Region(circle=c, depth=depth, mag=mag) for c in _as_list(circle)]
+    if regions is not None:
+        areas += read_regions(regions)
+    if not areas:
+        raise SpecError('select 需要 box、polygon、circle 或 regions')
+    return select_stream(events, areas)
+
+
+def extract(events, good, mode='lat-lon', tolerance=1e-4, time_window=0.1, remove_id=False):
+    """按好事件列表一对一匹配提取事件(同 extract), 这一步把全部事件收集到内存"""
+    module = import_script(EXTRACT_SCRIPT)
+    records = module.read_good_records(good, mode, tolerance)
+    return module.extract_stream(events, records, mode, remove_id, tolerance, time_window)
+
+
+def write(events, path):
+    """事件原样传给下一步, 同时写到文件"""
+    with open(path, 'w') as out:
+        for header, phases in events:
+            out.write('\n'.join([header] + phases) + '\n')
+            yield header, phases
+
+
+# 最后一步
+
+def split(events, thresholds, base, key='phases', histogram=False):
+    """
+    拆分到 <base>_<分组>.pha(同 split)
+    :param thresholds: 阈值, 4、[4, 8] 或 "4,8"
+    :param histogram: 只统计各组事件数, 不写文件
+    :return: {分组名称: 事件数}
+    """
+    module = import_script(SPLIT_SCRIPT)
+    if isinstance(thresholds, (list, tuple)):
+        thresholds = ','.join(str(t) for t in thresholds)
+    try:
+        thresholds = module.parse_thresholds(str(thresholds), key)
+    except argparse.ArgumentTypeError as e:
+        raise SpecError(str(e))
+    return module.split_events(events, thresholds, key, lambda name: module.output_path(base, name),
+                               write=not histogram)
+
+
+SOURCES = {'read_pha': read_pha, 'read_yn': read_yn}
+STAGES = {'select_yn': select_yn, 'number': number, 'select': select, 'extract': extract, 'write': write}
+SINKS = {'split': split}
+
+
+def _bind(func, k, name, args, params):
+    """检查参数名称, 不对时抛出 SpecError; 参数的值在阶段运行时才检查"""
+    try:
+        inspect.signature(func).bind(*args, **params)
+    except TypeError as e:
+        raise SpecError('第 {} 步 {}: {}'.format(k + 1, name, e))
+    return func(*args, **params)
+
+
+def _counted(events, counts, k):
+    """统计每一步输出的事件数"""
+    for event in events:
+        counts[k] += 1
+        yield event
+
+
+def run_pipeline(spec):
+    """
+    按配置运行流水线
+    :param spec: {"stages": [{"stage": 名称, 参数...}, ...]} 或阶段列表
+    :return: (每一步输出的事件数, 最后一步为 split 时的 {分组名称: 事件数} 否则 None)
+    配置错误抛出 SpecError, 运行时的错误(文件不存在、数据格式错误等)原样抛出
+    """
+    steps = spec.get('stages') if isinstance(spec, dict) else spec
+    if not steps or not isinstance(steps, list) or not all(isinstance(step, dict) for step in steps):
+        raise SpecError('流水线没有阶段, 应为 {"stages": [{"stage": 名称, 参数...}, ...]}')
+    counts = [0] * len(steps)
+    events = None
+    result = None
+    for k, step in enumerate(steps):
+        params = dict(step)
+        name = params.pop('stage', None)
+        out = params.pop('write', None)
+        if k == 0:
+            if name not in SOURCES:
+                raise SpecError('第 1 步必须是读取阶段: {}'.format(', '.join(SOURCES)))
+            events = _bind(SOURCES[name], k, name, (), params)
+        elif name in SINKS:
+            if k != len(steps) - 1:
+                raise SpecError('{} 只能是最后一步'.format(name))
+            if out:
+                raise SpecError('{} 自己写文件, 不能加 write'.format(name))
+            result = _bind(SINKS[name], k, name, (events,), params)
+            counts[k] = sum(result.values())
+            return counts, result
+        elif name in STAGES:
+            events = _bind(STAGES[name], k, name, (events,), params)
+        else:
+            raise SpecError('第 {} 步: 未知的阶段 {}, 可用: {}'.format(
+                k + 1, name, ', '.join(list(SOURCES) + list(STAGES) + list(SINKS))))
+        if out:
+            events = write(events, out)
+        events = _counted(events, counts, k)
+    for _ in events:
+        pass
+    return counts, result
+
+
+def load_spec(path):
+    """读取 JSON 或 YAML 配置"""
+    with open(path, 'r', encoding='utf8') as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit('读取 YAML 配置需要 PyYAML: pip install pyyaml, 或者改用 JSON')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按配置在内存里串联各工具, 中间结果只在 "write" 指定时写文件')
+    parser.add_argument('spec', help='配置文件 .json 或 .yaml/.yml')
+    args = parser.parse_args()
+    spec = load_spec(args.spec)
+    try:
+        counts, result = run_pipeline(spec)
+    except SpecError as e:
+        raise SystemExit('配置错误: {}'.format(e))
+    steps = spec['stages'] if isinstance(spec, dict) else spec
+    for k, (step, n) in enumerate(zip(steps, counts)):
+        target = ' -> {}'.format(step['write']) if step.get('write') else ''
+        print('[{}/{}] {}: {} 个事件{}'.format(k + 1, len(steps), step.get('stage'), n, target))
+    if result is not None:
+        for name, n in result.items():
+            print('- {}: {} 个事件'.format(name, n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+'''
+向量化的事件选择: 矩形、多边形、大圆半径、深度范围、震级范围
+标题行按批解析成 NumPy 数组, 一次计算整批事件的掩码, 再把选中的事件块流式写出
+'''
+import os
+
+import numpy as np
+
+from phasetool.pha_reader import iter_events, is_header
+from phasetool.fanout import FanoutWriter
+from phasetool.mmap_scan import open_mmap, iter_block_batches, header_lines, copy_blocks
+from phasetool.geodesy import EARTH_RADIUS_KM, distance_km
+
+
+def parse_headers(headers):
+    """
+    批量解析 PAL 标题行 time,lat,lon,depth,mag,...
+    :return: dict, lat/lon/depth/mag 为 float64 数组, 缺失或无法解析的值为 NaN
+    """
+    cols = [(h.split(',', 5)[1:5] + ['', '', '', ''])[:4] for h in headers]
+    arr = np.array(cols, dtype=str).reshape(len(headers), 4)
+    try:
+        values = np.char.strip(arr).astype(np.float64)
+    except ValueError:
+        values = np.full(arr.shape, np.nan)
+        for i, row in enumerate(cols):
+            for k, v in enumerate(row):
+                try:
+                    values[i, k] = float(v)
+                except ValueError:
+                    pass
+    return {'lat': values[:, 0], 'lon': values[:, 1], 'depth': values[:, 2], 'mag': values[:, 3]}
+
+
+def point_in_polygon(lon, lat, poly_lon, poly_lat):
+    """射线法判断点是否在多边形内, 对点向量化, 按多边形的边循环"""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    inside = np.zeros(lon.shape, dtype=bool)
+    n = len(poly_lon)
+    j = n - 1
+    for i in range(n):
+        xi, yi = poly_lon[i], poly_lat[i]
+        xj, yj = poly_lon[j], poly_lat[j]
+        crosses = (yi > lat) != (yj > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = (xj - xi) * (lat - yi) / (yj - yi) + xi
+        inside ^= crosses & (lon < x)
+        j = i
+    return inside
+
+
+def great_circle_km(lon0, lat0, lon, lat, model='sphere'):
+    """圆心到各点的距离(km), 默认球面 haversine, model='wgs84' 时用椭球"""
+    return distance_km(lon0, lat0, lon, lat, model)
+
+
+class Region:
+    """
+    一个选择条件, 所有给出的条件同时满足才选中
+    :param box: (min_lon, max_lon, min_lat, max_lat)
+    :param polygon: [(lon, lat), ...] 多边形顶点
+    :param circle: (lon, lat, radius_km)
+    :param depth: (min, max), 任一端为 None 表示不限
+    :param mag: (min, max), 任一端为 None 表示不限
+    """
+
+    def __init__(self, name=None, box=None, polygon=None, circle=None, depth=None, mag=None):
+        self.name = name
+        self.box = box
+        self.polygon = None if polygon is None else np.asarray(polygon, dtype=np.float64)
+        self.circle = circle
+        self.depth = depth
+        self.mag = mag
+
+    def bounds(self):
+        """水平范围的外接矩形 (min_lon, max_lon, min_lat, max_lat), 不限范围时返回 None"""
+        bounds = []
+        if self.box is not None:
+            bounds.append(tuple(self.box))
+        if self.polygon is not None:
+            bounds.append((self.polygon[:, 0].min(), self.polygon[:, 0].max(),
+                           self.polygon[:, 1].min(), self.polygon[:, 1].max()))
+        if self.circle is not None:
+            lon, lat, radius = self.circle
+            dlat = np.degrees(radius / EARTH_RADIUS_KM)
+            coslat = np.cos(np.radians(min(abs(lat) + dlat, 89.9)))
+            dlon = min(dlat / coslat, 180.0)
+            bounds.append((lon - dlon, lon + dlon, lat - dlat, lat + dlat))
+        if not bounds:
+            return None
+        return (max(b[0] for b in bounds), min(b[1] for b in bounds),
+                max(b[2] for b in bounds), min(b[3] for b in bounds))
+
+    def mask(self, lat, lon, depth=None, mag=None):
+        """返回选中事件的布尔数组, NaN 值不会被选中"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        selected = np.isfinite(lat) & np.isfinite(lon)
+        if self.box is not None:
+            min_lon, max_lon, min_lat, max_lat = self.box
+            selected &= (min_lon <= lon) & (lon <= max_lon) & (min_lat <= lat) & (lat <= max_lat)
+        if self.circle is not None:
+            clon, clat, radius = self.circle
+            selected &= great_circle_km(clon, clat, lon, lat) <= radius
+        if self.polygon is not None:
+            # 只对前面条件还保留的点做多边形判断
+            idx = np.flatnonzero(selected)
+            selected[idx] = point_in_polygon(lon[idx], lat[idx], self.polygon[:, 0], self.polygon[:, 1])
+        for values, limits in ((depth, self.depth), (mag, self.mag)):
+            if limits is None:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            low, high = limits
+            if low is not None:
+                selected &= values >= low
+            if high is not None:
+                selected &= values <= high
+        return selected
+
+
+def union_mask(regions, fields):
+    """任一区域选中即选中"""
+    selected = np.zeros(len(fields['lat']), dtype=bool)
+    for region in regions:
+        selected |= region.mask(fields['lat'], fields['lon'], fields['depth'], fields['mag'])
+    return selected
+
+
+def batch_events(events, batch_size=50000):
+    """(标题行, [震相行]) 迭代器按批分组, 每批返回 ([标题行], [[震相行], ...])"""
+    headers = []
+    blocks = []
+    for header, phases in events:
+        headers.append(header)
+        blocks.append(phases)
+        if len(headers) >= batch_size:
+            yield headers, blocks
+            headers, blocks = [], []
+    if headers:
+        yield headers, blocks
+
+
+def iter_batches(file_or_path, is_header=is_header, batch_size=50000):
+    """按批读取事件块, 每批返回 ([标题行], [[震相行], ...])"""
+    return batch_events(iter_events(file_or_path, is_header=is_header), batch_size)
+
+
+def iter_mmap_batches(mm, start=0, end=None):
+    """mmap 扫描事件块, 只解码标题行, 每批返回 (起始偏移数组, 结束偏移数组, [标题行])"""
+    for starts, ends, _ in iter_block_batches(mm, start=start, end=end):
+        yield starts, ends, header_lines(mm, starts, ends)
+
+
+def select_events_mmap(input_path, output_file, regions, start=0, end=None, append=False):
+    """
+    select_events 的 mmap 版本: 只解码标题行, 选中的事件块按原始字节复制
+    :param start, end: 只处理 [start, end) 字节范围, 用于分块并行和增量处理
+    :param append: 追加到 output_file
+    :return: (总事件数, 选中事件数)
+    """
+    total_count = 0
+    selected_count = 0
+    with open_mmap(input_path) as mm, open(output_file, 'ab' if append else 'wb') as outfile:
+        for starts, ends, headers in iter_mmap_batches(mm, start, end):
+            selected = union_mask(regions, parse_headers(headers))
+            copy_blocks(mm, outfile, starts[selected], ends[selected])
+            total_count += len(headers)
+            selected_count += int(selected.sum())
+    return total_count, selected_count
+
+
+def select_events(input_file, output_file, regions, is_header=is_header, batch_size=50000):
+    """
+    选出落在任一区域内的事件写到 output_file
+    :return: (总事件数, 选中事件数)
+    """
+    total_count = 0
+    selected_count = 0
+    with open(output_file, 'w') as outfile:
+        for headers, blocks in iter_batches(input_file, is_header=is_header, batch_size=batch_size):
+            selected = union_mask(regions, parse_headers(headers))
+            for i in np.flatnonzero(selected).tolist():
+                outfile.write(headers[i] + '\n')
+                for line in blocks[i]:
+                    outfile.write(line + '\n')
+            total_count += len(headers)
+            selected_count += int(selected.sum())
+    return total_count, selected_count
+
+
+def select_stream(events, regions, batch_size=50000):
+    """逐个返回落在任一区域内的事件, 输入输出都是 (标题行, [震相行]) 迭代器"""
+    for headers, blocks in batch_events(events, batch_size):
+        selected = union_mask(regions, parse_headers(headers))
+        for i in np.flatnonzero(selected).tolist():
+            yield headers[i], blocks[i]
+
+
+def read_polygon(file_path):
+    """读取多边形文件, 每行 "lon lat", 忽略空行和 #、> 开头的行"""
+    points = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#>':
+                continue
+            lon, lat = line.replace(',', ' ').split()[:2]
+            points.append((float(lon), float(lat)))
+    return points
+
+
+def select_catalog(catalog, output_file, regions):
+    """列式目录(PhaseCatalog)的区域选择, 直接对 events 数组计算掩码"""
+    ev = catalog.events
+    selected = union_mask(regions, {'lat': ev['lat'], 'lon': ev['lon'], 'depth': ev['depth'], 'mag': ev['mag']})
+    catalog.select(selected).to_pha(output_file)
+    return len(catalog), int(selected.sum())
+
+
+class RegionGrid:
+    """
+    区域的网格索引: 每个区域按外接矩形登记到覆盖的网格中,
+    事件只需要和所在网格登记的区域比较
+    :param cell_deg: 网格大小(度)
+    """
+
+    def __init__(self, regions, cell_deg=0.1):
+        self.regions = regions
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.unbounded = []  # 没有水平范围限制的区域, 对所有事件判断
+        for k, region in enumerate(regions):
+            bounds = region.bounds()
+            if bounds is None:
+                self.unbounded.append(k)
+                continue
+            min_lon, max_lon, min_lat, max_lat = bounds
+            if min_lon > max_lon or min_lat > max_lat:
+                continue
+            for ix in range(self._index(min_lon), self._index(max_lon) + 1):
+                for iy in range(self._index(min_lat), self._index(max_lat) + 1):
+                    self.cells.setdefault((ix, iy), []).append(k)
+
+    def _index(self, value):
+        return int(np.floor(value / self.cell_deg))
+
+    def assign(self, fields):
+        """
+        计算每个区域选中的事件
+        :return: dict, 区域序号 -> 选中事件下标数组(升序)
+        """
+        lat = np.asarray(fields['lat'], dtype=np.float64)
+        lon = np.asarray(fields['lon'], dtype=np.float64)
+        candidates = {}
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if len(valid):
+            ix = np.floor(lon[valid] / self.cell_deg).astype(np.int64)
+            iy = np.floor(lat[valid] / self.cell_deg).astype(np.int64)
+            # 按网格排序后分组, 每个网格只查一次字典
+            order = np.lexsort((iy, ix))
+            keys = np.stack((ix[order], iy[order]), axis=1)
+            change = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+            starts = np.concatenate(([0], change))
+            ends = np.concatenate((change, [len(order)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                for k in self.cells.get((int(keys[start, 0]), int(keys[start, 1])), ()):
+                    candidates.setdefault(k, []).append(valid[order[start:end]])
+        result = {}
+        for k, parts in candidates.items():
+            idx = np.sort(np.concatenate(parts))
+            region = self.regions[k]
+            hit = region.mask(lat[idx], lon[idx], fields['depth'][idx], fields['mag'][idx])
+            if hit.any():
+                result[k] = idx[hit]
+        for k in self.unbounded:
+            hit = np.flatnonzero(self.regions[k].mask(lat, lon, fields['depth'], fields['mag']))
+            if len(hit):
+                result[k] = hit
+        return result
+
+
+def _parse_range(text):
+    low, high = text.split(',')
+    return (float(low) if low else None, float(high) if high else None)
+
+
+def read_regions(file_path):
+    """
+    读取区域列表文件, 每行一个区域:
+    名称 box 最小经度 最大经度 最小纬度 最大纬度 [depth=最小,最大] [mag=最小,最大]
+    名称 circle 经度 纬度 半径km [depth=...] [mag=...]
+    名称 polygon 多边形文件(相对区域文件所在目录) [depth=...] [mag=...]
+    忽略空行和 # 开头的行
+    """
+    regions = []
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            options = dict(p.split('=', 1) for p in parts if '=' in p)
+            values = [p for p in parts if '=' not in p]
+            name, kind = values[0], values[1].lower()
+            region = Region(name=name,
+                            depth=_parse_range(options['depth']) if 'depth' in options else None,
+                            mag=_parse_range(options['mag']) if 'mag' in options else None)
+            if kind == 'box':
+                region.box = tuple(float(v) for v in values[2:6])
+            elif kind == 'circle':
+                region.circle = tuple(float(v) for v in values[2:5])
+            elif kind == 'polygon':
+                region.polygon = np.asarray(read_polygon(os.path.join(base_dir, values[2])), dtype=np.float64)
+            else:
+                raise ValueError('未知的区域类型: {}'.format(line))
+            regions.append(region)
+    return regions
+
+
+def select_events_multi(input_file, regions, output_dir, is_header=is_header, batch_size=50000, cell_deg=0.1):
+    """
+    读一遍输入, 把每个事件写到它所在的每个区域的输出文件 output_dir/名称.pha
+    :return: (总事件数, {区域名称: 选中事件数})
+    """
+    grid = RegionGrid(regions, cell_deg=cell_deg)
+    names = [region.name or 'region{}'.format(k) for k, region in enumerate(regions)]
+    total_count = 0
+    if isinstance(input_file, str):
+        # 文件路径: mmap 扫描, 事件块按原始字节写到各个区域
+        with open_mmap(input_file) as mm, \
+                FanoutWriter(lambda name: os.path.join(output_dir, name + '.pha'), mode='wb') as writer:
+            for name in names:
+                writer.get_file(name)
+            for starts, ends, headers in iter_mmap_batches(mm):
+                assigned = grid.assign(parse_headers(headers))
+                for k, idx in assigned.items():
+                    copy_blocks(mm, writer.get_file(names[k]), starts[idx], ends[idx])
+                    writer.counts[names[k]] += len(idx)
+                total_count += len(headers)
+            counts = {name: writer.counts.get(name, 0) for name in names}
+        return total_count, counts
+    with FanoutWriter(lambda name: os.path.join(output_dir, name + '.pha')) as writer:
+        for name in names:
+            writer.get_file(name)
+        for headers, blocks in iter_batches(input_file, is_header=is_header, batch_size=batch_size):
+            assigned = grid.assign(parse_headers(headers))
+            # 每个事件只拼接一次文本, 再写到各个区域
+            texts = {}
+            for k, idx in assigned.items():
+                for i in idx.tolist():
+                    if i not in texts:
+                        texts[i] = '\n'.join([headers[i]] + blocks[i]) + '\n'
+                    writer.write(names[k], texts[i])
+            total_count += len(headers)
+        counts = {name: writer.counts.get(name, 0) for name in names}
+    return total_count, counts
@@ -0,0 +1,145 @@
+'''
+按列映射转换空白分隔的目录文件(hypoDD.reloc、hypoinverse 目录 -> zmap 等)
+1. 输出格式用 Column 列表描述: 取输入的第几列, 可以再取其中的字符范围或者按数字重新格式化
+2. pandas 按块读取(每块 chunksize 行), 每块整列切片、格式化、拼接后一次写出, 不逐行建立列表
+3. 列数少于 min_columns 的行跳过(与原来脚本的 len(columns) >= N 判断相同)
+用法: python -m phasetool.table_convert hypoDD.reloc out.dat --format hypodd-zmap
+      python -m phasetool.table_convert in.dat out.dat --columns "3,2,1[1:4],5%.2f" --min-columns 5
+'''
+import re
+import csv
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+class Column:
+    """
+    一个输出列
+    :param index: 输入列号(从 0 开始)
+    :param start, stop: 只取字符 [start, stop), 例如 YYYYMMDDhhmm 中的月份 (4, 6)
+    :param fmt: 按数字重新格式化, 例如 '%.3f'
+    """
+
+    def __init__(self, index, start=None, stop=None, fmt=None):
+        self.index = index
+        self.start = start
+        self.stop = stop
+        self.fmt = fmt
+
+    def apply(self, values):
+        """values 为一列字符串(pandas Series), 返回转换后的字符串 Series"""
+        if self.start is not None or self.stop is not None:
+            values = values.str.slice(self.start, self.stop)
+        if self.fmt is not None:
+            numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+            values = pd.Series(np.char.mod(self.fmt, numbers), index=values.index)
+        return values
+
+
+class TableFormat:
+    """
+    :param columns: Column 列表
+    :param min_columns: 输入行至少要有的列数, 默认为用到的最大列号 + 1
+    """
+
+    def __init__(self, columns, min_columns=None, description=''):
+        self.columns = columns
+        needed = max(c.index for c in columns) + 1
+        self.min_columns = max(needed, min_columns or 0)
+        self.description = description
+
+
+_COLUMN_RE = re.compile(r'^(\d+)(?:\[(-?\d*):(-?\d*)\])?(%\S+)?$')
+
+
+def parse_columns(text):
+    """
+    '3,2,1[1:4],5%.2f' -> Column 列表
+    列号和 awk 一样从 1 开始; [a:b] 为 Python 切片(从 0 开始); %... 为数字格式
+    """
+    columns = []
+    for item in text.split(','):
+        match = _COLUMN_RE.match(item.strip())
+        if match is None or int(match.group(1)) < 1:
+            raise ValueError('无法解析的列: {}'.format(item))
+        index, start, stop, fmt = match.groups()
+        columns.append(Column(int(index) - 1,
+                              int(start) if start else None,
+                              int(stop) if stop else None,
+                              fmt))
+    return columns
+
+
+# 已知格式, 注释中的列号与原脚本相同(从 1 开始)
+FORMATS = {
+    # hypoDD.reloc: 第 3,2,11,12,13,17,4,14,15 列 -> 经度 纬度 年 月 日 震级 深度 时 分
+    'hypodd-zmap': TableFormat(parse_columns('3,2,11,12,13,17,4,14,15'), min_columns=17,
+                               description='hypoDD.reloc -> zmap'),
+    # 发震时刻 纬度 经度 深度 震级 -> 经度 纬度 年 月 日 震级 深度 时 分
+    'hypoinverse-zmap': TableFormat(parse_columns('3,2,1[0:4],1[4:6],1[6:8],5,4,1[8:10],1[10:12]'),
+                                    min_columns=5,
+                                    description='YYYYMMDDhhmmss.ss lat lon depth mag -> zmap'),
+}
+
+
+def iter_chunks(input_file, min_columns, chunksize=100000, max_columns=64):
+    """
+    按块读取空白分隔的文本, 每块返回只包含列数足够的行的 DataFrame(列名为 0, 1, 2, ...)
+    :param max_columns: 一行最多的列数, 超过的行会被跳过并给出警告
+    """
+    try:
+        reader = pd.read_csv(input_file, sep=r'\s+', header=None, dtype=str,
+                             names=range(max(max_columns, min_columns)), index_col=False,
+                             chunksize=chunksize, on_bad_lines='warn', skip_blank_lines=True,
+                             keep_default_na=False, quoting=csv.QUOTE_NONE)
+    except pd.errors.EmptyDataError:
+        return
+    with reader:
+        for chunk in reader:
+            # 字段原样保留为字符串, 缺少的列为空字符串
+            yield chunk[chunk[min_columns - 1].fillna('') != '']
+
+
+def convert_table(input_file, output_file, table_format, chunksize=100000, max_columns=64):
+    """
+    按 table_format 转换整个文件
+    :return: 写出的行数
+    """
+    count = 0
+    with open(output_file, 'w') as out:
+        for chunk in iter_chunks(input_file, table_format.min_columns, chunksize, max_columns):
+            if chunk.empty:
+                continue
+            parts = [column.apply(chunk[column.index]) for column in table_format.columns]
+            lines = parts[0].str.cat(parts[1:], sep=' ')
+            out.write('\n'.join(lines.tolist()) + '\n')
+            count += len(lines)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按列映射转换空白分隔的目录文件')
+    parser.add_argument('input_file')
+    parser.add_argument('output_file')
+    parser.add_argument('--format', choices=list(FORMATS),
+                        help='已知格式: ' + '; '.join('{} ({})'.format(k, v.description) for k, v in FORMATS.items()))
+    parser.add_argument('--columns', help='输出列, 如 "3,2,1[0:4],5%%.2f"(列号从 1 开始)')
+    parser.add_argument('--min-columns', type=int, help='输入行至少要有的列数')
+    parser.add_argument('--chunksize', type=int, default=100000, help='每块读取的行数')
+    args = parser.parse_args()
+    if args.columns:
+        columns = parse_columns(args.columns)
+    elif args.format:
+        columns = FORMATS[args.format].columns
+    else:
+        parser.error('需要 --format 或 --columns')
+    min_columns = args.min_columns or (FORMATS[args.format].min_columns if args.format and not args.columns else None)
+    table_format = TableFormat(columns, min_columns)
+    count = convert_table(args.input_file, args.output_file, table_format, args.chunksize)
+    print('转换完成, {} 行, 结果已保存到 {}'.format(count, args.output_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''
+.pha 文件的发震时刻索引(旁路文件 <文件名>.tidx)
+索引按发震时刻排序, 记录每个事件块在文件中的字节偏移和长度,
+时间窗查询用二分查找定位, 再 seek 只读取匹配的字节范围
+'''
+import os
+
+import numpy as np
+
+from phasetool.pha_reader import is_header
+from phasetool.catalog import pal_time_to_ns
+
+INDEX_DTYPE = np.dtype([('time_ns', '<i8'), ('offset', '<i8'), ('length', '<i8')])
+INDEX_SUFFIX = '.tidx'
+
+
+def pal_header_time(header):
+    """PAL 标题行第一列 20241114223008.27"""
+    return header.split(',', 1)[0]
+
+
+def index_path(pha_path):
+    return pha_path + INDEX_SUFFIX
+
+
+def build_index(pha_path, is_header=is_header, header_time=pal_header_time, batch_size=100000):
+    """
+    扫描一遍文件建立索引
+    :param header_time: 从标题行取出 PAL 格式时间字符串的函数
+    :return: INDEX_DTYPE 数组, 按时间排序(时间相同保持文件顺序)
+    """
+    parts = []
+    times, offsets, lengths = [], [], []
+    last = None
+    offset = 0
+
+    def flush():
+        if times:
+            chunk = np.zeros(len(times), dtype=INDEX_DTYPE)
+            chunk['time_ns'] = pal_time_to_ns(times)
+            chunk['offset'] = offsets
+            chunk['length'] = lengths
+            parts.append(chunk)
+            times.clear()
+            offsets.clear()
+            lengths.clear()
+
+    with open(pha_path, 'rb') as f:
+        for line in f:
+            text = line.decode('utf8', 'replace').strip()
+            if text and is_header(text):
+                if last is not None:
+                    lengths.append(offset - last)
+                    if len(times) >= batch_size:
+                        flush()
+                times.append(header_time(text))
+                offsets.append(offset)
+                last = offset
+            offset += len(line)
+    if last is not None:
+        lengths.append(offset - last)
+    flush()
+    index = np.concatenate(parts) if parts else np.zeros(0, dtype=INDEX_DTYPE)
+    return index[np.argsort(index['time_ns'], kind='stable')]
+
+
+def load_index(pha_path, rebuild=False, **kwargs):
+    """
+    读取旁路索引, 不存在或者 .pha 的大小、修改时间变化时重新建立并保存
+    """
+    path = index_path(pha_path)
+    stat = os.stat(pha_path)
+    if not rebuild and os.path.exists(path):
+        with np.load(path) as data:
+            if int(data['size']) == stat.st_size and int(data['mtime_ns']) == stat.st_mtime_ns:
+                return data['index']
+    index = build_index(pha_path, **kwargs)
+    with open(path, 'wb') as f:
+        np.savez(f, index=index, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    return index
+
+
+def query_ranges(index, t_min_ns=None, t_max_ns=None):
+    """
+    二分查找时间窗 [t_min_ns, t_max_ns] 内的事件, 合并文件中相邻的事件块
+    :return: [(offset, length), ...] 按文件偏移排序
+    """
+    times = index['time_ns']
+    lo = 0 if t_min_ns is None else int(np.searchsorted(times, t_min_ns, side='left'))
+    hi = len(times) if t_max_ns is None else int(np.searchsorted(times, t_max_ns, side='right'))
+    blocks = np.sort(index[lo:hi], order='offset')
+    ranges = []
+    for offset, length in zip(blocks['offset'].tolist(), blocks['length'].tolist()):
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1][1] += length
+        else:
+            ranges.append([offset, length])
+    return [tuple(r) for r in ranges]
+
+
+def iter_window(pha_path, t_min_ns=None, t_max_ns=None, is_header=is_header, index=None):
+    """
+    只读取时间窗内的事件, 每次返回 (标题行, [震相行, ...]), 按文件顺序
+    :param index: 已经读取的索引, 默认使用 load_index
+    """
+    if index is None:
+        index = load_index(pha_path, is_header=is_header)
+    with open(pha_path, 'rb') as f:
+        for offset, length in query_ranges(index, t_min_ns, t_max_ns):
+            f.seek(offset)
+            header = None
+            phases = []
+            remaining = length
+            while remaining > 0:
+                line = f.readline()
+                if not line:
+                    break
+                remaining -= len(line)
+                line = line.decode('utf8').strip()
+                if not line:
+                    continue
+                if is_header(line):
+                    if header is not None:
+                        yield header, phases
+                    header = line
+                    phases = []
+                elif header is not None:
+                    phases.append(line)
+            if header is not None:
+                yield header, phases
+
+
+def date_to_ns(date_str, end_of_day=False):
+    """YYYYMMDD 转为当天 0 时(或最后 1 纳秒)的纳秒时间"""
+    day = np.datetime64('{}-{}-{}'.format(date_str[0:4], date_str[4:6], date_str[6:8]), 'ns')
+    if end_of_day:
+        day = day + np.timedelta64(1, 'D') - np.timedelta64(1, 'ns')
+    return int(day.astype(np.int64))
@@ -0,0 +1,219 @@
+'''
+固定格式时间字符串的快速解析, 返回 int64 纳秒(1970-01-01 起)
+支持:
+1. 20241114223008.27         (PAL/MESS 标题行, YYYYMMDDhhmmss.ff)
+2. 2024-11-14T22:30:10.600000Z (ISO, 日期分隔符也可以是 /, 日期时间之间也可以是空格)
+批量解析按字节矩阵向量化计算, 其它格式才交给 obspy.UTCDateTime
+tomoDD/hypoDD phase.dat 标题行(# yyyy mm dd hh mi ss.ss ...)的发震时刻用 tomo_header_ns
+'''
+from functools import lru_cache
+
+import numpy as np
+
+NAT = np.iinfo(np.int64).min  # 与 numpy datetime64 的 NaT 相同
+NS_PER_SEC = 10**9
+NS_PER_DAY = 86400 * NS_PER_SEC
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def days_from_civil(y, m, d):
+    """公历日期转为 1970-01-01 起的天数, 标量和 NumPy 数组都可以"""
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    shift = np.where(m > 2, -3, 9) if isinstance(m, np.ndarray) else (-3 if m > 2 else 9)
+    doy = (153 * (m + shift) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def days_in_month(y, m):
+    """公历每月的天数(闰年二月 29 天), m 必须在 1~12, 标量和 NumPy 数组都可以"""
+    leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+    return MONTH_DAYS[m - 1] + (leap & (m == 2))
+
+
+def civil_from_days(z):
+    """1970-01-01 起的天数转为 (年, 月, 日)"""
+    z = z + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + (np.where(mp < 10, 3, -9) if isinstance(mp, np.ndarray) else (3 if mp < 10 else -9))
+    return yoe + era * 400 + (m <= 2), m, d
+
+
+def _layout(s):
+    """
+    判断时间字符串的格式
+    :return: 年月日时分秒各两位数字开始位置和小数点位置, 不是支持的格式返回 None
+    """
+    if len(s) >= 14 and s[:14].isdigit():
+        return (0, 4, 6, 8, 10, 12), 14
+    if len(s) >= 19 and s[4] in '-/' and s[7] == s[4] and s[10] in 'T ' and s[13] == ':' and s[16] == ':':
+        return (0, 5, 8, 11, 14, 17), 19
+    return None
+
+
+def _fraction_ns(frac):
+    """小数部分 '.27' -> 270000000"""
+    frac = frac.rstrip('Z')
+    if not frac:
+        return 0
+    if frac[0] != '.' or not frac[1:].isdigit():
+        raise ValueError(frac)
+    return int(frac[1:10].ljust(9, '0'))
+
+
+def _obspy_ns(s):
+    try:
+        from obspy import UTCDateTime
+    except ImportError:
+        raise ValueError('无法解析的时间: {}'.format(s))
+    try:
+        return UTCDateTime(s).ns
+    except Exception:
+        raise ValueError('无法解析的时间: {}'.format(s))
+
+
+def parse_time_ns(s):
+    """解析一个时间字符串, 空字符串和 NaT 返回 NAT"""
+    s = s.strip()
+    if not s or s == 'NaT':
+        return NAT
+    layout = _layout(s)
+    if layout is None:
+        return _obspy_ns(s)
+    (y, mo, d, h, mi, se), dot = layout
+    try:
+        year, month, day = int(s[y:y + 4]), int(s[mo:mo + 2]), int(s[d:d + 2])
+        hour, minute, second = int(s[h:h + 2]), int(s[mi:mi + 2]), int(s[se:se + 2])
+        frac = _fraction_ns(s[dot:])
+    except ValueError:
+        return _obspy_ns(s)
+    # 不存在的日期(如 2 月 31 日)和时刻(25 时、61 分、60 秒)和格式错误一样处理, 不顺延
+    if not (1 <= month <= 12 and 1 <= day <= days_in_month(year, month)):
+        return _obspy_ns(s)
+    if not (0 <= hour <= 23 and 0 <= minute <= 59 and 0 <= second <= 59):
+        return _obspy_ns(s)
+    return (int(days_from_civil(year, month, day)) * NS_PER_DAY +
+            (hour * 3600 + minute * 60 + second) * NS_PER_SEC + frac)
+
+
+@lru_cache(maxsize=65536)
+def parse_origin_ns(s):
+    """带缓存的解析, 用于同一发震时刻被反复解析的情况"""
+    return parse_time_ns(s)
+
+
+def tomo_header_ns(header):
+    """tomoDD 标题行 # yyyy mm dd hh mi ss.ss ... 的发震时刻(纳秒), 格式错误时抛出 ValueError 或 IndexError"""
+    fields = header.lstrip()[1:].split()
+    y, mo, d, h, mi = (int(v) for v in fields[0:5])
+    return (int(days_from_civil(y, mo, d)) * NS_PER_DAY + (h * 3600 + mi * 60) * NS_PER_SEC +
+            int(round(float(fields[5]) * NS_PER_SEC)))
+
+
+def _parse_same_layout(raw, layout, dot):
+    """同一格式、同样长度的字节串矩阵向量化解析, 有非数字时返回 None"""
+    y, mo, d, h, mi, se = layout
+    digits = raw.astype(np.int64) - 48
+
+    def number(start, width):
+        value = np.zeros(len(digits), dtype=np.int64)
+        for k in range(start, start + width):
+            value = value * 10 + digits[:, k]
+        return value
+
+    positions = [p for start, width in zip(layout, (4, 2, 2, 2, 2, 2)) for p in range(start, start + width)]
+    width = raw.shape[1]
+    end = width - 1 if width > dot and raw[0, -1] == ord('Z') else width
+    frac_cols = list(range(dot + 1, min(end, dot + 10)))
+    check = digits[:, positions + frac_cols]
+    if np.any((check < 0) | (check > 9)):
+        return None
+    if end > dot and np.any(raw[:, dot] != ord('.')):
+        return None
+    if end < width and np.any(raw[:, -1] != ord('Z')):
+        return None
+    year = number(y, 4)
+    month = number(mo, 2)
+    day = number(d, 2)
+    if np.any((month < 1) | (month > 12)):
+        return None
+    if np.any((day < 1) | (day > days_in_month(year, month))):
+        return None
+    hour = number(h, 2)
+    minute = number(mi, 2)
+    second = number(se, 2)
+    if np.any((hour > 23) | (minute > 59) | (second > 59)):
+        return None
+    ns = days_from_civil(year, month, day) * NS_PER_DAY
+    ns += (hour * 3600 + minute * 60 + second) * NS_PER_SEC
+    if frac_cols:
+        ns += number(dot + 1, len(frac_cols)) * 10 ** (9 - len(frac_cols))
+    return ns
+
+
+def parse_times_ns(values):
+    """
+    批量解析时间字符串
+    按长度分组, 每组用字节矩阵一次算出全部时间; 不符合固定格式的逐个解析
+    :return: int64 数组, 空字符串为 NAT
+    """
+    arr = np.asarray(values, dtype='S')
+    out = np.full(len(arr), NAT, dtype=np.int64)
+    if len(arr) == 0:
+        return out
+    arr = np.char.strip(arr)
+    lengths = np.char.str_len(arr)
+    for length in np.unique(lengths).tolist():
+        if length == 0:
+            continue
+        idx = np.flatnonzero(lengths == length)
+        group = arr[idx]
+        result = None
+        layout = _layout(group[0].decode('ascii', 'replace'))
+        if layout is not None:
+            raw = group.astype('S{}'.format(length)).view(np.uint8).reshape(len(group), length)
+            result = _parse_same_layout(raw, *layout)
+        if result is None:
+            result = [parse_time_ns(v.decode('utf8')) for v in group]
+        out[idx] = result
+    return out
+
+
+def ns_to_fields(ns):
+    """纳秒转为 (年, 月, 日, 时, 分, 秒(含小数))"""
+    days, rest = divmod(int(ns), NS_PER_DAY)
+    year, month, day = civil_from_days(days)
+    hour, rest = divmod(rest, 3600 * NS_PER_SEC)
+    minute, rest = divmod(rest, 60 * NS_PER_SEC)
+    return int(year), int(month), int(day), hour, minute, rest / NS_PER_SEC
+
+
+def format_iso(ns):
+    """纳秒转为 2024-11-14T22:30:10.600000Z (与 str(UTCDateTime) 相同, 四舍五入到微秒)"""
+    days, rest = divmod((int(ns) + 500) // 1000, 86400 * 10**6)
+    year, month, day = civil_from_days(days)
+    second, micro = divmod(rest, 10**6)
+    hour, second = divmod(second, 3600)
+    minute, second = divmod(second, 60)
+    return '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}Z'.format(
+        int(year), int(month), int(day), hour, minute, second, micro)
+
+
+def format_pal(ns, decimals=2):
+    """纳秒转为 20241114223008.27 (小数截断)"""
+    days, rest = divmod(int(ns), NS_PER_DAY)
+    year, month, day = civil_from_days(days)
+    second, frac = divmod(rest, NS_PER_SEC)
+    hour, second = divmod(second, 3600)
+    minute, second = divmod(second, 60)
+    text = '{:04d}{:02d}{:02d}{:02d}{:02d}{:02d}'.format(int(year), int(month), int(day), hour, minute, second)
+    if decimals:
+        text += '.{:09d}'.format(frac)[:decimals + 1]
+    return text
@@ -0,0 +1,225 @@
+'''
+云南台网观测报告(1.dat)的单遍解析
+1. 逐行读一遍, 每行只按固定列切分一次, 不再对同一行反复查找子串
+2. 状态机: 标题行开始一个事件; 台网名、台站名不为空的行开始一个台站; 其它行属于当前台站
+3. 保留所有震相(Pg/Pn/Sg/Sn/SME/SMN/LE/LN...)的权重、残差、震中距、方位角、振幅、周期和震级
+4. 报告是北京时间, 默认减 8 小时转为 UTC; 震相时刻只有时分秒, 比发震时刻早 12 小时以上的算作第二天
+标题行(空白分隔):
+YN 2018/09/01 00:47:13.0  24.229  102.741  11  0.4     3   5 eq 53 名称
+震相行(固定列):
+YN L5304 SHZ     Pg      1.0 V  00:47:15.06  -0.08    6.9 215.2
+         SHN     SMN     1.0 D  00:47:17.05   0.06                   35.2   0.12 ML   0.4
+'''
+from itertools import groupby
+from collections import OrderedDict
+
+from phasetool.pha_reader import open_input
+from phasetool.timeparse import parse_time_ns, days_from_civil, NS_PER_SEC, NS_PER_DAY
+
+UTC_SHIFT_HOURS = 8
+
+# 震相行各列的位置
+PHASE_COLUMNS = OrderedDict([
+    ('net', slice(0, 2)),
+    ('sta', slice(3, 8)),
+    ('channel', slice(9, 12)),
+    ('onset', slice(13, 14)),       # I/E
+    ('polarity', slice(15, 16)),    # U/D/C/R
+    ('phase', slice(17, 25)),
+    ('weight', slice(25, 28)),
+    ('flag', slice(29, 30)),        # V/D
+    ('time', slice(32, 43)),
+    ('residual', slice(43, 50)),
+    ('distance', slice(50, 57)),
+    ('azimuth', slice(57, 64)),
+    ('amplitude', slice(64, 75)),
+    ('period', slice(75, 81)),
+    ('mag_type', slice(81, 84)),
+    ('mag', slice(84, None)),
+])
+
+
+def parse_clock_ns(text):
+    """hh:mm:ss.ff 转为当天的纳秒数, 格式不对时抛出 ValueError"""
+    if text[2:3] != ':' or text[5:6] != ':':
+        raise ValueError('时刻格式错误: {!r}'.format(text))
+    hour, minute, second = int(text[0:2]), int(text[3:5]), float(text[6:])
+    # 25 时、61 分、60 秒不顺延到下一天/下一时/下一分
+    if not (0 <= hour <= 23 and 0 <= minute <= 59 and 0 <= second < 60):
+        raise ValueError('时刻超出范围: {!r}'.format(text))
+    # 秒最多 9 位小数, 乘 1e9 后取整没有误差
+    return (hour * 3600 + minute * 60) * NS_PER_SEC + int(round(second * NS_PER_SEC))
+
+
+def is_title(line):
+    """标题行: 第 4 列开始是 yyyy/mm/dd"""
+    return line[7:8] == '/' and line[10:11] == '/'
+
+
+class YNPhase:
+    """
+    一行震相, time 为 UTC 纳秒, 时刻格式错误的行为 None
+    残差到震级的各列(TAIL_COLUMNS)在第一次访问时才从行尾切分转换, 转换大量报告时只付出用到的列的代价
+    数值列为空或格式错误时为 None
+    """
+    TAIL_START = 43
+    TAIL_COLUMNS = ('residual', 'distance', 'azimuth', 'amplitude', 'period', 'mag_type', 'mag')
+
+    def __init__(self, net, sta, channel, onset, polarity, phase, weight, flag, time, tail=''):
+        self.net = net
+        self.sta = sta
+        self.channel = channel
+        self.onset = onset
+        self.polarity = polarity
+        self.phase = phase
+        self.weight = weight
+        self.flag = flag
+        self.time = time
+        self._tail = tail
+
+    def __getattr__(self, name):
+        if name not in YNPhase.TAIL_COLUMNS:
+            raise AttributeError(name)
+        self._parse_tail()
+        return self.__dict__[name]
+
+    def _parse_tail(self):
+        """按 PHASE_COLUMNS 切分行尾"""
+        values = {}
+        for name in YNPhase.TAIL_COLUMNS:
+            column = PHASE_COLUMNS[name]
+            stop = None if column.stop is None else column.stop - YNPhase.TAIL_START
+            values[name] = self._tail[column.start - YNPhase.TAIL_START:stop].strip()
+        for name in YNPhase.TAIL_COLUMNS:
+            if name == 'mag_type':
+                continue
+            try:
+                values[name] = float(values[name]) if values[name] else None
+            except ValueError:
+                values[name] = None
+        self.__dict__.update(values)
+
+    @property
+    def station(self):
+        return '{}.{}'.format(self.net, self.sta)
+
+
+class YNEvent:
+    """
+    一个数据单元: 标题行 + 全部震相
+    :param fields: 标题行按空白切分的各列(原始文本, 转换输出时保持原样)
+    :param time: 发震时刻, UTC 纳秒
+    """
+
+    def __init__(self, fields, time):
+        self.fields = fields
+        self.time = time
+        self.phases = []
+        self.bad_lines = 0
+
+    @property
+    def lat(self):
+        return float(self.fields[3])
+
+    @property
+    def lon(self):
+        return float(self.fields[4])
+
+    @property
+    def depth(self):
+        return float(self.fields[5])
+
+    @property
+    def mag(self):
+        return float(self.fields[6])
+
+    def stations(self):
+        """按台站分组(报告中一个台站连续的几行), 返回 [[震相, ...], ...]"""
+        return [list(group) for _, group in groupby(self.phases, key=lambda p: (p.net, p.sta))]
+
+
+def parse_phase(line, net, sta, day_ns, origin_clock_ns, utc_shift_ns):
+    """按固定列(PHASE_COLUMNS)解析一行震相"""
+    weight = line[25:28].strip()
+    try:
+        weight = float(weight) if weight else None
+        clock = parse_clock_ns(line[32:43])
+    except ValueError:
+        clock = None
+    if clock is not None and clock < origin_clock_ns - NS_PER_DAY // 2:
+        clock += NS_PER_DAY
+    return YNPhase(net, sta, line[9:12].strip(), line[13:14].strip(), line[15:16].strip(), line[17:25].strip(),
+                   weight, line[29:30].strip(), None if clock is None else day_ns + clock - utc_shift_ns,
+                   line[YNPhase.TAIL_START:] if clock is not None else '')
+
+
+def iter_bulletin(file_or_path, utc_shift_hours=UTC_SHIFT_HOURS, encoding='utf8'):
+    """
+    逐个事件解析观测报告
+    :param file_or_path: 文件路径、文件对象或者可迭代的行
+    :param utc_shift_hours: 报告时间减去的小时数, 北京时间为 8, 报告已是 UTC 时为 0
+    :return: 生成器, 每次返回 YNEvent; 标题行少于 9 列的数据单元被跳过
+    """
+    utc_shift_ns = int(round(utc_shift_hours * 3600 * NS_PER_SEC))
+    f, need_close = open_input(file_or_path, encoding=encoding)
+    try:
+        event = None
+        net = sta = None
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            if is_title(line):
+                if event is not None:
+                    yield event
+                event = None
+                fields = line.split()
+                #如果缺少数据,舍弃这个数据单元
+                if len(fields) < 9:
+                    continue
+                local_ns = parse_time_ns(fields[1] + ' ' + fields[2])
+                date = fields[1]
+                day_ns = int(days_from_civil(int(date[0:4]), int(date[5:7]), int(date[8:10]))) * NS_PER_DAY
+                origin_clock_ns = local_ns - day_ns
+                event = YNEvent(fields, local_ns - utc_shift_ns)
+                net = sta = None
+                continue
+            if event is None:
+                continue
+            if line[0:1].isalpha():
+                net, sta = line[0:2].strip(), line[3:8].strip()
+            if sta is None:
+                event.bad_lines += 1
+                continue
+            phase = parse_phase(line, net, sta, day_ns, origin_clock_ns, utc_shift_ns)
+            if phase.time is None:
+                event.bad_lines += 1
+            event.phases.append(phase)
+        if event is not None:
+            yield event
+    finally:
+        if need_close:
+            f.close()
+
+
+def pick_pair(phases, p_phases=('Pg', 'Pn'), s_phases=('Sg',)):
+    """
+    一个台站的震相里取第一个 P 震相, 再往下找第一个 S 震相
+    :return: (P 震相, S 震相), 找不到时为 None
+    """
+    p = None
+    for phase in phases:
+        if phase.time is None:
+            continue
+        if p is None:
+            if phase.phase in p_phases:
+                p = phase
+        elif phase.phase in s_phases:
+            return p, phase
+    return None
+
+
+def max_amplitude(phases, names=('SME', 'SMN')):
+    """这些震相的最大振幅, 没有时为 None"""
+    values = [p.amplitude for p in phases if p.phase in names and p.amplitude is not None]
+    return max(values) if values else None
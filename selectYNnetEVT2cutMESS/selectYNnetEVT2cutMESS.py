@@ -1,11 +1,12 @@
 import os
-from sys import argv
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pha_reader import iter_events
 input_filename = r'201809YNnet.pha'
 output_filename = r'201809YNnet_new.pha'
-input_file = open(input_filename, 'r')
-output_file = open(output_filename, 'w')
 #检查参数
-def check_arg():
+def check_arg(argv):
     is_error = False
     if len(argv) not in [2, 4]:
         is_error = True
@@ -18,47 +19,48 @@ def check_arg():
     if is_error:
         print('参数错误, 例子:')
         print(r'python t.py YN.BAS,YN.NLA')
-        print(r'python t.py 20180901-20180915 26.000-26.300,99.900-99.999 YN.BAS,YN.NLA')    
+        print(r'python t.py 20180901-20180915 26.000-26.300,99.900-99.999 YN.BAS,YN.NLA')
         exit(0)
     #得到参数值
-    rangeCheck.keys = argv[-1].split(',') 
+    rangeCheck = RangeCheck()
+    rangeCheck.keys = set(argv[-1].split(','))
     if len(argv) > 2:
         rangeCheck.min_date, rangeCheck.max_date = argv[1].split('-')
-        rangeCheck.n1_min, rangeCheck.n1_max = [float(i) for i in argv[2].split(',')[0].split('-')]    
+        rangeCheck.n1_min, rangeCheck.n1_max = [float(i) for i in argv[2].split(',')[0].split('-')]
         rangeCheck.n2_min, rangeCheck.n2_max = [float(i) for i in argv[2].split(',')[1].split('-')]
+    return rangeCheck
+
+#逐个返回满足条件的事件 (标题行, [选中的震相行]), 没有选中震相的事件不返回
+def filter_events(events, rangeCheck):
+    for title, phases in events:
+        title_date = title[0:8]
+        values = title.split(',')
+        if len(values) < 3:
+            continue
+        n1, n2 = float(values[1]), float(values[2])
+        if not rangeCheck.is_match(title_date = title_date, n1 = n1, n2 = n2):
+            continue
+        selected = [line for line in phases if rangeCheck.is_match(line = line)]
+        if selected:
+            yield title, selected
 
 #过滤数据
-def get_data():        
-    lines = input_file.readlines()
-    i = 0
-    while i < len(lines):
-        if lines[i][0].isdigit():
-            title = lines[i].strip()
-            i += 1
-            title_date = title[0:8]
-            values = title.split(',')
-            if len(values) < 3:
-                continue
-            n1, n2 = float(values[1]), float(values[2])
-            if not rangeCheck.is_match(title_date = title_date, n1 = n1, n2 = n2):
-                continue
-            is_title_saved = False
-            while i < len(lines) and not lines[i][0].isdigit():
-                if rangeCheck.is_match(line = lines[i]):
-                    #保存标题
-                    if not is_title_saved:
-                        output_file.write('{}\n'.format(title.strip()))
-                        is_title_saved = True
-                        print(title)
-                    #保存数据
-                    output_file.write('{}\n'.format(lines[i].strip()))
-                i += 1
-        else:
-            i += 1
-    input_file.close()
+def get_data(rangeCheck, input_filename = input_filename, output_filename = output_filename):
+    output_file = open(output_filename, 'w')
+    if rangeCheck.min_date != None:
+        #用时间索引(201809YNnet.pha.tidx)只读取日期范围内的事件, 只有按日期筛选时才需要 NumPy
+        from phasetool.time_index import iter_window, date_to_ns
+        events = iter_window(input_filename, date_to_ns(rangeCheck.min_date), date_to_ns(rangeCheck.max_date, end_of_day = True))
+    else:
+        events = iter_events(input_filename)
+    for title, phases in filter_events(events, rangeCheck):
+        print(title)
+        output_file.write('{}\n'.format(title))
+        for line in phases:
+            output_file.write('{}\n'.format(line))
     output_file.close()
     print('saved to:', os.path.abspath(output_filename))
-    
+
 class RangeCheck:
     def __init__(self):
         self.min_date = None
@@ -67,7 +69,7 @@ class RangeCheck:
         self.n1_max = None
         self.n2_min = None
         self.n2_max = None
-        self.keys = []
+        self.keys = set()
     #判断是否满足条件
     def is_match(self, title_date = None, n1 = None, n2 = None, line = None):
         if title_date != None:
@@ -84,6 +86,16 @@ class RangeCheck:
             if v not in self.keys:
                 return False
         return True
-rangeCheck = RangeCheck()        
-check_arg()
-get_data()    
+
+#参数和原来一样, 另外可以用 -i/-o 指定输入输出文件
+def main(argv = None):
+    argv = sys.argv if argv is None else argv
+    parser = argparse.ArgumentParser(usage = '%(prog)s [-i 输入.pha] [-o 输出.pha] [日期范围 经纬度范围] 台站列表')
+    parser.add_argument('-i', '--input', default = input_filename)
+    parser.add_argument('-o', '--output', default = output_filename)
+    args, rest = parser.parse_known_args(argv[1:])
+    rangeCheck = check_arg([argv[0]] + rest)
+    get_data(rangeCheck, args.input, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+'''
+增量处理: 两次运行之间最后一个事件又追加了震相行, 结果要和一次处理全部事件相同
+(最后一个事件可能还在写入, 留到下次处理, 所以对照的是去掉最后一个事件的完整输入;
+ 输入不再增长或 final 时最后一个事件也处理)
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.checkpoint import last_header_start
+from phasetool.cli import import_script
+from phasetool.numbering import number_events
+from phasetool.selection import Region, select_events_mmap
+
+N_EVENTS = 40
+N_PHASES = 6
+
+
+def make_events():
+    """合成 PAL 事件块, 经纬度交替落在选择范围内外"""
+    events = []
+    for k in range(N_EVENTS):
+        lon = 98.1 if k % 2 == 0 else 99.5
+        header = '2024010100{:02d}{:02d}.00,24.25{:02d},{:.4f},10.0,1.0,{}\n'.format(k // 6, k % 6 * 10, k, lon, k)
+        phases = ['MS.A{:03d},2024-01-01T00:00:{:02d}.00Z,2024-01-01T00:00:{:02d}.50Z,1e-8,{}\n'.format(
+            j, j, j + 1, 10 + j) for j in range(N_PHASES)]
+        events.append([header] + phases)
+    return events
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode) as f:
+        f.writelines(lines)
+
+
+def split_inside_last(events, last):
+    """前 last 个事件加上第 last+1 个事件的标题行和一半震相行, 和剩下的行"""
+    head = [line for event in events[:last] for line in event] + events[last][:1 + N_PHASES // 2]
+    rest = events[last][1 + N_PHASES // 2:] + [line for event in events[last + 1:] for line in event]
+    return head, rest
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_last_header_start(tmp_path):
+    path = str(tmp_path / 'in.pha')
+    events = make_events()
+    write(path, events[0] + events[1] + ['MS.A000,2024-01-01T00:00'])
+    assert last_header_start(path) == len(''.join(events[0]))
+    write(path, ['MS.A000,x\n'])
+    assert last_header_start(path) == 0
+
+
+def test_select_incremental_event_split(tmp_path):
+    module = import_script('extract_pha_by_lat_lon/select_pha_by_lonlat.py')
+    events = make_events()
+    regions = [Region(box=(98.0, 98.2, 24.0, 24.5))]
+    inc_in, inc_out = str(tmp_path / 'inc.pha'), str(tmp_path / 'inc_out.pha')
+    full_in, full_out = str(tmp_path / 'full.pha'), str(tmp_path / 'full_out.pha')
+    head, rest = split_inside_last(events, 20)
+    write(inc_in, head)
+    module.select_incremental(inc_in, inc_out, regions)
+    write(inc_in, rest, 'a')
+    module.select_incremental(inc_in, inc_out, regions)
+    write(full_in, [line for event in events[:-1] for line in event])
+    select_events_mmap(full_in, full_out, regions)
+    assert read(inc_out) == read(full_out)
+    # 偶数事件在范围内, 最后一个事件是奇数, 没有影响
+    assert read(inc_out).count('MS.A') == N_PHASES * N_EVENTS // 2
+
+
+def test_number_incremental_event_split(tmp_path):
+    events = make_events()
+    pattern = r'^[0-9]{14}'
+    inc_in, inc_out = str(tmp_path / 'inc.pha'), str(tmp_path / 'inc_out.pha')
+    full_in, full_out = str(tmp_path / 'full.pha'), str(tmp_path / 'full_out.pha')
+    head, rest = split_inside_last(events, 10)
+    write(inc_in, head)
+    number_events(inc_in, inc_out, pattern, incremental=True)
+    write(inc_in, rest, 'a')
+    number_events(inc_in, inc_out, pattern, incremental=True)
+    write(full_in, [line for event in events[:-1] for line in event])
+    number_events(full_in, full_out, pattern)
+    assert read(inc_out) == read(full_out)
+
+
+def test_number_incremental_complete_input(tmp_path):
+    events = make_events()
+    pattern = r'^[0-9]{14}'
+    inc_in, inc_out = str(tmp_path / 'inc.pha'), str(tmp_path / 'inc_out.pha')
+    full_out = str(tmp_path / 'full_out.pha')
+    write(inc_in, [line for event in events for line in event])
+    number_events(inc_in, full_out, pattern)
+    assert number_events(inc_in, inc_out, pattern, incremental=True) == N_EVENTS - 1
+    # 输入没有再增长: 最后一个事件也处理
+    assert number_events(inc_in, inc_out, pattern, incremental=True) == 1
+    assert number_events(inc_in, inc_out, pattern, incremental=True) == 0
+    assert read(inc_out) == read(full_out)
+
+
+def test_number_incremental_final(tmp_path):
+    events = make_events()
+    pattern = r'^[0-9]{14}'
+    inc_in, inc_out = str(tmp_path / 'inc.pha'), str(tmp_path / 'inc_out.pha')
+    full_out = str(tmp_path / 'full_out.pha')
+    # 最后一行没有换行符, 只有 final 时才处理
+    write(inc_in, [line for event in events for line in event])
+    with open(inc_in, 'r+') as f:
+        f.truncate(os.path.getsize(inc_in) - 1)
+    number_events(inc_in, full_out, pattern)
+    assert number_events(inc_in, inc_out, pattern, incremental=True) == N_EVENTS - 1
+    assert number_events(inc_in, inc_out, pattern, incremental=True) == 0
+    assert number_events(inc_in, inc_out, pattern, incremental=True, final=True) == 1
+    assert read(inc_out) == read(full_out)
+
+
+def test_extract_incremental_one_to_one(tmp_path):
+    module = import_script('extract_pha_by_lat_lon/extract_pha_by_lat_lon.py')
+    events = make_events()
+    # 两个事件位置相同: 一条记录只能匹配其中一个
+    events[24][0] = events[4][0].replace(',4\n', ',24\n')
+    good_txt = str(tmp_path / 'good.txt')
+    write(good_txt, ['20240101000040.00 24.2504 98.1000\n'])
+    records = module.read_good_records(good_txt)
+    inc_in, inc_out = str(tmp_path / 'inc.pha'), str(tmp_path / 'inc_out.pha')
+    head, rest = split_inside_last(events, 20)
+    write(inc_in, head)
+    assert module.extract_incremental(good_txt, inc_in, inc_out, records) == 1
+    write(inc_in, rest, 'a')
+    assert module.extract_incremental(good_txt, inc_in, inc_out, records) == 0
+    assert read(inc_out) == ''.join(events[4])
@@ -0,0 +1,76 @@
+'''
+按发震时刻归并多个 tomoDD phase.dat(convertMESSdetect2tomoDD/combine_phase.py)
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.cli import import_script, run_chain
+
+
+def tomo_event(second, stations, lat=24.25, seq=0):
+    lines = ['# 2024  1  1  0  0 {:5.2f} {:8.4f}  98.1000   10.00  1.00  0.00  0.00  0.00 {:>10d}\n'.format(second, lat, seq)]
+    for station in stations:
+        lines.append('{}         1.000   1.000   P\n'.format(station))
+    return lines
+
+
+def write(path, events):
+    with open(path, 'w') as f:
+        for event in events:
+            f.writelines(event)
+
+
+def headers(path):
+    with open(path) as f:
+        return [line.split() for line in f if line.startswith('#')]
+
+
+def stations(path):
+    """每个事件的台站列表"""
+    result = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith('#'):
+                result.append([])
+            else:
+                result[-1].append(line.split()[0])
+    return result
+
+
+def test_chain_out(tmp_path):
+    a, b, out = str(tmp_path / 'a.dat'), str(tmp_path / 'b.dat'), str(tmp_path / 'out.dat')
+    write(a, [tomo_event(1.0, ['A01']), tomo_event(30.0, ['A02'])])
+    write(b, [tomo_event(1.2, ['B01'])])
+    # combine-phase 从 chain 的内存文件读, 也写到内存文件 @out
+    run_chain([['combine-phase', a, '-o', '@out'],
+               ['combine-phase', '@in', b, '-o', '@out'],
+               ['combine-phase', '@in', '-o', out]])
+    assert stations(out) == [['A01', 'B01'], ['A02']]
+
+
+def test_merge_nearest(tmp_path):
+    module = import_script('convertMESSdetect2tomoDD/combine_phase.py')
+    a, b, out = str(tmp_path / 'a.dat'), str(tmp_path / 'b.dat'), str(tmp_path / 'out.dat')
+    write(a, [tomo_event(1.0, ['A01']), tomo_event(1.2, ['A02'])])
+    write(b, [tomo_event(1.5, ['B01'])])
+    # 两个 a 事件都在容差内, 位置相同, b 事件并入时间更近的 01.20
+    assert module.combine([a, b], out)[:2] == (2, 1)
+    assert stations(out) == [['A01'], ['A02', 'B01']]
+
+
+def test_collapse_only_across_inputs(tmp_path):
+    module = import_script('convertMESSdetect2tomoDD/combine_phase.py')
+    a, b, out = str(tmp_path / 'a.dat'), str(tmp_path / 'b.dat'), str(tmp_path / 'out.dat')
+    # 同一文件里 0.5 秒内同一位置的两个事件(密集震群)不合并
+    write(a, [tomo_event(1.0, ['A01']), tomo_event(1.5, ['A02'])])
+    assert module.combine([a], out)[:2] == (2, 0)
+    assert stations(out) == [['A01'], ['A02']]
+    # 同一个文件给两次: 每个事件只和另一份里的一个合并
+    assert module.combine([a, a], out)[:2] == (2, 2)
+    assert stations(out) == [['A01'], ['A02']]
+    # 每个其它文件最多并入一个事件: b 的两个事件分别并入 a 的两个事件
+    write(b, [tomo_event(1.1, ['B01']), tomo_event(1.6, ['B02'])])
+    assert module.combine([a, b], out)[:2] == (2, 2)
+    assert stations(out) == [['A01', 'B01'], ['A02', 'B02']]
+    assert [h[-1] for h in headers(out)] == ['0', '1']
@@ -0,0 +1,26 @@
+'''
+ph2dt 的替代(phasetool/ph2dt.py): event.dat 的时间
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.ph2dt import event_line
+
+REST = ['24.5', '98.1', '10', '1.5', '0', '0', '0', '7']
+
+
+@pytest.mark.parametrize('clock, expected', [
+    (('2024', '1', '1', '0', '0', '5.00'), ('20240101', 500)),
+    (('2024', '1', '1', '3', '1', '59.994'), ('20240101', 3015999)),
+    # 秒四舍五入到 60.00 时进位到分、时和日期
+    (('2024', '1', '1', '3', '1', '59.996'), ('20240101', 3020000)),
+    (('2024', '1', '1', '3', '59', '59.999'), ('20240101', 4000000)),
+    (('2024', '2', '28', '23', '59', '59.996'), ('20240229', 0)),
+    (('2023', '12', '31', '23', '59', '59.999'), ('20240101', 0)),
+])
+def test_event_line_time(clock, expected):
+    fields = event_line(list(clock) + REST).split()
+    assert (fields[0], int(fields[1])) == expected
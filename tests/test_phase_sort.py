@@ -0,0 +1,73 @@
+'''
+震相文件按发震时刻的外部排序(phasetool/phase_sort.py)
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.cli import run_chain
+from phasetool.phase_sort import sort_phase
+
+# 每个事件的 (秒, 序号), 故意打乱, 有两组时间相同的事件
+EVENTS = [(30, 0), (10, 1), (50, 2), (10, 3), (20, 4), (50, 5), (0, 6), (40, 7)]
+
+
+def tomo_event(second, seq):
+    header = '# 2024  1  1  0  0 {:5.2f}  24.2500  98.1000   10.00  1.00  0.00  0.00  0.00 {:>10d}\n'.format(second, seq)
+    return [header, 'ST{:02d}         1.000   1.000   P\n'.format(seq), 'ST{:02d}         2.000   1.000   S\n'.format(seq)]
+
+
+def write_events(path, events):
+    with open(path, 'w') as f:
+        for second, seq in events:
+            f.writelines(tomo_event(second, seq))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def expected(events):
+    """按时间稳定排序后的内容"""
+    return ''.join(line for second, seq in sorted(events, key=lambda e: e[0]) for line in tomo_event(second, seq))
+
+
+def test_chain_out(tmp_path):
+    in_path, out_path = str(tmp_path / 'in.dat'), str(tmp_path / 'out.dat')
+    write_events(in_path, EVENTS)
+    # sort-phase 写到 chain 的内存文件 @out, 下一步再读出来
+    run_chain([['sort-phase', in_path, '@out', '--format', 'tomo'],
+               ['sort-phase', '@in', out_path, '--format', 'tomo']])
+    assert read(out_path) == expected(EVENTS)
+
+
+def test_stable_multi_pass(tmp_path):
+    in_path, out_path = str(tmp_path / 'in.dat'), str(tmp_path / 'out.dat')
+    write_events(in_path, EVENTS)
+    # 每段 2 个事件、一次归并 2 段: 多轮归并后时间相同的事件仍保持输入顺序
+    stats = sort_phase(in_path, out_path, 'tomo', run_size=2, fan_in=2)
+    assert stats['events'] == len(EVENTS) and stats['runs'] > 2
+    assert read(out_path) == expected(EVENTS)
+    assert sorted(os.listdir(str(tmp_path))) == ['in.dat', 'out.dat']
+
+
+def test_in_place(tmp_path):
+    path = str(tmp_path / 'phase.dat')
+    write_events(path, EVENTS)
+    assert sort_phase(path, path, 'tomo', run_size=3)['runs'] > 0
+    assert read(path) == expected(EVENTS)
+    # 已经有序时只读一遍, 内容不变
+    assert sort_phase(path, path, 'tomo')['runs'] == 0
+    assert read(path) == expected(EVENTS)
+    assert os.listdir(str(tmp_path)) == ['phase.dat']
+
+
+def test_bad_times_last(tmp_path):
+    in_path, out_path = str(tmp_path / 'in.dat'), str(tmp_path / 'out.dat')
+    bad = ['# 2024  1  1  xx  0  1.00  24.2500  98.1000   10.00  1.00  0.00  0.00  0.00          9\n']
+    with open(in_path, 'w') as f:
+        f.writelines(bad + tomo_event(20, 1) + tomo_event(10, 2))
+    stats = sort_phase(in_path, out_path, 'tomo')
+    assert stats['bad_times'] == 1
+    assert read(out_path) == ''.join(tomo_event(10, 2) + tomo_event(20, 1) + bad)
@@ -0,0 +1,38 @@
+'''
+流水线配置的检查(phasetool/pipeline.py): 配置错误抛出 SpecError, 在开始读数据之前
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.pipeline import SpecError, _range, run_pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+YN_BULLETIN = os.path.join(ROOT, 'convertYNcatalog2hypoDD', '1.dat')
+
+
+def test_read_yn_unknown_option():
+    with pytest.raises(SpecError, match='p_phase'):
+        run_pipeline([{'stage': 'read_yn', 'path': YN_BULLETIN, 'p_phase': 'Pg'}])
+
+
+def test_read_yn_options():
+    default, _ = run_pipeline([{'stage': 'read_yn', 'path': YN_BULLETIN}])
+    counts, _ = run_pipeline([{'stage': 'read_yn', 'path': YN_BULLETIN, 'p_phases': 'Pg,Pn', 's_phases': 'Sg,Sn',
+                               'utc_shift_hours': 0, 'seq': True}])
+    assert counts == default and default[0] > 0
+
+
+@pytest.mark.parametrize('text, expected', [('0-30', (0, 30)), ('-5-10', (-5, 10)), ('-10--5', (-10, -5)),
+                                            ('-5 - 10', (-5, 10)), ('1.5-2.5', (1.5, 2.5))])
+def test_range(text, expected):
+    assert _range(text) == expected
+    assert _range(list(expected)) == expected
+
+
+@pytest.mark.parametrize('text', ['-5', '5-', 'a-b', '1-2-3'])
+def test_bad_range(text):
+    with pytest.raises(SpecError, match='范围'):
+        _range(text)
@@ -0,0 +1,49 @@
+'''
+固定格式时间解析(phasetool/timeparse.py): 超出范围的字段和格式错误一样处理, 不顺延
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.timeparse import parse_time_ns, parse_times_ns
+
+BAD_CLOCKS = ['20241114256008.00', '20241114226108', '2024-11-14T23:59:60.5Z']
+
+
+@pytest.mark.parametrize('text', BAD_CLOCKS)
+def test_bad_clock(text):
+    with pytest.raises(ValueError):
+        parse_time_ns(text)
+
+
+@pytest.mark.parametrize('text', BAD_CLOCKS)
+def test_bad_clock_batch(text):
+    # 同一格式的一组里有一个超出范围时逐个解析, 也抛出 ValueError
+    good = '2024-11-14T23:59:59.5Z' if '-' in text else '20241114235959' + text[14:]
+    with pytest.raises(ValueError):
+        parse_times_ns([good, text])
+
+
+def test_clock_limits():
+    assert parse_time_ns('20241114235959.99') == parse_time_ns('2024-11-15T00:00:00Z') - 10000000
+    assert parse_times_ns(['20241114235959.99', '20241114000000.00']).tolist() == [
+        parse_time_ns('20241114235959.99'), parse_time_ns('20241114000000.00')]
+
+
+@pytest.mark.parametrize('text', ['20240231120000.00', '20230229000000.00', '19000229000000.00',
+                                  '20241131000000.00', '2024-02-30T00:00:00Z', '20241300000000.00'])
+def test_bad_date(text):
+    # 不存在的日期不顺延到下个月
+    with pytest.raises(ValueError):
+        parse_time_ns(text)
+    with pytest.raises(ValueError):
+        parse_times_ns(['20240101000000.00' if text[4].isdigit() else '2024-01-01T00:00:00Z', text])
+
+
+def test_leap_day():
+    assert parse_time_ns('20240229000000.00') == parse_time_ns('20240301000000.00') - 86400 * 10**9
+    assert parse_time_ns('20000229000000.00') == parse_time_ns('2000-02-29T00:00:00Z')
+    assert parse_times_ns(['20240229000000.00', '20240301000000.00']).tolist() == [
+        parse_time_ns('20240229000000.00'), parse_time_ns('20240301000000.00')]
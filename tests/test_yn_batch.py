@@ -0,0 +1,48 @@
+'''
+云南台网观测报告的批量转换(convertYNcatalog2hypoDD.py 输入为目录或通配符时)
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.cli import import_script
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+YN_BULLETIN = os.path.join(ROOT, 'convertYNcatalog2hypoDD', '1.dat')
+
+
+def bulletin_blocks():
+    """1.dat 按标题行分成数据单元"""
+    blocks = []
+    with open(YN_BULLETIN, encoding='utf8', newline='') as f:
+        for line in f:
+            if line[7:8] == '/' and line[10:11] == '/':
+                blocks.append([])
+            blocks[-1].append(line)
+    return blocks
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_batch_matches_single(tmp_path):
+    module = import_script('convertYNcatalog2hypoDD/convertYNcatalog2hypoDD.py')
+    blocks = bulletin_blocks()
+    # 两个文件, 事件交错且文件内没有按时间排序
+    paths = [str(tmp_path / 'a.dat'), str(tmp_path / 'b.dat')]
+    for path, part in zip(paths, (blocks[2::-2], blocks[1::2])):
+        with open(path, 'w', encoding='utf8', newline='') as f:
+            f.writelines(line for block in part for line in block)
+    single_pha, single_ctlg = str(tmp_path / 'single.pha'), str(tmp_path / 'single.ctlg')
+    count = module.convert(YN_BULLETIN, single_pha, single_ctlg, seq=True)
+    batch_pha, batch_ctlg = str(tmp_path / 'batch.pha'), str(tmp_path / 'batch.ctlg')
+    # 不存在的文件记为失败, 其它文件照常合并
+    missing = str(tmp_path / 'missing.dat')
+    assert module.list_inputs([str(tmp_path / '*.dat')]) == paths
+    result, failures = module.convert_batch(paths + [missing], batch_pha, batch_ctlg, jobs=2, seq=True)
+    assert result == count > 0
+    assert [path for path, _ in failures] == [missing]
+    assert read(batch_pha) == read(single_pha)
+    assert read(batch_ctlg) == read(single_ctlg)
@@ -0,0 +1,51 @@
+'''
+云南台网观测报告的解析(phasetool/yn_bulletin.py)
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phasetool.timeparse import NS_PER_SEC, parse_time_ns
+from phasetool.yn_bulletin import iter_bulletin, parse_clock_ns
+
+
+def test_clock():
+    assert parse_clock_ns('00:47:15.06') == (47 * 60 + 15) * NS_PER_SEC + 60000000
+    assert parse_clock_ns('23:59:59.99') == 86399 * NS_PER_SEC + 990000000
+
+
+@pytest.mark.parametrize('text', ['25:60:08.00', '22:61:08.00', '23:59:60.50', '00-47-15.06'])
+def test_bad_clock(text):
+    with pytest.raises(ValueError):
+        parse_clock_ns(text)
+
+
+BULLETIN = '''YN 2018/09/01 23:59:58.0  24.229  102.741  11  0.4     3   5 eq 53 名称
+YN L5304 SHZ     Pg      1.0 V  23:59:59.06  -0.08    6.9 215.2
+         SHN     Sg      1.0 V  00:00:01.66   0.00
+         SHN     SMN     1.0 D  00:00:02.05   0.06                   35.2   0.12 ML   0.4
+YN L5301 SHZ     Pg      1.0 V  2x:00:00.34   0.00    8.7  71.4
+YN 2018/09/02 01:00:00.0  24.1  102.7
+'''
+
+
+def test_iter_bulletin():
+    events = list(iter_bulletin(BULLETIN.splitlines(True)))
+    # 第二个标题行少于 9 列, 被跳过
+    assert len(events) == 1
+    event = events[0]
+    # 北京时间减 8 小时
+    assert event.time == parse_time_ns('2018-09-01T15:59:58Z')
+    assert (event.lat, event.lon, event.depth, event.mag) == (24.229, 102.741, 11.0, 0.4)
+    assert [p.phase for p in event.phases] == ['Pg', 'Sg', 'SMN', 'Pg']
+    assert [p.sta for p in event.phases] == ['L5304', 'L5304', 'L5304', 'L5301']
+    pg, sg, smn, bad = event.phases
+    assert (pg.net, pg.channel, pg.weight, pg.flag) == ('YN', 'SHZ', 1.0, 'V')
+    assert (pg.residual, pg.distance, pg.azimuth) == (-0.08, 6.9, 215.2)
+    # 时刻早于发震时刻 12 小时以上的算作第二天
+    assert sg.time == parse_time_ns('2018-09-01T16:00:01.66Z')
+    assert (smn.amplitude, smn.period, smn.mag_type, smn.mag) == (35.2, 0.12, 'ML', 0.4)
+    assert bad.time is None and event.bad_lines == 1
+    assert [len(s) for s in event.stations()] == [3, 1]